@@ -159,6 +159,33 @@ def health_check():
         return jsonify({"status": "unhealthy", "database": "error", "message": str(e)}), 503
 
 
+# 子串搜索候选：(类型, 表, 编号列)
+SEARCH_CANDIDATE_SOURCES = (
+    ('component', 'components', 'component_code'),
+    ('package', 'packages', 'package_number'),
+    ('pallet', 'pallets', 'pallet_number'),
+)
+SEARCH_CANDIDATE_LIMIT = 20
+
+
+def search_candidates(code):
+    """按编号子串查找候选记录（每类最多 SEARCH_CANDIDATE_LIMIT 条）"""
+    if not _db_instance:
+        return []
+    candidates = []
+    for kind, table, column in SEARCH_CANDIDATE_SOURCES:
+        condition, params = _db_instance.search_condition(table, code, 't')
+        rows = query_all(
+            f'''SELECT t.id, t.{column} AS number, o.order_number
+               FROM {table} t
+               LEFT JOIN orders o ON t.order_id = o.id
+               WHERE {condition}
+               ORDER BY t.id DESC LIMIT ?''', params + [SEARCH_CANDIDATE_LIMIT]
+        )
+        candidates.extend(dict(row, type=kind) for row in rows)
+    return candidates
+
+
 @app.get('/api/search')
 @require_api_key
 def search():
@@ -168,7 +195,7 @@ def search():
         code: 要搜索的编码（板件编码/包裹号/托盘号）
     
     返回:
-        JSON对象，包含搜索结果
+        JSON对象，包含搜索结果；未精确匹配时 candidates 为编号包含 code 的候选记录
     """
     code = (request.args.get('code') or '').strip()
     if not code:
@@ -209,8 +236,11 @@ def search():
             logger.info(f"找到托盘: {code}")
             return jsonify({"ok": True, "type": "pallet", "data": pal})
 
-        logger.info(f"未找到: {code}")
-        return jsonify({"ok": False, "error": "not found", "message": "未找到匹配的记录"})
+        # 精确匹配失败时按子串（编号搜索索引）给出候选
+        candidates = search_candidates(code)
+        logger.info(f"未找到: {code}，候选 {len(candidates)} 条")
+        return jsonify({"ok": False, "error": "not found", "message": "未找到匹配的记录",
+                        "candidates": candidates})
         
     except Exception as e:
         logger.error(f"搜索失败: {e}", exc_info=True)
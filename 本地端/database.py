@@ -3,6 +3,12 @@ import os
 import logging
 from datetime import datetime
 import json
+import threading
+import time
+import queue
+import atexit
+import traceback
+from concurrent.futures import Future
 from contextlib import contextmanager
 
 # 配置日志
@@ -27,6 +33,564 @@ class DatabaseInitError(DatabaseError):
     pass
 
 
+class PooledConnection(sqlite3.Connection):
+    """连接池中的长连接
+
+    close() 不会真正关闭连接，而是归还到所属连接池，
+    因此旧代码中 conn = db.get_connection() ... conn.close() 的写法无需修改。
+    """
+
+    def close(self):
+        pool = getattr(self, '_pool', None)
+        if pool is None:
+            super().close()
+        else:
+            pool.release(self)
+
+    def close_physical(self):
+        """真正关闭底层连接"""
+        self._pool = None
+        try:
+            super().close()
+        except sqlite3.Error:
+            pass
+
+
+class ConnectionPool:
+    """按线程持有的SQLite连接池
+
+    - 每个线程维护自己的空闲连接列表（sqlite3连接默认不可跨线程使用）
+    - 连接在创建时一次性完成PRAGMA配置，之后反复复用
+    - 取出时做健康检查，归还时回滚未提交事务并重置连接状态
+    - 通过代号(generation)使所有线程中旧配置的空闲连接失效
+    """
+
+    def __init__(self, connect, max_idle=4):
+        self._connect = connect
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.stats = {'created': 0, 'reused': 0, 'discarded': 0}
+
+    def _idle_list(self):
+        idle = getattr(self._local, 'idle', None)
+        if idle is None or self._local.generation != self._generation:
+            for stale in idle or []:
+                stale.close_physical()
+            idle = []
+            self._local.idle = idle
+            self._local.generation = self._generation
+        return idle
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """取出一个可用连接（优先复用当前线程的空闲连接）"""
+        idle = self._idle_list()
+        while idle:
+            conn = idle.pop()
+            if self._is_healthy(conn):
+                conn._checked_out = True
+                self.stats['reused'] += 1
+                return conn
+            conn.close_physical()
+            self.stats['discarded'] += 1
+
+        conn = self._connect()
+        conn._pool = self
+        conn._generation = self._generation
+        conn._default_isolation_level = conn.isolation_level
+        conn._checked_out = True
+        self.stats['created'] += 1
+        return conn
+
+    def release(self, conn):
+        """归还连接；重复归还会被忽略"""
+        if not getattr(conn, '_checked_out', False):
+            return
+        conn._checked_out = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            conn.isolation_level = conn._default_isolation_level
+        except sqlite3.Error:
+            conn.close_physical()
+            self.stats['discarded'] += 1
+            return
+
+        idle = self._idle_list()
+        if conn._generation != self._generation or len(idle) >= self.max_idle:
+            conn.close_physical()
+            return
+        idle.append(conn)
+
+    def close_all(self):
+        """关闭当前线程的空闲连接，并使其他线程的空闲连接在下次使用时失效"""
+        with self._lock:
+            self._generation += 1
+        self._idle_list()
+
+
+# 日志写入线程的停止标记
+_STOP = object()
+
+
+class SettingsCache:
+    """system_settings 表的进程内写穿缓存
+
+    - 首次读取时一次性加载全部设置行
+    - set_setting 写入后直接更新缓存
+    - 其他进程/实例的写入通过 settings_version 计数器（由触发器维护）发现，
+      计数器最多每 CHECK_INTERVAL 秒读取一次
+    - hits/misses 统计用于评估缓存效果
+    """
+
+    CHECK_INTERVAL = 0.5  # 秒
+
+    _TYPE_CONVERTERS = {
+        'integer': int,
+        'float': float,
+        'boolean': lambda v: str(v).strip().lower() in ('true', '1', 'yes', 'on'),
+        'json': json.loads,
+    }
+
+    def __init__(self):
+        self._values = None  # setting_key -> (setting_value, setting_type)
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _read_version(cursor):
+        cursor.execute('SELECT version FROM settings_version WHERE id = 1')
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _ensure_loaded(self, db):
+        now = time.monotonic()
+        if self._values is not None and now - self._checked_at < self.CHECK_INTERVAL:
+            self.hits += 1
+            return
+        with db.connection_context() as conn:
+            cursor = conn.cursor()
+            version = self._read_version(cursor)
+            if self._values is not None and version == self._version:
+                self.hits += 1
+            else:
+                cursor.execute('SELECT setting_key, setting_value, setting_type FROM system_settings')
+                self._values = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+                self._version = version
+                self.misses += 1
+        self._checked_at = now
+
+    def get(self, db, key, default=None):
+        """读取原始字符串值"""
+        with self._lock:
+            self._ensure_loaded(db)
+            entry = self._values.get(key)
+        return entry[0] if entry and entry[0] is not None else default
+
+    def get_typed(self, db, key, default=None):
+        """按 setting_type 转换后的值，转换失败返回默认值"""
+        with self._lock:
+            self._ensure_loaded(db)
+            entry = self._values.get(key)
+        if not entry or entry[0] is None:
+            return default
+        value, setting_type = entry
+        converter = self._TYPE_CONVERTERS.get((setting_type or 'string').lower())
+        if converter is None:
+            return value
+        try:
+            return converter(value)
+        except (ValueError, TypeError):
+            return default
+
+    def put(self, key, value, setting_type, version):
+        """写穿：仅当写入前缓存与数据库一致时就地更新，否则整体失效"""
+        with self._lock:
+            if self._values is not None and self._version is not None and version == self._version + 1:
+                self._values[key] = (value, setting_type)
+                self._version = version
+            else:
+                self._values = None
+
+    def invalidate(self):
+        with self._lock:
+            self._values = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0,
+        }
+
+
+# 进程内已完成初始化的数据库：绝对路径 -> Database 实例
+_open_databases = {}
+_open_databases_lock = threading.Lock()
+
+
+def _lookup_open_database(db_path):
+    """查找已初始化的同路径实例；文件已不存在时移除登记"""
+    key = os.path.abspath(db_path)
+    with _open_databases_lock:
+        opened = _open_databases.get(key)
+        if opened is not None and not os.path.exists(key):
+            del _open_databases[key]
+            opened = None
+        return opened
+
+
+def close_database(db_path):
+    """关闭并注销某个数据库文件（删除或替换文件前调用）"""
+    with _open_databases_lock:
+        opened = _open_databases.pop(os.path.abspath(db_path), None)
+    if opened is not None:
+        opened._log_writer.shutdown()
+        opened._write_coordinator.shutdown()
+        opened._pool.close_all()
+
+
+class OperationLogWriter:
+    """operation_logs 的后台批量写入器
+
+    - 调用方只把日志行放入有界队列，不再为每条日志单独提交
+    - 后台线程每累计 batch_size 条或每隔 flush_interval 秒用 executemany 批量写入
+    - flush() 同步等待队列中已有的日志全部落库；shutdown() 在退出时调用
+    - 队列已满时退化为调用方线程同步写入，保证日志不丢失
+    """
+
+    INSERT_SQL = '''
+        INSERT INTO operation_logs
+        (operation_type, operation_data, user_name, undo_data, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    '''
+
+    def __init__(self, db, batch_size=50, flush_interval=0.2, max_queue=5000):
+        self._db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(
+                target=self._run, name='OperationLogWriter', daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, row):
+        """提交一条日志行 (operation_type, operation_data, user_name, undo_data, created_at)"""
+        if self._stopped:
+            self._write([row])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            logger.warning("操作日志队列已满，改为同步写入")
+            self._write([row])
+
+    def _write(self, rows):
+        # 调用方线程已在写事务中（如写线程的 fn 内记录日志时队列已满）：并入该事务。
+        # 否则 hold() 重入后另开的连接会等待本线程自己的写锁，超时后日志丢失
+        current = self._db.write_coordinator.current_connection()
+        try:
+            if current is not None:
+                current.executemany(self.INSERT_SQL, rows)
+                return
+            with self._db.write_coordinator.hold(), self._db.connection_context() as conn:
+                conn.executemany(self.INSERT_SQL, rows)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"批量写入操作日志失败({len(rows)}条): {e}")
+
+    def _run(self):
+        rows = []
+        waiters = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            stop = False
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is _STOP:
+                stop = True
+            elif item is not None:
+                rows.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            timed_out = deadline is not None and time.monotonic() >= deadline
+            if rows and (len(rows) >= self.batch_size or timed_out or waiters or stop):
+                self._write(rows)
+                rows = []
+                deadline = None
+            for event in waiters:
+                event.set()
+            waiters = []
+            if stop:
+                return
+
+    def flush(self, timeout=5.0):
+        """同步等待已提交的日志全部写入数据库"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def shutdown(self, timeout=5.0):
+        """写完剩余日志并停止后台线程（可重复调用）"""
+        self._stopped = True
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+
+def _on_gui_thread():
+    """是否在界面线程（主线程）中"""
+    return threading.current_thread() is threading.main_thread()
+
+
+_gui_write_sites = set()
+
+
+def _warn_gui_write():
+    """界面线程中直接执行写事务时按调用位置记录一次警告"""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if os.path.basename(frame.filename) not in ('database.py', 'contextlib.py'):
+            break
+    else:
+        return
+    site = (frame.filename, frame.lineno)
+    if site in _gui_write_sites:
+        return
+    _gui_write_sites.add(site)
+    logger.warning(
+        f"界面线程中执行写事务，等待写锁时会卡住界面，请改用 submit_write: "
+        f"{os.path.basename(frame.filename)}:{frame.lineno}"
+    )
+
+
+class WriteCoordinator:
+    """进程内的写事务协调器
+
+    - 单一写线程按提交顺序执行写事务：submit(fn) 立即返回 Future，
+      fn(conn) 在写线程的 BEGIN IMMEDIATE 事务中执行，正常返回即提交，异常则回滚
+    - 本进程的其他写入（immediate_transaction、操作日志批量写入）也经 hold() 取得同一把锁，
+      进程内的写入不再在 SQLite 层互相碰撞；与其他进程/工位的锁冲突由写线程在释放
+      进程内写锁后退避重试，界面线程不再 sleep 等锁
+    - 界面线程的写入经 submit 交给写线程，完成后用信号转回界面线程
+    - 已在写事务中（写线程的 fn 或 immediate_transaction 内）再嵌套写入时并入当前事务
+    - stats() 提供争用指标：排队深度、排队等待、进程内取锁等待、
+      BEGIN IMMEDIATE 等待（其他进程持锁）与执行耗时
+    """
+
+    SLOW_LOCK_WAIT_MS = 1000
+    BUSY_TIMEOUT_MS = 10000  # 与连接的 busy_timeout 一致
+
+    def __init__(self, db, begin_timeout=0.2, max_wait=30.0, retry_delay=0.1):
+        self._db = db
+        self.begin_timeout = begin_timeout
+        self.max_wait = max_wait
+        self.retry_delay = retry_delay
+        self._lock = threading.RLock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'submitted': 0, 'completed': 0, 'failed': 0, 'busy_retries': 0,
+            'queue_depth_max': 0,
+            'queue_wait_ms_total': 0.0, 'queue_wait_ms_max': 0.0,
+            'lock_waits': 0, 'lock_wait_ms_total': 0.0, 'lock_wait_ms_max': 0.0,
+            'begin_wait_ms_total': 0.0, 'begin_wait_ms_max': 0.0,
+            'exec_ms_total': 0.0, 'exec_ms_max': 0.0,
+        }
+        self._depth = 0
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='WriteCoordinator', daemon=True
+            )
+            self._thread.start()
+
+    def _record(self, name, value):
+        with self._stats_lock:
+            self._stats[f'{name}_total'] += value
+            if value > self._stats[f'{name}_max']:
+                self._stats[f'{name}_max'] = value
+
+    @contextmanager
+    def hold(self):
+        """取得进程内写锁（记录等待时间）"""
+        start = time.perf_counter()
+        with self._lock:
+            waited = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                self._stats['lock_waits'] += 1
+            self._record('lock_wait_ms', waited)
+            if waited >= self.SLOW_LOCK_WAIT_MS:
+                logger.warning(f"等待写锁 {waited:.0f} ms")
+            yield
+
+    def current_connection(self):
+        """当前线程正在执行的写事务连接（写线程的 fn 或 transaction() 内；否则返回 None）"""
+        return getattr(self._local, 'conn', None)
+
+    def submit(self, fn, *args, **kwargs):
+        """提交写事务 fn(conn, *args, **kwargs)，返回 concurrent.futures.Future"""
+        future = Future()
+        with self._stats_lock:
+            self._stats['submitted'] += 1
+            self._depth += 1
+            if self._depth > self._stats['queue_depth_max']:
+                self._stats['queue_depth_max'] = self._depth
+        self._ensure_started()
+        self._queue.put((future, fn, args, kwargs, time.perf_counter()))
+        return future
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """同步执行写事务（供后台线程使用，界面线程请用 submit）"""
+        conn = self.current_connection()
+        if conn is not None:
+            return fn(conn, *args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    @contextmanager
+    def transaction(self, record=False):
+        """取得进程内写锁并以 BEGIN IMMEDIATE 开启事务，正常退出提交、异常回滚
+
+        BEGIN 只等待 begin_timeout；其他进程持有写锁时释放进程内写锁后退避重试，
+        直到累计等待超过 max_wait。进程内写锁只在短暂的 BEGIN 尝试与事务执行期间持有，
+        其他线程不会因其他进程的长事务而长时间等锁。
+        """
+        deadline = time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            with self.hold(), self._db.connection_context() as conn:
+                begin = time.perf_counter()
+                conn.execute(f'PRAGMA busy_timeout = {int(self.begin_timeout * 1000)}')
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    locked = False
+                except sqlite3.OperationalError as e:
+                    if 'database is locked' not in str(e) or time.monotonic() >= deadline:
+                        raise
+                    locked = True
+                finally:
+                    conn.execute(f'PRAGMA busy_timeout = {self.BUSY_TIMEOUT_MS}')
+                if not locked:
+                    if record:
+                        # 等待其他进程释放写锁的时间
+                        self._record('begin_wait_ms', (time.perf_counter() - begin) * 1000)
+                    # 同一线程内的嵌套写入（immediate_transaction、操作日志）并入本事务
+                    outer = self.current_connection()
+                    self._local.conn = conn
+                    try:
+                        yield conn
+                        conn.commit()
+                    except BaseException:
+                        conn.rollback()
+                        raise
+                    finally:
+                        self._local.conn = outer
+                    return
+            attempt += 1
+            with self._stats_lock:
+                self._stats['busy_retries'] += 1
+            if attempt == 1 or attempt % 10 == 0:
+                logger.warning(f"数据库被其他进程锁定，第 {attempt} 次重试")
+            time.sleep(min(self.retry_delay * attempt, 1.0))
+
+    def _execute(self, fn, args, kwargs):
+        with self.transaction(record=True) as conn:
+            start = time.perf_counter()
+            try:
+                return fn(conn, *args, **kwargs)
+            finally:
+                self._record('exec_ms', (time.perf_counter() - start) * 1000)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            future, fn, args, kwargs, enqueued = item
+            with self._stats_lock:
+                self._depth -= 1
+            self._record('queue_wait_ms', (time.perf_counter() - enqueued) * 1000)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = self._execute(fn, args, kwargs)
+            except BaseException as e:
+                with self._stats_lock:
+                    self._stats['failed'] += 1
+                future.set_exception(e)
+            else:
+                with self._stats_lock:
+                    self._stats['completed'] += 1
+                future.set_result(result)
+
+    def stats(self):
+        """争用指标快照（耗时单位为毫秒）"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats['queue_depth'] = self._depth
+        finished = stats['completed'] + stats['failed']
+        stats['queue_wait_ms_avg'] = stats['queue_wait_ms_total'] / finished if finished else 0.0
+        stats['exec_ms_avg'] = stats['exec_ms_total'] / finished if finished else 0.0
+        stats['begin_wait_ms_avg'] = stats['begin_wait_ms_total'] / finished if finished else 0.0
+        stats['lock_wait_ms_avg'] = stats['lock_wait_ms_total'] / stats['lock_waits'] if stats['lock_waits'] else 0.0
+        return stats
+
+    def shutdown(self, timeout=5.0):
+        """执行完已提交的写事务并停止写线程（可重复调用）"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+
 class Database:
     """改进的数据库管理类
     
@@ -37,21 +601,47 @@ class Database:
     4. 统一的错误处理和日志记录
     """
     
+    GUI_FLUSH_TIMEOUT = 0.5  # 秒，界面线程等待异步日志落库的上限
+    
     def __init__(self, db_path="packing_system.db"):
         self.db_path = db_path
+        self._search_index_available = None
+        
+        # 同一进程内已初始化过的文件不再重复检查与迁移，直接共享连接池、设置缓存与日志写入器
+        opened = _lookup_open_database(db_path)
+        if opened is not None:
+            self._connection_config = opened._connection_config
+            self._pool = opened._pool
+            self._settings_cache = opened._settings_cache
+            self._log_writer = opened._log_writer
+            self._write_coordinator = opened._write_coordinator
+            return
+        
         self._connection_config = {
             'enable_wal': True,
             'cache_size_mb': 100,
             'timeout': 10.0,  # 增加超时时间到10秒
+            'pool_enabled': True,  # 启用按线程的长连接池
+            'pool_size': 4,  # 每个线程保留的空闲连接数
+            'async_logging': True,  # 操作日志由后台线程批量写入
         }
+        self._pool = ConnectionPool(
+            self._open_connection,
+            max_idle=self._connection_config['pool_size']
+        )
+        self._settings_cache = SettingsCache()
+        self._log_writer = OperationLogWriter(self)
+        self._write_coordinator = WriteCoordinator(self)
         
         try:
             # 检查并修复无效的数据库文件
             self._check_and_repair_database()
-            # 初始化数据库结构
+            # 初始化数据库结构（已是最新版本时只读取一次 user_version）
             self.init_database()
             # 加载连接配置
             self._load_connection_config()
+            with _open_databases_lock:
+                _open_databases.setdefault(os.path.abspath(db_path), self)
             logger.info(f"数据库初始化成功: {self.db_path}")
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}", exc_info=True)
@@ -97,14 +687,40 @@ class Database:
         
         注意：调用者需要手动关闭连接
         建议使用 connection_context() 上下文管理器代替
+        
+        启用连接池时返回池中的长连接，close() 会将其归还到池中
         """
+        if self._connection_config['pool_enabled']:
+            return self._pool.acquire()
+        return self._open_connection(pooled=False)
+    
+    def _open_connection(self, pooled=True):
+        """新建一个已完成PRAGMA配置的物理连接"""
         conn = sqlite3.connect(
             self.db_path, 
-            timeout=self._connection_config['timeout']
+            timeout=self._connection_config['timeout'],
+            factory=PooledConnection if pooled else sqlite3.Connection
         )
         self._configure_connection(conn)
         return conn
     
+    def close_pool(self):
+        """关闭连接池中的空闲连接（切换/删除数据库文件前调用）"""
+        self._pool.close_all()
+    
+    @property
+    def write_coordinator(self):
+        """本数据库文件的写事务协调器（同一进程内共享）"""
+        return self._write_coordinator
+    
+    def submit_write(self, fn, *args, **kwargs):
+        """提交写事务 fn(conn, ...) 到写线程，返回 Future（界面线程不会因锁等待而卡顿）"""
+        return self._write_coordinator.submit(fn, *args, **kwargs)
+    
+    def get_write_stats(self):
+        """写入争用指标"""
+        return self._write_coordinator.stats()
+    
     @contextmanager
     def connection_context(self):
         """获取数据库连接的上下文管理器
@@ -116,7 +732,7 @@ class Database:
                 conn.commit()
         
         优势：
-        - 自动管理连接的打开和关闭
+        - 自动管理连接的打开和关闭（连接池模式下为取出与归还）
         - 异常时自动回滚
         - 确保连接总是被释放
         """
@@ -139,6 +755,24 @@ class Database:
                 except:
                     pass
     
+    @contextmanager
+    def immediate_transaction(self):
+        """以 BEGIN IMMEDIATE 开启写事务的上下文管理器
+        
+        进入时即取得写锁，避免“先读后写”在多工位并发下冲突；
+        正常退出时提交，异常时回滚。
+        进程内的写入经写协调器的锁串行；当前线程已在写事务中时并入该事务。
+        界面线程中请改用 submit_write（在界面线程调用时记录一次警告）。
+        """
+        current = self._write_coordinator.current_connection()
+        if current is not None:
+            yield current
+            return
+        if _on_gui_thread():
+            _warn_gui_write()
+        with self._write_coordinator.transaction() as conn:
+            yield conn
+    
     def _configure_connection(self, conn):
         """配置数据库连接
         
@@ -195,289 +829,808 @@ class Database:
                         self._connection_config['cache_size_mb'] = int(row[0])
                     except ValueError:
                         pass
+                
+                # 读取连接池配置
+                cursor.execute(
+                    "SELECT setting_value FROM system_settings WHERE setting_key='enable_connection_pool'"
+                )
+                row = cursor.fetchone()
+                if row and isinstance(row[0], str):
+                    self._connection_config['pool_enabled'] = row[0].lower() == 'true'
                         
         except sqlite3.Error as e:
             logger.warning(f"加载连接配置失败，使用默认值: {e}")
+        
+        # 初始化阶段创建的连接使用的是默认PRAGMA，配置加载后全部失效重建
+        self._pool.close_all()
+    
+    # 当前数据库结构版本（PRAGMA user_version），新增迁移步骤时递增
+    SCHEMA_VERSION = 7
+    
+    def _migration_steps(self):
+        """编号的迁移步骤 [(版本号, 方法)]，按版本号升序执行"""
+        return [
+            (1, self._migrate_v1_base_schema),
+            (2, self._migrate_v2_number_allocation),
+            (3, self._migrate_v3_settings_version),
+            (4, self._migrate_v4_order_stats),
+            (5, self._migrate_v5_search_index),
+            (6, self._migrate_v6_pallet_membership),
+            (7, self._migrate_v7_pallet_packages_projection),
+        ]
     
     def init_database(self):
-        """初始化数据库，创建所有表"""
+        """初始化/升级数据库结构
+        
+        基于 PRAGMA user_version 的版本化迁移：
+        已是最新版本的数据库只需一次 PRAGMA 读取，否则执行尚未完成的迁移步骤
+        """
         try:
             with self.connection_context() as conn:
-                cursor = conn.cursor()
-                
-                # 创建订单表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS orders (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        order_number TEXT UNIQUE NOT NULL,
-                        customer_name TEXT,
-                        customer_address TEXT,
-                        customer_phone TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        status TEXT DEFAULT 'active',
-                        notes TEXT
-                    )
-                ''')
-                
-                # 创建板件表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS components (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        order_id INTEGER,
-                        component_name TEXT NOT NULL,
-                        material TEXT,
-                        finished_size TEXT,
-                        component_code TEXT UNIQUE NOT NULL,
-                        room_number TEXT,
-                        cabinet_number TEXT,
-                        q_code TEXT,
-                        a_code TEXT,
-                        b_code TEXT,
-                        package_id INTEGER,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        status TEXT DEFAULT 'pending',
-                        FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE,
-                        FOREIGN KEY (package_id) REFERENCES packages (id) ON DELETE SET NULL
-                    )
-                ''')
-                
-                # 创建包装表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS packages (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        package_number TEXT UNIQUE NOT NULL,
-                        order_id INTEGER,
-                        component_count INTEGER DEFAULT 0,
-                        pallet_id INTEGER,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        completed_at TIMESTAMP,
-                        status TEXT DEFAULT 'open',
-                        notes TEXT,
-                        FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE,
-                        FOREIGN KEY (pallet_id) REFERENCES pallets (id) ON DELETE SET NULL
-                    )
-                ''')
-                
-                # 创建托盘表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS pallets (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        pallet_number TEXT UNIQUE NOT NULL,
-                        pallet_type TEXT DEFAULT 'physical',
-                        order_id INTEGER,
-                        package_count INTEGER DEFAULT 0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        sealed_at TIMESTAMP,
-                        status TEXT DEFAULT 'open',
-                        notes TEXT,
-                        virtual_items TEXT
-                    )
-                ''')
-                
-                # 创建标签模板表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS label_templates (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        template_name TEXT UNIQUE NOT NULL,
-                        template_config TEXT NOT NULL,
-                        label_width INTEGER DEFAULT 100,
-                        label_height INTEGER DEFAULT 60,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_default INTEGER DEFAULT 0
-                    )
-                ''')
-                
-                # 创建系统设置表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS system_settings (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        setting_key TEXT UNIQUE NOT NULL,
-                        setting_value TEXT,
-                        setting_type TEXT DEFAULT 'string',
-                        description TEXT,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # 创建CSV导入配置表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS import_configs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        config_name TEXT UNIQUE NOT NULL,
-                        field_mapping TEXT NOT NULL,
-                        encoding TEXT DEFAULT 'utf-8',
-                        delimiter TEXT DEFAULT ',',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_default INTEGER DEFAULT 0
-                    )
-                ''')
-                
-                # 创建扫码配置表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS scan_configs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        config_name TEXT UNIQUE NOT NULL,
-                        prefix_remove INTEGER DEFAULT 0,
-                        suffix_remove INTEGER DEFAULT 0,
-                        extract_start INTEGER DEFAULT 0,
-                        extract_length INTEGER DEFAULT 0,
-                        extract_mode TEXT DEFAULT 'none',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_default INTEGER DEFAULT 0
-                    )
-                ''')
-                
-                # 创建操作日志表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS operation_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        operation_type TEXT NOT NULL,
-                        operation_data TEXT,
-                        user_name TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        can_undo INTEGER DEFAULT 1,
-                        undo_data TEXT
-                    )
-                ''')
-                
-                # 创建包装历史表（用于撤销功能）
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS package_history (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        package_id INTEGER,
-                        component_id INTEGER,
-                        operation TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (package_id) REFERENCES packages (id) ON DELETE CASCADE,
-                        FOREIGN KEY (component_id) REFERENCES components (id) ON DELETE CASCADE
-                    )
-                ''')
-                
-                # 创建托盘包装关联表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS pallet_packages (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        pallet_id INTEGER NOT NULL,
-                        package_id INTEGER NOT NULL,
-                        added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (pallet_id) REFERENCES pallets (id) ON DELETE CASCADE,
-                        FOREIGN KEY (package_id) REFERENCES packages (id) ON DELETE CASCADE,
-                        UNIQUE(pallet_id, package_id)
-                    )
-                ''')
-                
-                # 创建虚拟物品表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS virtual_items (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        pallet_id INTEGER NOT NULL,
-                        item_name TEXT NOT NULL,
-                        quantity INTEGER DEFAULT 1,
-                        unit TEXT,
-                        specification TEXT,
-                        remarks TEXT,
-                        added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (pallet_id) REFERENCES pallets (id) ON DELETE CASCADE
-                    )
-                ''')
-                
-                conn.commit()
-                
-                # 执行数据库迁移
+                current = conn.execute('PRAGMA user_version').fetchone()[0]
+                if current >= self.SCHEMA_VERSION:
+                    return
                 self.migrate_database(conn)
-                
-            # 初始化默认设置
-            self.init_default_settings()
-            
         except sqlite3.Error as e:
             logger.error(f"初始化数据库失败: {e}", exc_info=True)
             raise
     
     def migrate_database(self, conn):
-        """执行数据库迁移"""
-        cursor = conn.cursor()
+        """执行数据库迁移
         
-        try:
-            # 检查并添加customer_phone字段
-            cursor.execute("PRAGMA table_info(orders)")
-            columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'customer_phone' not in columns:
-                cursor.execute('ALTER TABLE orders ADD COLUMN customer_phone TEXT')
-                logger.info("已添加customer_phone字段到orders表")
-            
-            # 检查并添加字段到components表
-            cursor.execute("PRAGMA table_info(components)")
-            components_columns = [column[1] for column in cursor.fetchall()]
-            
-            fields_to_add = [
-                ('scanned_at', 'TIMESTAMP'),
-                ('remarks', 'TEXT'),
-                ('custom_field1', 'TEXT'),
-                ('custom_field2', 'TEXT')
-            ]
-            
-            for field_name, field_type in fields_to_add:
-                if field_name not in components_columns:
-                    cursor.execute(f'ALTER TABLE components ADD COLUMN {field_name} {field_type}')
-                    logger.info(f"已添加{field_name}字段到components表")
-            
-            # 检查并添加字段到packages表
-            cursor.execute("PRAGMA table_info(packages)")
-            packages_columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'is_manual' not in packages_columns:
-                cursor.execute('ALTER TABLE packages ADD COLUMN is_manual INTEGER DEFAULT 0')
-                logger.info("已添加is_manual字段到packages表")
-            
-            if 'packing_method' not in packages_columns:
-                cursor.execute('ALTER TABLE packages ADD COLUMN packing_method TEXT DEFAULT "scan"')
-                logger.info("已添加packing_method字段到packages表")
-
-            # 为packages添加package_index（每订单内稳定序号）
-            if 'package_index' not in packages_columns:
-                cursor.execute('ALTER TABLE packages ADD COLUMN package_index INTEGER')
-                logger.info("已添加package_index字段到packages表")
-                # 回填数据
-                self._backfill_package_indices(cursor)
-
-            # 检查并为pallets表添加order_id字段
-            cursor.execute("PRAGMA table_info(pallets)")
-            pallets_columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'order_id' not in pallets_columns:
-                cursor.execute('ALTER TABLE pallets ADD COLUMN order_id INTEGER')
-                logger.info("已为pallets表添加order_id字段")
-                # 回填数据
-                self._backfill_pallet_order_ids(cursor)
-
-            # 为pallets添加pallet_index（每订单内稳定序号）
-            if 'pallet_index' not in pallets_columns:
-                cursor.execute('ALTER TABLE pallets ADD COLUMN pallet_index INTEGER')
-                logger.info("已添加pallet_index字段到pallets表")
-                # 回填数据
-                self._backfill_pallet_indices(cursor)
-
-            # 创建索引以提升查询性能
-            self._create_indices(cursor)
-
-            # 检查并为import_configs添加custom_field_names列
-            cursor.execute("PRAGMA table_info(import_configs)")
-            import_configs_columns = [column[1] for column in cursor.fetchall()]
-            if 'custom_field_names' not in import_configs_columns:
-                cursor.execute('ALTER TABLE import_configs ADD COLUMN custom_field_names TEXT')
-                logger.info("已添加custom_field_names字段到import_configs表")
+        每个步骤在独立的 BEGIN IMMEDIATE 事务中执行并写入 user_version，
+        取得写锁后重新读取版本号，避免多个进程重复迁移。
+        """
+        for version, step in self._migration_steps():
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                current = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version <= current:
+                    conn.rollback()
+                    continue
+                step(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+                logger.info(f"数据库结构已升级到版本 {version}: {self.db_path}")
+            except sqlite3.Error as e:
+                conn.rollback()
+                logger.error(f"数据库迁移失败(版本 {version}): {e}", exc_info=True)
+                raise
+    
+    def _migrate_v1_base_schema(self, cursor):
+        """版本1：基础表结构、历史字段补齐、索引与默认设置"""
+        # 创建订单表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_number TEXT UNIQUE NOT NULL,
+                customer_name TEXT,
+                customer_address TEXT,
+                customer_phone TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT 'active',
+                notes TEXT
+            )
+        ''')
+        
+        # 创建板件表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS components (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id INTEGER,
+                component_name TEXT NOT NULL,
+                material TEXT,
+                finished_size TEXT,
+                component_code TEXT UNIQUE NOT NULL,
+                room_number TEXT,
+                cabinet_number TEXT,
+                q_code TEXT,
+                a_code TEXT,
+                b_code TEXT,
+                package_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT 'pending',
+                FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE,
+                FOREIGN KEY (package_id) REFERENCES packages (id) ON DELETE SET NULL
+            )
+        ''')
+        
+        # 创建包装表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS packages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                package_number TEXT UNIQUE NOT NULL,
+                order_id INTEGER,
+                component_count INTEGER DEFAULT 0,
+                pallet_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                completed_at TIMESTAMP,
+                status TEXT DEFAULT 'open',
+                notes TEXT,
+                FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE,
+                FOREIGN KEY (pallet_id) REFERENCES pallets (id) ON DELETE SET NULL
+            )
+        ''')
+        
+        # 创建托盘表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pallets (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pallet_number TEXT UNIQUE NOT NULL,
+                pallet_type TEXT DEFAULT 'physical',
+                order_id INTEGER,
+                package_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sealed_at TIMESTAMP,
+                status TEXT DEFAULT 'open',
+                notes TEXT,
+                virtual_items TEXT
+            )
+        ''')
+        
+        # 创建标签模板表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS label_templates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                template_name TEXT UNIQUE NOT NULL,
+                template_config TEXT NOT NULL,
+                label_width INTEGER DEFAULT 100,
+                label_height INTEGER DEFAULT 60,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_default INTEGER DEFAULT 0
+            )
+        ''')
+        
+        # 创建系统设置表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS system_settings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                setting_key TEXT UNIQUE NOT NULL,
+                setting_value TEXT,
+                setting_type TEXT DEFAULT 'string',
+                description TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 创建CSV导入配置表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS import_configs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                config_name TEXT UNIQUE NOT NULL,
+                field_mapping TEXT NOT NULL,
+                encoding TEXT DEFAULT 'utf-8',
+                delimiter TEXT DEFAULT ',',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_default INTEGER DEFAULT 0
+            )
+        ''')
+        
+        # 创建扫码配置表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_configs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                config_name TEXT UNIQUE NOT NULL,
+                prefix_remove INTEGER DEFAULT 0,
+                suffix_remove INTEGER DEFAULT 0,
+                extract_start INTEGER DEFAULT 0,
+                extract_length INTEGER DEFAULT 0,
+                extract_mode TEXT DEFAULT 'none',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_default INTEGER DEFAULT 0
+            )
+        ''')
+        
+        # 创建操作日志表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS operation_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                operation_type TEXT NOT NULL,
+                operation_data TEXT,
+                user_name TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                can_undo INTEGER DEFAULT 1,
+                undo_data TEXT
+            )
+        ''')
+        
+        # 创建包装历史表（用于撤销功能）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS package_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                package_id INTEGER,
+                component_id INTEGER,
+                operation TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (package_id) REFERENCES packages (id) ON DELETE CASCADE,
+                FOREIGN KEY (component_id) REFERENCES components (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # 创建托盘包装关联表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pallet_packages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pallet_id INTEGER NOT NULL,
+                package_id INTEGER NOT NULL,
+                added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (pallet_id) REFERENCES pallets (id) ON DELETE CASCADE,
+                FOREIGN KEY (package_id) REFERENCES packages (id) ON DELETE CASCADE,
+                UNIQUE(pallet_id, package_id)
+            )
+        ''')
+        
+        # 创建虚拟物品表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS virtual_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pallet_id INTEGER NOT NULL,
+                item_name TEXT NOT NULL,
+                quantity INTEGER DEFAULT 1,
+                unit TEXT,
+                specification TEXT,
+                remarks TEXT,
+                added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (pallet_id) REFERENCES pallets (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        self._upgrade_legacy_columns(cursor)
+        self._insert_default_settings(cursor)
+    
+    def _upgrade_legacy_columns(self, cursor):
+        """为旧版数据库补齐字段并回填数据"""
+        # 检查并添加customer_phone字段
+        cursor.execute("PRAGMA table_info(orders)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'customer_phone' not in columns:
+            cursor.execute('ALTER TABLE orders ADD COLUMN customer_phone TEXT')
+            logger.info("已添加customer_phone字段到orders表")
+        
+        # 检查并添加字段到components表
+        cursor.execute("PRAGMA table_info(components)")
+        components_columns = [column[1] for column in cursor.fetchall()]
+        
+        fields_to_add = [
+            ('scanned_at', 'TIMESTAMP'),
+            ('remarks', 'TEXT'),
+            ('custom_field1', 'TEXT'),
+            ('custom_field2', 'TEXT')
+        ]
+        
+        for field_name, field_type in fields_to_add:
+            if field_name not in components_columns:
+                cursor.execute(f'ALTER TABLE components ADD COLUMN {field_name} {field_type}')
+                logger.info(f"已添加{field_name}字段到components表")
+        
+        # 检查并添加字段到packages表
+        cursor.execute("PRAGMA table_info(packages)")
+        packages_columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'is_manual' not in packages_columns:
+            cursor.execute('ALTER TABLE packages ADD COLUMN is_manual INTEGER DEFAULT 0')
+            logger.info("已添加is_manual字段到packages表")
+        
+        if 'packing_method' not in packages_columns:
+            cursor.execute('ALTER TABLE packages ADD COLUMN packing_method TEXT DEFAULT "scan"')
+            logger.info("已添加packing_method字段到packages表")
 
-            conn.commit()
-            
-        except sqlite3.Error as e:
-            logger.error(f"数据库迁移失败: {e}", exc_info=True)
-            raise
+        # 为packages添加package_index（每订单内稳定序号）
+        if 'package_index' not in packages_columns:
+            cursor.execute('ALTER TABLE packages ADD COLUMN package_index INTEGER')
+            logger.info("已添加package_index字段到packages表")
+            # 回填数据
+            self._backfill_package_indices(cursor)
+
+        # 检查并为pallets表添加order_id字段
+        cursor.execute("PRAGMA table_info(pallets)")
+        pallets_columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'order_id' not in pallets_columns:
+            cursor.execute('ALTER TABLE pallets ADD COLUMN order_id INTEGER')
+            logger.info("已为pallets表添加order_id字段")
+            # 回填数据
+            self._backfill_pallet_order_ids(cursor)
+
+        # 为pallets添加pallet_index（每订单内稳定序号）
+        if 'pallet_index' not in pallets_columns:
+            cursor.execute('ALTER TABLE pallets ADD COLUMN pallet_index INTEGER')
+            logger.info("已添加pallet_index字段到pallets表")
+            # 回填数据
+            self._backfill_pallet_indices(cursor)
+
+        # 创建索引以提升查询性能
+        self._create_indices(cursor)
+
+        # 检查并为import_configs添加custom_field_names列
+        cursor.execute("PRAGMA table_info(import_configs)")
+        import_configs_columns = [column[1] for column in cursor.fetchall()]
+        if 'custom_field_names' not in import_configs_columns:
+            cursor.execute('ALTER TABLE import_configs ADD COLUMN custom_field_names TEXT')
+            logger.info("已添加custom_field_names字段到import_configs表")
+    
+    def _migrate_v2_number_allocation(self, cursor):
+        """版本2：包装号/托盘号序列表与订单内序号分配状态"""
+        # 创建编号序列表（按类型+日期分配包装号/托盘号）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS number_sequences (
+                kind TEXT NOT NULL,
+                day TEXT NOT NULL,
+                last_value INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, day)
+            )
+        ''')
+        
+        # 创建订单内序号分配状态表（next_free 之下的序号均已占用）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS order_index_state (
+                kind TEXT NOT NULL,
+                order_id INTEGER NOT NULL,
+                next_free INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (kind, order_id)
+            )
+        ''')
+        for kind, table, column in (('package', 'packages', 'package_index'),
+                                    ('pallet', 'pallets', 'pallet_index')):
+            # 序号被释放（删除、改序号或移到其他订单）时回退 next_free
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_index_free_delete
+                AFTER DELETE ON {table}
+                WHEN OLD.{column} IS NOT NULL
+                BEGIN
+                    UPDATE order_index_state SET next_free = OLD.{column}
+                    WHERE kind = '{kind}' AND order_id = OLD.order_id
+                      AND next_free > OLD.{column};
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_index_free_update
+                AFTER UPDATE OF {column}, order_id ON {table}
+                WHEN OLD.{column} IS NOT NULL
+                  AND (NEW.{column} IS NOT OLD.{column} OR NEW.order_id IS NOT OLD.order_id)
+                BEGIN
+                    UPDATE order_index_state SET next_free = OLD.{column}
+                    WHERE kind = '{kind}' AND order_id = OLD.order_id
+                      AND next_free > OLD.{column};
+                END
+            ''')
+    
+    def _migrate_v3_settings_version(self, cursor):
+        """版本3：设置变更计数器（供设置缓存发现其他进程的写入）"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS settings_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO settings_version (id, version) VALUES (1, 0)')
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_system_settings_version_{event.lower()}
+                AFTER {event} ON system_settings
+                BEGIN
+                    UPDATE settings_version SET version = version + 1 WHERE id = 1;
+                END
+            ''')
+    
+    # 订单统计汇总：列名 -> 单个包裹/板件对该列的贡献（NEW/OLD 由触发器替换）
+    _ORDER_STATS_COMPONENT_TERMS = {
+        'total_components': '1',
+        'packaged_components': '({row}.package_id IS NOT NULL)',
+    }
+    _ORDER_STATS_PACKAGE_TERMS = {
+        'total_packages': '1',
+        'manual_packages': '(COALESCE({row}.is_manual, 0) = 1)',
+        'manual_components_total': 'CASE WHEN COALESCE({row}.is_manual, 0) = 1 THEN COALESCE({row}.component_count, 0) ELSE 0 END',
+    }
+    ORDER_STATS_COLUMNS = ('total_components', 'packaged_components', 'total_packages',
+                           'manual_packages', 'manual_components_total')
+    
+    def _migrate_v4_order_stats(self, cursor):
+        """版本4：按订单汇总的统计计数（由 components/packages 上的触发器维护）"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS order_stats (
+                order_id INTEGER PRIMARY KEY,
+                total_components INTEGER NOT NULL DEFAULT 0,
+                packaged_components INTEGER NOT NULL DEFAULT 0,
+                total_packages INTEGER NOT NULL DEFAULT 0,
+                manual_packages INTEGER NOT NULL DEFAULT 0,
+                manual_components_total INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        for table, terms, watched in (
+            ('components', self._ORDER_STATS_COMPONENT_TERMS, 'order_id, package_id'),
+            ('packages', self._ORDER_STATS_PACKAGE_TERMS, 'order_id, is_manual, component_count'),
+        ):
+            def apply(row, sign):
+                assignments = ', '.join(
+                    f"{column} = {column} {sign} {term.format(row=row)}" for column, term in terms.items()
+                )
+                return f'''
+                    INSERT INTO order_stats (order_id) SELECT {row}.order_id
+                    WHERE {row}.order_id IS NOT NULL
+                      AND NOT EXISTS (SELECT 1 FROM order_stats WHERE order_id = {row}.order_id);
+                    UPDATE order_stats SET {assignments} WHERE order_id = {row}.order_id;
+                '''
+            changed = ' OR '.join(
+                f"(OLD.{column} IS NOT NEW.{column})" for column in watched.split(', ')
+            )
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_order_stats_insert
+                AFTER INSERT ON {table}
+                BEGIN {apply('NEW', '+')} END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_order_stats_delete
+                AFTER DELETE ON {table}
+                BEGIN {apply('OLD', '-')} END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_order_stats_update
+                AFTER UPDATE OF {watched} ON {table}
+                WHEN {changed}
+                BEGIN {apply('OLD', '-')} {apply('NEW', '+')} END
+            ''')
+        
+        self.rebuild_order_stats(cursor)
+    
+    def rebuild_order_stats(self, cursor):
+        """按明细表重新计算全部订单统计（迁移回填/数据修复使用）"""
+        cursor.execute('DELETE FROM order_stats')
+        cursor.execute('''
+            INSERT INTO order_stats (order_id, total_components, packaged_components,
+                                     total_packages, manual_packages, manual_components_total)
+            SELECT order_id, SUM(tc), SUM(pc), SUM(tp), SUM(mp), SUM(mc) FROM (
+                SELECT order_id, 1 AS tc, (package_id IS NOT NULL) AS pc, 0 AS tp, 0 AS mp, 0 AS mc
+                FROM components WHERE order_id IS NOT NULL
+                UNION ALL
+                SELECT order_id, 0, 0, 1, (COALESCE(is_manual, 0) = 1),
+                       CASE WHEN COALESCE(is_manual, 0) = 1 THEN COALESCE(component_count, 0) ELSE 0 END
+                FROM packages WHERE order_id IS NOT NULL
+            )
+            GROUP BY order_id
+        ''')
+    
+    def get_order_stats(self, order_id=None):
+        """订单统计（一次主键查询）；order_id 为 None 时返回全部订单合计
+        
+        返回 total_components / packaged_components / total_packages /
+        manual_packages / manual_components_total
+        """
+        columns = ', '.join(f'COALESCE(SUM({c}), 0)' for c in self.ORDER_STATS_COLUMNS)
+        with self.connection_context() as conn:
+            cursor = conn.cursor()
+            if order_id is None:
+                cursor.execute(f'SELECT {columns} FROM order_stats')
+            else:
+                cursor.execute(f'SELECT {columns} FROM order_stats WHERE order_id = ?', (order_id,))
+            row = cursor.fetchone()
+        return dict(zip(self.ORDER_STATS_COLUMNS, row))
+    
+    # 子串搜索索引：表 -> (FTS5 trigram 表, 被索引的编号列)
+    SEARCH_INDEXES = {
+        'components': ('components_search', 'component_code'),
+        'packages': ('packages_search', 'package_number'),
+        'pallets': ('pallets_search', 'pallet_number'),
+        'orders': ('orders_search', 'order_number'),
+    }
+    # trigram 分词至少需要3个字符，更短的关键字退回 LIKE
+    SEARCH_MIN_LENGTH = 3
+    
+    def _migrate_v5_search_index(self, cursor):
+        """版本5：编号列的 trigram 全文索引（外部内容 FTS5 表，由触发器同步）"""
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x, tokenize='trigram')")
+            cursor.execute('DROP TABLE temp._fts5_probe')
+        except sqlite3.OperationalError as e:
+            # SQLite 未编译 FTS5/trigram 时保留 LIKE 搜索
+            logger.warning(f"当前SQLite不支持FTS5 trigram，跳过搜索索引: {e}")
+            return
+        
+        for table, (fts, column) in self.SEARCH_INDEXES.items():
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                    {column}, content='{table}', content_rowid='id', tokenize='trigram'
+                )
+            ''')
+            insert = f"INSERT INTO {fts} (rowid, {column}) VALUES (NEW.id, NEW.{column});"
+            delete = f"INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', OLD.id, OLD.{column});"
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_search_insert
+                AFTER INSERT ON {table}
+                BEGIN {insert} END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_search_delete
+                AFTER DELETE ON {table}
+                BEGIN {delete} END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_search_update
+                AFTER UPDATE OF {column} ON {table}
+                WHEN OLD.{column} IS NOT NEW.{column}
+                BEGIN {delete} {insert} END
+            ''')
+            cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    
+    def rebuild_search_index(self):
+        """按明细表重建全部搜索索引（数据修复使用）"""
+        if not self.search_index_available():
+            return
+        with self.immediate_transaction() as conn:
+            for fts, _ in self.SEARCH_INDEXES.values():
+                conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    
+    def search_index_available(self):
+        """搜索索引是否已建立（结果在实例内缓存）"""
+        if self._search_index_available is None:
+            with self.connection_context() as conn:
+                row = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'components_search'"
+                ).fetchone()
+            self._search_index_available = row is not None
+        return self._search_index_available
+    
+    def search_condition(self, table, text, alias=None):
+        """编号子串匹配条件，替代 `column LIKE '%text%'`
+        
+        返回 (sql, params)。关键字不少于3个字符且索引可用时走 trigram 索引，
+        否则退回 LIKE；两者均不区分 ASCII 大小写。
+        alias 为查询中该表的别名（默认使用表名）。
+        """
+        fts, column = self.SEARCH_INDEXES[table]
+        alias = alias or table
+        if len(text) >= self.SEARCH_MIN_LENGTH and self.search_index_available():
+            phrase = '"' + text.replace('"', '""') + '"'
+            return f'{alias}.id IN (SELECT rowid FROM {fts} WHERE {fts} MATCH ?)', [phrase]
+        return f'{alias}.{column} LIKE ?', [f'%{text}%']
+    
+    def _migrate_v6_pallet_membership(self, cursor):
+        """版本6：托盘-订单归属表与托盘包裹数（由 packages/pallets 上的触发器维护）
+        
+        pallet_orders 每行表示托盘属于某订单（托盘自身的 order_id，或装有该订单的包裹），
+        冗余托盘创建时间以便按 (created_at, pallet_id) 键集分页；
+        pallets.package_count 为托盘内包裹数（packages.pallet_id 计数）。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pallet_orders (
+                order_id INTEGER NOT NULL,
+                pallet_id INTEGER NOT NULL,
+                created_at TEXT NOT NULL DEFAULT '',
+                package_count INTEGER NOT NULL DEFAULT 0,
+                is_owner INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (order_id, pallet_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_pallet_orders_keyset ON pallet_orders(order_id, created_at, pallet_id)'
+        )
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pallet_orders_pallet ON pallet_orders(pallet_id)')
+        
+        def ensure(order, pallet):
+            return f'''
+                INSERT INTO pallet_orders (order_id, pallet_id, created_at)
+                SELECT {order}, {pallet}, COALESCE((SELECT created_at FROM pallets WHERE id = {pallet}), '')
+                WHERE {order} IS NOT NULL AND {pallet} IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM pallet_orders WHERE order_id = {order} AND pallet_id = {pallet});
+            '''
+        
+        def cleanup(order, pallet):
+            return f'''
+                DELETE FROM pallet_orders
+                WHERE order_id = {order} AND pallet_id = {pallet} AND package_count <= 0 AND is_owner = 0;
+            '''
+        
+        def package(row, sign):
+            return f'''
+                {ensure(f'{row}.order_id', f'{row}.pallet_id') if sign == '+' else ''}
+                UPDATE pallet_orders SET package_count = package_count {sign} 1
+                WHERE order_id = {row}.order_id AND pallet_id = {row}.pallet_id;
+                {cleanup(f'{row}.order_id', f'{row}.pallet_id') if sign == '-' else ''}
+                UPDATE pallets SET package_count = COALESCE(package_count, 0) {sign} 1 WHERE id = {row}.pallet_id;
+            '''
+        
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_packages_pallet_insert
+            AFTER INSERT ON packages
+            WHEN NEW.pallet_id IS NOT NULL
+            BEGIN {package('NEW', '+')} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_packages_pallet_delete
+            AFTER DELETE ON packages
+            WHEN OLD.pallet_id IS NOT NULL
+            BEGIN {package('OLD', '-')} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_packages_pallet_update
+            AFTER UPDATE OF pallet_id, order_id ON packages
+            WHEN OLD.pallet_id IS NOT NEW.pallet_id OR OLD.order_id IS NOT NEW.order_id
+            BEGIN {package('OLD', '-')} {package('NEW', '+')} END
+        ''')
+        
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_pallets_membership_insert
+            AFTER INSERT ON pallets
+            WHEN NEW.order_id IS NOT NULL
+            BEGIN
+                {ensure('NEW.order_id', 'NEW.id')}
+                UPDATE pallet_orders SET is_owner = 1 WHERE order_id = NEW.order_id AND pallet_id = NEW.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_pallets_membership_owner
+            AFTER UPDATE OF order_id ON pallets
+            WHEN OLD.order_id IS NOT NEW.order_id
+            BEGIN
+                UPDATE pallet_orders SET is_owner = 0 WHERE order_id = OLD.order_id AND pallet_id = OLD.id;
+                {cleanup('OLD.order_id', 'OLD.id')}
+                {ensure('NEW.order_id', 'NEW.id')}
+                UPDATE pallet_orders SET is_owner = 1 WHERE order_id = NEW.order_id AND pallet_id = NEW.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_pallets_membership_created
+            AFTER UPDATE OF created_at ON pallets
+            WHEN OLD.created_at IS NOT NEW.created_at
+            BEGIN
+                UPDATE pallet_orders SET created_at = COALESCE(NEW.created_at, '') WHERE pallet_id = NEW.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_pallets_membership_delete
+            AFTER DELETE ON pallets
+            BEGIN
+                DELETE FROM pallet_orders WHERE pallet_id = OLD.id;
+            END
+        ''')
+        
+        self.rebuild_pallet_membership(cursor)
+    
+    def rebuild_pallet_membership(self, cursor):
+        """按明细表重新计算托盘归属与托盘包裹数（迁移回填/数据修复使用）"""
+        cursor.execute('DELETE FROM pallet_orders')
+        cursor.execute('''
+            INSERT INTO pallet_orders (order_id, pallet_id, created_at, package_count, is_owner)
+            SELECT m.order_id, m.pallet_id, COALESCE(pal.created_at, ''), SUM(m.packages), MAX(m.owner)
+            FROM (
+                SELECT order_id, id AS pallet_id, 0 AS packages, 1 AS owner
+                FROM pallets WHERE order_id IS NOT NULL
+                UNION ALL
+                SELECT order_id, pallet_id, 1, 0
+                FROM packages WHERE order_id IS NOT NULL AND pallet_id IS NOT NULL
+            ) m
+            JOIN pallets pal ON pal.id = m.pallet_id
+            GROUP BY m.order_id, m.pallet_id
+        ''')
+        cursor.execute('''
+            UPDATE pallets SET package_count = (
+                SELECT COUNT(*) FROM packages WHERE packages.pallet_id = pallets.id
+            )
+        ''')
+    
+    def _migrate_v7_pallet_packages_projection(self, cursor):
+        """版本7：托盘-包裹关联以 packages.pallet_id 为准，pallet_packages 改为触发器维护的投影
+        
+        先按 packages.pallet_id 一次性对齐已有数据，再建立每个包裹至多一行的唯一索引与同步触发器。
+        """
+        result = self.reconcile_pallet_packages(cursor)
+        logger.info(
+            f"托盘-包裹关联对齐: 清除失效托盘引用 {result['orphaned']} 个, "
+            f"移除 {result['removed']} 行, 补充 {result['added']} 行"
+        )
+        cursor.execute(
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_pallet_packages_package ON pallet_packages(package_id)'
+        )
+        insert = '''
+            INSERT INTO pallet_packages (pallet_id, package_id)
+            SELECT NEW.pallet_id, NEW.id WHERE NEW.pallet_id IS NOT NULL;
+        '''
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_packages_projection_insert
+            AFTER INSERT ON packages
+            WHEN NEW.pallet_id IS NOT NULL
+            BEGIN {insert} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_packages_projection_update
+            AFTER UPDATE OF pallet_id ON packages
+            WHEN OLD.pallet_id IS NOT NEW.pallet_id
+            BEGIN
+                DELETE FROM pallet_packages WHERE package_id = NEW.id;
+                {insert}
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_packages_projection_delete
+            AFTER DELETE ON packages
+            BEGIN
+                DELETE FROM pallet_packages WHERE package_id = OLD.id;
+            END
+        ''')
+    
+    def reconcile_pallet_packages(self, cursor=None):
+        """按 packages.pallet_id 重建 pallet_packages 投影（迁移与数据修复使用）
+        
+        清除指向已删除托盘的 packages.pallet_id，删除与 packages.pallet_id 不一致的关联行，
+        补充缺失行（保留一致行的加入时间）。
+        不传 cursor 时在独立写事务中执行。返回 {'orphaned', 'removed', 'added'}。
+        """
+        if cursor is None:
+            with self.immediate_transaction() as conn:
+                return self.reconcile_pallet_packages(conn.cursor())
+        cursor.execute('''
+            UPDATE packages SET pallet_id = NULL
+            WHERE pallet_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM pallets WHERE pallets.id = packages.pallet_id)
+        ''')
+        orphaned = cursor.rowcount
+        cursor.execute('''
+            DELETE FROM pallet_packages
+            WHERE NOT EXISTS (
+                SELECT 1 FROM packages p
+                WHERE p.id = pallet_packages.package_id AND p.pallet_id = pallet_packages.pallet_id
+            )
+        ''')
+        removed = cursor.rowcount
+        cursor.execute('''
+            INSERT INTO pallet_packages (pallet_id, package_id)
+            SELECT p.pallet_id, p.id FROM packages p
+            WHERE p.pallet_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM pallet_packages pp WHERE pp.package_id = p.id)
+        ''')
+        return {'orphaned': orphaned, 'removed': removed, 'added': cursor.rowcount}
+    
+    def _order_pallets_filter(self, order_id, search_text):
+        """订单托盘列表的过滤条件（pallet_orders 别名 po，pallets 别名 p）"""
+        where = 'po.order_id = ?'
+        params = [order_id]
+        if search_text:
+            condition, search_params = self.search_condition('pallets', search_text, 'p')
+            where += f' AND {condition}'
+            params.extend(search_params)
+        return where, params
+    
+    def count_order_pallets(self, order_id, search_text=''):
+        """订单的托盘数（托盘本身属于该订单或装有该订单的包裹）"""
+        where, params = self._order_pallets_filter(order_id, search_text)
+        with self.connection_context() as conn:
+            row = conn.execute(f'''
+                SELECT COUNT(*) FROM pallet_orders po
+                JOIN pallets p ON p.id = po.pallet_id
+                WHERE {where}
+            ''', params).fetchone()
+        return row[0] or 0
+    
+    def get_order_pallets_page(self, order_id, search_text='', limit=100, after=None):
+        """按创建时间倒序分页读取订单的托盘（键集分页）
+        
+        after 为上一页最后一行的分页键 (created_at, pallet_id)，第一页传 None；
+        每页代价与页码无关。返回行：
+        (id, pallet_number, pallet_type, status, created_at, package_count, pallet_index, 分页键)
+        """
+        where, params = self._order_pallets_filter(order_id, search_text)
+        if after is not None:
+            where += ' AND (po.created_at, po.pallet_id) < (?, ?)'
+            params.extend(after)
+        with self.connection_context() as conn:
+            rows = conn.execute(f'''
+                SELECT p.id, p.pallet_number, p.pallet_type, p.status, p.created_at,
+                       COALESCE(p.package_count, 0), p.pallet_index, po.created_at
+                FROM pallet_orders po
+                JOIN pallets p ON p.id = po.pallet_id
+                WHERE {where}
+                ORDER BY po.created_at DESC, po.pallet_id DESC
+                LIMIT ?
+            ''', params + [limit]).fetchall()
+        return [row[:7] + ((row[7], row[0]),) for row in rows]
     
     def _backfill_package_indices(self, cursor):
         """回填包裹的稳定序号"""
@@ -566,6 +1719,12 @@ class Database:
     
     def init_default_settings(self):
         """初始化默认系统设置"""
+        with self.connection_context() as conn:
+            self._insert_default_settings(conn.cursor())
+            conn.commit()
+    
+    def _insert_default_settings(self, cursor):
+        """写入默认系统设置、扫码/导入配置与标签模板（已存在则跳过）"""
         default_settings = [
             ('package_number_format', 'YYYYMMDD{:04d}', 'string', '包装号格式'),
             ('pallet_number_format', 'T{date}{:04d}', 'string', '托盘号格式'),
@@ -576,75 +1735,79 @@ class Database:
             ('default_label_template', '1', 'integer', '默认标签模板ID'),
             ('enable_wal', 'true', 'boolean', '启用SQLite WAL模式'),
             ('cache_size', '100', 'integer', 'SQLite缓存大小（MB）'),
+            ('enable_connection_pool', 'true', 'boolean', '启用数据库长连接池'),
             ('pallets_page_size', '100', 'integer', '托盘列表每页行数'),
             ('packages_page_size', '100', 'integer', '包裹列表每页行数'),
         ]
         
-        with self.connection_context() as conn:
-            cursor = conn.cursor()
-            
-            for key, value, type_, desc in default_settings:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO system_settings 
-                    (setting_key, setting_value, setting_type, description)
-                    VALUES (?, ?, ?, ?)
-                ''', (key, value, type_, desc))
-            
-            # 创建默认扫码配置
+        for key, value, type_, desc in default_settings:
             cursor.execute('''
-                INSERT OR IGNORE INTO scan_configs 
-                (config_name, prefix_remove, suffix_remove, extract_mode, is_default)
-                VALUES ('默认配置-不处理', 0, 0, 'none', 1)
-            ''')
-            
-            # 创建默认导入配置
-            default_mapping = {
-                'order_number': '订单号',
-                'component_name': '板件名',
-                'material': '材质',
-                'finished_size': '成品尺寸',
-                'component_code': '板件编码',
-                'room_number': '房间号',
-                'cabinet_number': '柜号'
-            }
-            
-            cursor.execute('''
-                INSERT OR IGNORE INTO import_configs 
-                (config_name, field_mapping, is_default)
-                VALUES ('默认导入配置', ?, 1)
-            ''', (json.dumps(default_mapping, ensure_ascii=False),))
-            
-            # 创建默认标签模板
-            default_template = {
-                'fields': [
-                    {'type': 'text', 'content': '包装号: {package_number}', 'x': 10, 'y': 10, 'font_size': 12},
-                    {'type': 'text', 'content': '订单号: {order_number}', 'x': 10, 'y': 25, 'font_size': 10},
-                    {'type': 'text', 'content': '客户: {customer_name}', 'x': 10, 'y': 40, 'font_size': 10},
-                    {'type': 'text', 'content': '板件数: {component_count}', 'x': 10, 'y': 55, 'font_size': 10},
-                    {'type': 'qrcode', 'content': '{package_number}', 'x': 200, 'y': 10, 'size': 50}
-                ]
-            }
-            
-            cursor.execute('''
-                INSERT OR IGNORE INTO label_templates 
-                (template_name, template_config, is_default)
-                VALUES ('默认标签模板', ?, 1)
-            ''', (json.dumps(default_template, ensure_ascii=False),))
-            
-            conn.commit()
+                INSERT OR IGNORE INTO system_settings 
+                (setting_key, setting_value, setting_type, description)
+                VALUES (?, ?, ?, ?)
+            ''', (key, value, type_, desc))
+        
+        # 创建默认扫码配置
+        cursor.execute('''
+            INSERT OR IGNORE INTO scan_configs 
+            (config_name, prefix_remove, suffix_remove, extract_mode, is_default)
+            VALUES ('默认配置-不处理', 0, 0, 'none', 1)
+        ''')
+        
+        # 创建默认导入配置
+        default_mapping = {
+            'order_number': '订单号',
+            'component_name': '板件名',
+            'material': '材质',
+            'finished_size': '成品尺寸',
+            'component_code': '板件编码',
+            'room_number': '房间号',
+            'cabinet_number': '柜号'
+        }
+        
+        cursor.execute('''
+            INSERT OR IGNORE INTO import_configs 
+            (config_name, field_mapping, is_default)
+            VALUES ('默认导入配置', ?, 1)
+        ''', (json.dumps(default_mapping, ensure_ascii=False),))
+        
+        # 创建默认标签模板
+        default_template = {
+            'fields': [
+                {'type': 'text', 'content': '包装号: {package_number}', 'x': 10, 'y': 10, 'font_size': 12},
+                {'type': 'text', 'content': '订单号: {order_number}', 'x': 10, 'y': 25, 'font_size': 10},
+                {'type': 'text', 'content': '客户: {customer_name}', 'x': 10, 'y': 40, 'font_size': 10},
+                {'type': 'text', 'content': '板件数: {component_count}', 'x': 10, 'y': 55, 'font_size': 10},
+                {'type': 'qrcode', 'content': '{package_number}', 'x': 200, 'y': 10, 'size': 50}
+            ]
+        }
+        
+        cursor.execute('''
+            INSERT OR IGNORE INTO label_templates 
+            (template_name, template_config, is_default)
+            VALUES ('默认标签模板', ?, 1)
+        ''', (json.dumps(default_template, ensure_ascii=False),))
     
     def get_setting(self, key, default=None):
-        """获取系统设置"""
+        """获取系统设置（原始字符串，经设置缓存）"""
         try:
-            with self.connection_context() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT setting_value FROM system_settings WHERE setting_key = ?', (key,))
-                result = cursor.fetchone()
-                return result[0] if result else default
+            return self._settings_cache.get(self, key, default)
+        except sqlite3.Error as e:
+            logger.error(f"获取设置失败 {key}: {e}")
+            return default
+    
+    def get_typed_setting(self, key, default=None):
+        """获取按 setting_type 转换后的系统设置（integer/float/boolean/json）"""
+        try:
+            return self._settings_cache.get_typed(self, key, default)
         except sqlite3.Error as e:
             logger.error(f"获取设置失败 {key}: {e}")
             return default
     
+    def get_settings_cache_stats(self):
+        """设置缓存命中统计"""
+        return self._settings_cache.stats()
+    
     def set_setting(self, key, value):
         """设置系统设置"""
         try:
@@ -661,114 +1824,336 @@ class Database:
                     INSERT OR REPLACE INTO system_settings (setting_key, setting_value, updated_at)
                     VALUES (?, ?, CURRENT_TIMESTAMP)
                 ''', (key, value_str))
+                version = SettingsCache._read_version(cursor)
                 conn.commit()
+            self._settings_cache.put(key, value_str, 'string', version)
         except sqlite3.Error as e:
+            self._settings_cache.invalidate()
             logger.error(f"设置配置失败 {key}: {e}")
             raise
     
+    # 编号序列：kind -> (表, 编号列, 编号前缀)
+    _NUMBER_SEQUENCES = {
+        'package': ('packages', 'package_number', ''),
+        'pallet': ('pallets', 'pallet_number', 'T'),
+        'virtual_pallet': ('pallets', 'pallet_number', 'VT'),
+    }
+    
+    def _allocate_numbers(self, cursor, kind, count=1):
+        """在调用方事务内从 number_sequences 分配 count 个编号
+        
+        当天首次分配时按已有最大编号初始化序列（兼容旧数据），
+        之后每次分配只需一次主键读写；被其他写入方占用的编号经唯一索引探测后跳过。
+        """
+        table, column, prefix = self._NUMBER_SEQUENCES[kind]
+        day = datetime.now().strftime('%Y%m%d')
+        number_prefix = f"{prefix}{day}"
+        
+        cursor.execute(
+            'SELECT last_value FROM number_sequences WHERE kind = ? AND day = ?',
+            (kind, day)
+        )
+        row = cursor.fetchone()
+        if row:
+            last_value = row[0]
+        else:
+            # 编号均为 前缀+日期+数字，使用范围条件以便走唯一索引
+            cursor.execute(f'''
+                SELECT MAX(CAST(SUBSTR({column}, ?) AS INTEGER)) FROM {table}
+                WHERE {column} >= ? AND {column} < ?
+            ''', (len(number_prefix) + 1, number_prefix, number_prefix + ':'))
+            last_value = cursor.fetchone()[0] or 0
+        
+        numbers = []
+        sequence = last_value
+        while len(numbers) < count:
+            sequence += 1
+            number = f"{number_prefix}{sequence:04d}"
+            cursor.execute(f'SELECT 1 FROM {table} WHERE {column} = ?', (number,))
+            if not cursor.fetchone():
+                numbers.append(number)
+        
+        cursor.execute('''
+            INSERT INTO number_sequences (kind, day, last_value) VALUES (?, ?, ?)
+            ON CONFLICT(kind, day) DO UPDATE SET last_value = excluded.last_value
+        ''', (kind, day, sequence))
+        return numbers
+    
+    def reserve_numbers(self, kind, count=1):
+        """以 BEGIN IMMEDIATE 事务原子地预留 count 个编号（多工位并发安全）"""
+        if count < 1:
+            return []
+        with self.immediate_transaction() as conn:
+            return self._allocate_numbers(conn.cursor(), kind, count)
+    
+    def reserve_package_numbers(self, count):
+        """批量预留包装号（批量打包使用）"""
+        return self.reserve_numbers('package', count)
+    
     def generate_package_number(self):
         """生成包装号"""
-        today = datetime.now().strftime('%Y%m%d')
+        return self.reserve_numbers('package', 1)[0]
+    
+    def generate_pallet_number(self, is_virtual=False):
+        """生成托盘号（序列表分配，保证唯一，避免当天删除或并发导致重复）"""
+        return self.reserve_numbers('virtual_pallet' if is_virtual else 'pallet', 1)[0]
+
+    # 订单内稳定序号：kind -> (表, 序号列)
+    _ORDER_INDEX_COLUMNS = {
+        'package': ('packages', 'package_index'),
+        'pallet': ('pallets', 'pallet_index'),
+    }
+    
+    def _allocate_order_indices(self, cursor, kind, order_id, count=1):
+        """在调用方事务内为订单分配 count 个连续的稳定序号（填补最低缺口）
         
-        with self.connection_context() as conn:
+        order_index_state.next_free 保证“小于它的序号均已占用”：
+        - 删除/改序号/改订单时由触发器将其回退到释放的序号
+        - 分配时从 next_free 起沿 (order_id, 序号) 索引探测第一个能容纳 count 个序号的空档
+        本方法不预占序号，调用方插入失败不会留下空洞。
+        """
+        table, column = self._ORDER_INDEX_COLUMNS[kind]
+        cursor.execute(
+            'SELECT next_free FROM order_index_state WHERE kind = ? AND order_id = ?',
+            (kind, order_id)
+        )
+        row = cursor.fetchone()
+        start = row[0] if row else 1
+        first_free = None
+        
+        while True:
+            # start 之后第一个已占用的序号
+            cursor.execute(f'''
+                SELECT MIN({column}) FROM {table}
+                WHERE order_id = ? AND {column} >= ?
+            ''', (order_id, start))
+            next_used = cursor.fetchone()[0]
+            if next_used is not None and next_used == start:
+                # start 已被占用：跳到该连续占用段之后的第一个空位
+                cursor.execute(f'''
+                    SELECT t.{column} + 1 FROM {table} t
+                    WHERE t.order_id = ? AND t.{column} >= ?
+                      AND NOT EXISTS (
+                          SELECT 1 FROM {table} u
+                          WHERE u.order_id = t.order_id AND u.{column} = t.{column} + 1
+                      )
+                    ORDER BY t.{column} ASC
+                    LIMIT 1
+                ''', (order_id, start))
+                start = cursor.fetchone()[0]
+                continue
+            if first_free is None:
+                first_free = start
+            if next_used is None or next_used - start >= count:
+                break
+            start = next_used
+        
+        cursor.execute('''
+            INSERT INTO order_index_state (kind, order_id, next_free) VALUES (?, ?, ?)
+            ON CONFLICT(kind, order_id) DO UPDATE SET next_free = excluded.next_free
+        ''', (kind, order_id, first_free))
+        return list(range(start, start + count))
+    
+    def allocate_order_indices(self, conn, kind, order_id, count=1):
+        """在调用方的写事务 conn 内为订单分配 count 个连续的稳定序号（kind: 'package' 或 'pallet'）
+        
+        序号不单独预占：调用方必须在同一事务内插入使用这些序号的行，
+        多工位并发时由 BEGIN IMMEDIATE 写锁保证不会分到相同序号。
+        """
+        if not conn.in_transaction:
+            raise RuntimeError("订单内序号必须在写事务内分配，并在同一事务内插入")
+        if count < 1:
+            return []
+        return self._allocate_order_indices(conn.cursor(), kind, order_id, count)
+    
+    def allocate_package_index(self, conn, order_id):
+        """在写事务 conn 内分配该订单下包裹的下一个稳定序号（填补缺口）"""
+        return self.allocate_order_indices(conn, 'package', order_id, 1)[0]
+
+    def allocate_pallet_index(self, conn, order_id):
+        """在写事务 conn 内分配该订单下托盘的下一个稳定序号（填补缺口）"""
+        return self.allocate_order_indices(conn, 'pallet', order_id, 1)[0]
+    
+    # 批量打包的拆分方式：split_by -> (分组键取值, 包装的打包方式)
+    _PACK_SPLITS = {
+        None: (lambda room, cabinet: None, 'mixed'),
+        'room': (lambda room, cabinet: room or '', 'by_room'),
+        'cabinet': (lambda room, cabinet: (room or '', cabinet or ''), 'by_cabinet'),
+    }
+    
+    def pack_components(self, component_ids, split_by=None, is_manual=True, user_name='system'):
+        """在一个事务内把一批板件打包到一个或多个新包装
+        
+        - split_by: None 全部放入一个包装（每个订单一个）；'room' 按房间号拆分；
+          'cabinet' 按房间号+柜号拆分
+        - 包装号与订单内序号整块分配，板件用 json_each 集合更新
+        - 已被其他工位入包的板件自动跳过
+        返回新包装列表 [{'package_id', 'package_number', 'package_index', 'order_id',
+        'group', 'component_ids'}]
+        """
+        group_key, packing_method = self._PACK_SPLITS[split_by]
+        ids_json = json.dumps([int(component_id) for component_id in component_ids])
+        
+        with self.immediate_transaction() as conn:
             cursor = conn.cursor()
-            
-            # 查找今天最大的包装号序号
             cursor.execute('''
-                SELECT package_number FROM packages 
-                WHERE package_number LIKE ?
-                ORDER BY package_number DESC
-                LIMIT 1
-            ''', (f"{today}%",))
+                SELECT id, order_id, room_number, cabinet_number FROM components
+                WHERE id IN (SELECT value FROM json_each(?)) AND package_id IS NULL
+                ORDER BY id
+            ''', (ids_json,))
+            groups = {}
+            for component_id, order_id, room, cabinet in cursor.fetchall():
+                groups.setdefault((order_id, group_key(room, cabinet)), []).append(component_id)
+            if not groups:
+                return []
             
-            result = cursor.fetchone()
-            if result:
-                # 提取序号部分并加1
-                last_number = result[0]
-                sequence = int(last_number[-4:]) + 1
-            else:
-                # 今天第一个包装
-                sequence = 1
+            numbers = iter(self._allocate_numbers(cursor, 'package', len(groups)))
+            indices = {}
+            for order_id in {order_id for order_id, _ in groups}:
+                count = sum(1 for key in groups if key[0] == order_id)
+                indices[order_id] = iter(
+                    self._allocate_order_indices(cursor, 'package', order_id, count)
+                    if order_id is not None else [None] * count
+                )
             
-            # 生成新的包装号，如果重复则继续递增
-            while True:
-                package_number = f"{today}{sequence:04d}"
-                
-                # 检查是否已存在
-                cursor.execute('SELECT 1 FROM packages WHERE package_number = ?', (package_number,))
-                if not cursor.fetchone():
-                    return package_number
-                
-                sequence += 1
+            packages = []
+            for (order_id, group), ids in groups.items():
+                package_number = next(numbers)
+                package_index = next(indices[order_id])
+                cursor.execute('''
+                    INSERT INTO packages (package_number, order_id, package_index, packing_method,
+                                          status, created_at, is_manual, component_count)
+                    VALUES (?, ?, ?, ?, 'open', CURRENT_TIMESTAMP, ?, ?)
+                ''', (package_number, order_id, package_index, packing_method, 1 if is_manual else 0, len(ids)))
+                package_id = cursor.lastrowid
+                cursor.execute('''
+                    UPDATE components
+                    SET package_id = ?, scanned_at = CURRENT_TIMESTAMP, status = 'packed'
+                    WHERE id IN (SELECT value FROM json_each(?)) AND package_id IS NULL
+                ''', (package_id, json.dumps(ids)))
+                packages.append({
+                    'package_id': package_id,
+                    'package_number': package_number,
+                    'package_index': package_index,
+                    'order_id': order_id,
+                    'group': group,
+                    'component_ids': ids,
+                })
+            
+            self.log_operation('pack_components', {
+                'split_by': split_by,
+                'packages': [
+                    {'package_number': p['package_number'], 'component_count': len(p['component_ids'])}
+                    for p in packages
+                ],
+            }, user_name=user_name, conn=conn)
+        return packages
     
-    def generate_pallet_number(self, is_virtual=False):
-        """生成托盘号（保证唯一，避免当天删除或并发导致重复）"""
-        today = datetime.now().strftime('%Y%m%d')
-        prefix = 'VT' if is_virtual else 'T'
-
+    def check_pallet_batch(self, pallet_id, package_numbers):
+        """批量装托前的集合校验（一次查询）
+        
+        返回 {'pallet_status', 'missing': [包裹号], 'packages': [dict]}，
+        packages 按 package_numbers 顺序给出 package_id / package_number / order_id /
+        order_number / status / pallet_id / pallet_number
+        """
+        numbers = list(dict.fromkeys(package_numbers))
         with self.connection_context() as conn:
             cursor = conn.cursor()
-            # 基础序列：当日同类型托盘计数 + 1
+            cursor.execute('SELECT status FROM pallets WHERE id = ?', (pallet_id,))
+            row = cursor.fetchone()
             cursor.execute('''
-                SELECT COUNT(*) FROM pallets 
-                WHERE DATE(created_at) = DATE('now') AND pallet_type = ?
-            ''', ('virtual' if is_virtual else 'physical',))
-            sequence = (cursor.fetchone()[0] or 0) + 1
-
-            # 循环校验唯一性，若已存在则序列递增
-            while True:
-                pallet_number = f"{prefix}{today}{sequence:04d}"
-                cursor.execute('SELECT 1 FROM pallets WHERE pallet_number = ?', (pallet_number,))
-                if not cursor.fetchone():
-                    return pallet_number
-                sequence += 1
-
-    def get_next_package_index(self, order_id):
-        """获取该订单下包裹的下一个稳定序号（填补缺口）"""
-        with self.connection_context() as conn:
+                SELECT pkg.id, pkg.package_number, pkg.order_id, o.order_number,
+                       pkg.status, pkg.pallet_id, pal.pallet_number
+                FROM packages pkg
+                LEFT JOIN orders o ON o.id = pkg.order_id
+                LEFT JOIN pallets pal ON pal.id = pkg.pallet_id
+                WHERE pkg.package_number IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(numbers, ensure_ascii=False),))
+            found = {
+                r[1]: dict(zip(('package_id', 'package_number', 'order_id', 'order_number',
+                                'status', 'pallet_id', 'pallet_number'), r))
+                for r in cursor.fetchall()
+            }
+        return {
+            'pallet_status': row[0] if row else None,
+            'missing': [n for n in numbers if n not in found],
+            'packages': [found[n] for n in numbers if n in found],
+        }
+    
+    def load_packages_to_pallet(self, pallet_id, package_ids, user_name='system'):
+        """在一个事务内把一批包裹装入托盘
+        
+        已完成(completed)的包裹同时置为已封包(sealed)；未封包(open)的包裹跳过。
+        托盘已封托/关闭时抛出 ValueError。返回实际装入的包裹ID列表。
+        """
+        ids_json = json.dumps([int(package_id) for package_id in package_ids])
+        with self.immediate_transaction() as conn:
             cursor = conn.cursor()
+            cursor.execute('SELECT pallet_number, status FROM pallets WHERE id = ?', (pallet_id,))
+            pallet = cursor.fetchone()
+            if not pallet:
+                raise ValueError("托盘不存在")
+            if str(pallet[1] or '').strip().lower() in ('sealed', 'closed'):
+                raise ValueError(f"托盘 {pallet[0]} 已封托或已关闭，不能添加包裹")
             cursor.execute('''
-                SELECT package_index FROM packages 
-                WHERE order_id = ? AND package_index IS NOT NULL
-                ORDER BY package_index ASC
-            ''', (order_id,))
-            indices = [row[0] for row in cursor.fetchall() if row and row[0] is not None]
-            used = set(indices)
-            i = 1
-            while i in used:
-                i += 1
-            return i
-
-    def get_next_pallet_index(self, order_id):
-        """获取该订单下托盘的下一个稳定序号（填补缺口）"""
-        with self.connection_context() as conn:
-            cursor = conn.cursor()
+                SELECT id, package_number FROM packages
+                WHERE id IN (SELECT value FROM json_each(?))
+                  AND LOWER(COALESCE(NULLIF(TRIM(status), ''), 'open')) != 'open'
+                  AND pallet_id IS NOT ?
+                ORDER BY id
+            ''', (ids_json, pallet_id))
+            rows = cursor.fetchall()
+            if not rows:
+                return []
+            loaded_json = json.dumps([r[0] for r in rows])
             cursor.execute('''
-                SELECT pallet_index FROM pallets 
-                WHERE order_id = ? AND pallet_index IS NOT NULL
-                ORDER BY pallet_index ASC
-            ''', (order_id,))
-            indices = [row[0] for row in cursor.fetchall() if row and row[0] is not None]
-            used = set(indices)
-            i = 1
-            while i in used:
-                i += 1
-            return i
-    
-    def log_operation(self, operation_type, operation_data, user_name='system', undo_data=None):
-        """记录操作日志"""
-        try:
-            with self.connection_context() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO operation_logs 
-                    (operation_type, operation_data, user_name, undo_data)
-                    VALUES (?, ?, ?, ?)
-                ''', (operation_type, json.dumps(operation_data, ensure_ascii=False), user_name, 
-                      json.dumps(undo_data, ensure_ascii=False) if undo_data else None))
-                conn.commit()
-        except sqlite3.Error as e:
-            logger.error(f"记录操作日志失败: {e}")
+                UPDATE packages
+                SET pallet_id = ?,
+                    status = CASE WHEN LOWER(TRIM(status)) = 'completed' THEN 'sealed' ELSE status END
+                WHERE id IN (SELECT value FROM json_each(?))
+            ''', (pallet_id, loaded_json))
+            self.log_operation('add_to_pallet', {
+                'pallet_number': pallet[0],
+                'package_numbers': [r[1] for r in rows],
+            }, user_name=user_name, conn=conn)
+        return [r[0] for r in rows]
+    
+    def log_operation(self, operation_type, operation_data, user_name='system', undo_data=None, conn=None):
+        """记录操作日志
+        
+        默认交给后台批量写入器异步落库；
+        传入 conn 时在调用方的事务内插入（不提交），日志与数据变更一起提交或回滚。
+        """
+        row = (
+            operation_type,
+            json.dumps(operation_data, ensure_ascii=False),
+            user_name,
+            json.dumps(undo_data, ensure_ascii=False) if undo_data else None,
+            datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),  # 与 CURRENT_TIMESTAMP 一致(UTC)
+        )
+        if conn is not None:
+            conn.execute(OperationLogWriter.INSERT_SQL, row)
+            return
+        if not self._connection_config['async_logging']:
+            self._log_writer._write([row])
+            return
+        self._log_writer.submit(row)
+    
+    def flush_operation_logs(self, timeout=None):
+        """等待异步日志全部写入（读取 operation_logs 前调用）
+        
+        界面线程默认最多等待 GUI_FLUSH_TIMEOUT 秒，写线程繁忙时读到的日志可能略有滞后
+        """
+        if timeout is None:
+            timeout = self.GUI_FLUSH_TIMEOUT if _on_gui_thread() else 5.0
+        done = self._log_writer.flush(timeout)
+        if not done:
+            logger.info(f"操作日志未在 {timeout} 秒内写完，继续读取")
+        return done
+    
+    def shutdown_log_writer(self, timeout=5.0):
+        """写完剩余日志并停止后台写入线程（程序退出时调用）"""
+        self._log_writer.shutdown(timeout)
 
 
 # 全局数据库实例
@@ -9,6 +9,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
 from PyQt5.QtCore import Qt, QDate, pyqtSignal
 from PyQt5.QtGui import QFont, QIcon
 from database import db
+from scan_service import scan_service
 
 # 统一交互提示助手
 class Prompt:
@@ -83,10 +84,20 @@ class UndoManager:
         try:
             conn = db.get_connection()
             cursor = conn.cursor()
+            # 提交后需要同步到扫码规则状态缓存的变化
+            removed_component = None
+            stale_package_id = None
+            deleted_package_id = None
             
             if operation['type'] == 'scan_component':
                 # 撤销扫描板件
                 component_id = operation['data']['component_id']
+                cursor.execute(
+                    'SELECT package_id, room_number, cabinet_number FROM components WHERE id = ?',
+                    (component_id,)
+                )
+                row = cursor.fetchone()
+                removed_component = (component_id,) + tuple(row) if row else None
                 cursor.execute('''
                     UPDATE components 
                     SET package_id = NULL, scanned_at = NULL, status = 'pending'
@@ -104,6 +115,7 @@ class UndoManager:
                     SET status = 'active', updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
                 ''', (package_id,))
+                stale_package_id = package_id
                 
                 # 记录操作日志
                 db.log_operation('undo_finish_package', f"撤销完成包装 ID: {package_id}")
@@ -112,9 +124,10 @@ class UndoManager:
                 # 撤销添加到托盘
                 package_id = operation['data']['package_id']
                 pallet_id = operation['data']['pallet_id']
+                # 关联以 packages.pallet_id 为准，pallet_packages 由触发器同步
                 cursor.execute('''
-                    DELETE FROM pallet_packages 
-                    WHERE package_id = ? AND pallet_id = ?
+                    UPDATE packages SET pallet_id = NULL
+                    WHERE id = ? AND pallet_id = ?
                 ''', (package_id, pallet_id))
                 
                 # 记录操作日志
@@ -146,6 +159,7 @@ class UndoManager:
                 
                 # 删除包装
                 cursor.execute('DELETE FROM packages WHERE id = ?', (package_id,))
+                deleted_package_id = package_id
                 
                 # 记录操作日志
                 db.log_operation('undo_create_package', f"撤销创建包装 ID: {package_id}")
@@ -154,8 +168,8 @@ class UndoManager:
                 # 撤销创建托盘
                 pallet_id = operation['data']['pallet_id']
                 
-                # 删除托盘包装关联
-                cursor.execute('DELETE FROM pallet_packages WHERE pallet_id = ?', (pallet_id,))
+                # 移出托盘内的包装
+                cursor.execute('UPDATE packages SET pallet_id = NULL WHERE pallet_id = ?', (pallet_id,))
                 
                 # 删除虚拟物品
                 cursor.execute('DELETE FROM virtual_items WHERE pallet_id = ?', (pallet_id,))
@@ -169,6 +183,13 @@ class UndoManager:
             conn.commit()
             conn.close()
             
+            if removed_component and removed_component[1]:
+                scan_service.on_component_removed(*removed_component)
+            if stale_package_id is not None:
+                scan_service.invalidate_package(stale_package_id)
+            if deleted_package_id is not None:
+                scan_service.on_package_deleted(deleted_package_id)
+            
             return True, f"成功撤销操作: {operation['description']}"
             
         except Exception as e:
@@ -664,6 +685,7 @@ class ErrorHandling(QWidget):
     
     def filter_logs(self):
         """过滤日志"""
+        db.flush_operation_logs()
         conn = db.get_connection()
         cursor = conn.cursor()
         
@@ -724,8 +746,10 @@ class ErrorHandling(QWidget):
         params = []
         
         if search_text:
-            query += " AND (p.package_number LIKE ? OR o.order_number LIKE ?)"
-            params.extend([f"%{search_text}%", f"%{search_text}%"])
+            package_condition, package_params = db.search_condition('packages', search_text, 'p')
+            order_condition, order_params = db.search_condition('orders', search_text, 'o')
+            query += f" AND ({package_condition} OR {order_condition})"
+            params.extend(package_params + order_params)
         
         query += " GROUP BY p.id ORDER BY p.created_at DESC LIMIT 100"
         
@@ -776,6 +800,7 @@ class ErrorHandling(QWidget):
         
         if reply == QMessageBox.Yes:
             try:
+                db.flush_operation_logs()
                 conn = db.get_connection()
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM operation_logs")
@@ -0,0 +1,122 @@
+"""
+领域事件总线
+各页面在数据变更后发布带有受影响 ID 的领域事件，其他页面据此增量更新；
+隐藏的页面只标记为脏，切换到该页时再整页刷新一次。
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional, Tuple
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+
+class EventKind:
+    """领域事件类型"""
+    COMPONENT_PACKED = 'component_packed'          # 板件入包（扫码/一键打包）
+    COMPONENT_UNPACKED = 'component_unpacked'      # 板件移出包装
+    COMPONENTS_DELETED = 'components_deleted'      # 板件被删除
+    PACKAGE_CREATED = 'package_created'            # 新建包装
+    PACKAGE_FINISHED = 'package_finished'          # 包装完成（封包）
+    PACKAGE_REOPENED = 'package_reopened'          # 包装解包
+    PACKAGE_DELETED = 'package_deleted'            # 包装被删除
+    PACKAGE_PALLETIZED = 'package_palletized'      # 包装入托/移托
+    PACKAGE_UNPALLETIZED = 'package_unpalletized'  # 包装移出托盘
+    PALLET_CREATED = 'pallet_created'
+    PALLET_CHANGED = 'pallet_changed'              # 托盘信息/状态变化（编辑、封托、解托）
+    PALLET_DELETED = 'pallet_deleted'
+
+    ALL = frozenset({
+        COMPONENT_PACKED, COMPONENT_UNPACKED, COMPONENTS_DELETED,
+        PACKAGE_CREATED, PACKAGE_FINISHED, PACKAGE_REOPENED, PACKAGE_DELETED,
+        PACKAGE_PALLETIZED, PACKAGE_UNPALLETIZED,
+        PALLET_CREATED, PALLET_CHANGED, PALLET_DELETED,
+    })
+
+
+@dataclass(frozen=True)
+class DomainEvent:
+    """一次数据变更；ID 为空表示范围未知（订阅方应整页刷新）"""
+    kind: str
+    order_ids: Tuple[int, ...] = ()
+    package_ids: Tuple[int, ...] = ()
+    package_numbers: Tuple[str, ...] = ()
+    pallet_ids: Tuple[int, ...] = ()
+    component_ids: Tuple[int, ...] = ()
+    # 发布事件的页面（其自身已完成更新，不再处理）
+    source: Optional[object] = None
+
+
+def _ids(values) -> tuple:
+    return tuple(value for value in (values or ()) if value is not None)
+
+
+class EventBus(QObject):
+    """领域事件总线（在界面线程中发布与分派）"""
+
+    published = pyqtSignal(object)
+
+    def publish(self, kind, *, order_ids=(), package_ids=(), package_numbers=(),
+                pallet_ids=(), component_ids=(), source=None) -> DomainEvent:
+        if kind not in EventKind.ALL:
+            raise ValueError(f"未知的领域事件类型: {kind}")
+        event = DomainEvent(
+            kind,
+            order_ids=_ids(order_ids),
+            package_ids=_ids(package_ids),
+            package_numbers=_ids(package_numbers),
+            pallet_ids=_ids(pallet_ids),
+            component_ids=_ids(component_ids),
+            source=source,
+        )
+        self.published.emit(event)
+        return event
+
+
+# 全局事件总线
+event_bus = EventBus()
+
+
+class LazyRefresh:
+    """页面对领域事件的订阅
+
+    - 页面可见：调用 apply(event) 增量更新，apply 返回假值时整页刷新
+    - 页面隐藏：只标记为脏，on_shown() 时整页刷新一次
+    """
+
+    def __init__(self, widget, refresh: Callable[[], None],
+                 apply: Optional[Callable[[DomainEvent], bool]] = None,
+                 kinds: Optional[Iterable[str]] = None, bus: EventBus = None):
+        self.widget = widget
+        self.refresh = refresh
+        self.apply = apply
+        self.kinds = frozenset(kinds) if kinds is not None else None
+        self.dirty = False
+        (bus or event_bus).published.connect(self.on_event)
+
+    def on_event(self, event: DomainEvent):
+        if event.source is self.widget:
+            return
+        if self.kinds is not None and event.kind not in self.kinds:
+            return
+        if not self.widget.isVisible():
+            self.dirty = True
+            return
+        try:
+            if self.dirty:
+                self.dirty = False
+                self.refresh()
+            elif self.apply is None or not self.apply(event):
+                self.refresh()
+        except Exception:
+            # 增量更新失败时留到下次显示再整页刷新，不影响发布方
+            logger.error(f"处理领域事件失败: {event.kind}", exc_info=True)
+            self.dirty = True
+
+    def on_shown(self):
+        """页面切换为可见时调用"""
+        if self.dirty:
+            self.dirty = False
+            self.refresh()
@@ -21,8 +21,6 @@ from PyQt5.QtGui import (QFont, QColor, QPixmap, QPainter, QPen, QBrush,
                          QKeySequence)
 from PyQt5.QtWidgets import QShortcut
 from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
-import qrcode
-from PIL import Image, ImageDraw, ImageFont
 from database import db
 
 class DraggableGraphicsItem(QGraphicsRectItem):
@@ -360,6 +358,7 @@ class QRCodeGraphicsItem(DraggableGraphicsItem):
         
         if data:
             try:
+                import qrcode
                 qr = qrcode.QRCode(version=1, box_size=10, border=1)
                 qr.add_data(data)
                 qr.make(fit=True)
@@ -1,5 +1,11 @@
 import sys
 import os
+import time
+import importlib
+
+# 启动计时起点（各页面导入/构建耗时见启动报告；更细的导入耗时可用 python -X importtime main.py 查看）
+_STARTUP_T0 = time.perf_counter()
+
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QTabWidget, QVBoxLayout, 
                              QWidget, QMenuBar, QStatusBar, QAction, QMessageBox,
                              QHBoxLayout, QLabel, QPushButton, QSplashScreen)
@@ -16,14 +22,19 @@ from utils.error_handler import ErrorHandler, handle_errors, handle_errors_silen
 AppLogger.initialize()
 logger = get_logger('Main')
 
-# 导入各个模块
-from order_management import OrderManagement
-from scan_packaging import ScanPackaging
-from pallet_management import PalletManagement
-from label_printing import LabelPrinting
-from system_settings import SystemSettings
-from reports import Reports
-from error_handling import ErrorHandling
+from event_bus import EventKind, LazyRefresh
+
+# 功能模块标签页：(属性名, 模块, 类名, 标题)
+# 各模块在首次切换到对应标签页时才导入并构建
+TAB_SPECS = (
+    ('order_management', 'order_management', 'OrderManagement', "📋 订单管理"),
+    ('scan_packaging', 'scan_packaging', 'ScanPackaging', "📦 扫描打包"),
+    ('pallet_management', 'pallet_management', 'PalletManagement', "🚛 托盘管理"),
+    ('label_printing', 'label_printing', 'LabelPrinting', "🏷️ 标签打印"),
+    ('reports', 'reports', 'Reports', "📊 报表统计"),
+    ('system_settings', 'system_settings', 'SystemSettings', "⚙️ 系统设置"),
+    ('error_handling', 'error_handling', 'ErrorHandling', "🔧 异常处理"),
+)
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -31,6 +42,12 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("哈迪斯 打包系统 v1.0")
         self.setGeometry(100, 100, 1400, 900)
         
+        # 尚未构建的标签页占位控件：属性名 -> 占位控件
+        self.tab_placeholders = {}
+        self.tab_refreshers = []
+        # 启动计时：(项目, 毫秒)
+        self.startup_timings = [('主程序导入', (time.perf_counter() - _STARTUP_T0) * 1000)]
+        
         # 设置应用图标（窗口与任务栏）
         try:
             icon_path = os.path.join(os.path.dirname(__file__), 'ico10.ico')
@@ -78,151 +95,103 @@ class MainWindow(QMainWindow):
         self.tab_widget.setCurrentIndex(0)
     
     def create_tabs(self):
-        """创建所有功能模块的标签页"""
+        """创建功能模块标签页（先放占位页，只构建当前页）"""
         try:
-            # 订单管理模块
-            self.order_management = OrderManagement()
-            self.tab_widget.addTab(self.order_management, "📋 订单管理")
+            for attr, _module, _cls, title in TAB_SPECS:
+                placeholder = QLabel("正在加载...")
+                placeholder.setAlignment(Qt.AlignCenter)
+                self.tab_placeholders[attr] = placeholder
+                self.tab_widget.addTab(placeholder, title)
             
-            # 扫描打包模块
-            self.scan_packaging = ScanPackaging()
-            self.tab_widget.addTab(self.scan_packaging, "📦 扫描打包")
-            # 连接待包删除事件以刷新订单页
-            try:
-                self.scan_packaging.components_deleted_from_pending.connect(self.on_components_deleted_from_pending)
-            except Exception:
-                pass
-            # 连接包裹删除事件以刷新托盘管理页
-            try:
-                self.scan_packaging.package_deleted.connect(self.on_package_deleted)
-            except Exception:
-                pass
-            
-            # 托盘管理模块
-            self.pallet_management = PalletManagement()
-            self.tab_widget.addTab(self.pallet_management, "🚛 托盘管理")
-            # 跨页面联动：托盘数据有变更时，刷新扫描打包页的活动包裹与报表统计
-            try:
-                self.pallet_management.data_changed.connect(self.on_pallet_data_changed)
-            except Exception:
-                pass
+            # 跨页面联动：订阅领域事件，可见页增量更新，隐藏页标记为脏、切换过去时刷新
+            self.tab_widget.currentChanged.connect(self.on_tab_changed)
+            self.on_tab_changed(self.tab_widget.currentIndex())
             
-            # 标签打印模块
-            self.label_printing = LabelPrinting()
-            self.tab_widget.addTab(self.label_printing, "🏷️ 标签打印")
-            
-            # 报表统计模块
-            self.reports = Reports()
-            self.tab_widget.addTab(self.reports, "📊 报表统计")
-            
-            # 系统设置模块
-            self.system_settings = SystemSettings()
-            self.tab_widget.addTab(self.system_settings, "⚙️ 系统设置")
-            # 连接管理员最高权限删除信号到刷新方法
-            try:
-                self.system_settings.admin_components_deleted.connect(self.on_admin_components_deleted)
-            except Exception:
-                pass
-            try:
-                self.system_settings.admin_packages_deleted.connect(self.on_admin_packages_deleted)
-            except Exception:
-                pass
-            try:
-                self.system_settings.admin_pallets_deleted.connect(self.on_admin_pallets_deleted)
-            except Exception:
-                pass
-            
-            # 异常处理模块
-            self.error_handling = ErrorHandling()
-            self.tab_widget.addTab(self.error_handling, "🔧 异常处理")
+            self.startup_timings.append(('首个页面可用', (time.perf_counter() - _STARTUP_T0) * 1000))
+            self.log_startup_report()
             
         except Exception as e:
             logger.error("初始化模块时发生错误", exc_info=True)
             ErrorHandler.show_error(self, e, "初始化模块")
-
-    @handle_errors_silently("刷新订单组件")
-    def on_components_deleted_from_pending(self, order_id: int):
-        """待包列表删除后，刷新订单管理页的组件列表与统计"""
-        if hasattr(self, 'order_management'):
-            if hasattr(self.order_management, 'load_order_details') and order_id:
-                self.order_management.load_order_details(order_id)
-            # 同步刷新订单列表以更新总数统计
-            if hasattr(self.order_management, 'load_orders'):
-                self.order_management.load_orders()
     
-    @handle_errors_silently("刷新托盘包裹")
-    def on_package_deleted(self, package_number: str):
-        """包裹删除后，刷新托盘管理页的包裹列表"""
-        if hasattr(self, 'pallet_management'):
-            # 刷新托盘管理页的包裹列表
-            if hasattr(self.pallet_management, 'load_completed_packages'):
-                self.pallet_management.load_completed_packages()
-            # 如果有其他需要刷新的列表，也可以在这里添加
-            if hasattr(self.pallet_management, 'load_pallet_packages'):
-                self.pallet_management.load_pallet_packages()
-    
-    def on_admin_components_deleted(self, *args):
-        """管理员删除板件后，联动刷新相关页面"""
+    def ensure_tab(self, attr):
+        """返回指定模块的页面，尚未构建时导入模块并替换占位页"""
+        widget = getattr(self, attr, None)
+        if widget is not None:
+            return widget
+        spec = next(spec for spec in TAB_SPECS if spec[0] == attr)
+        _attr, module_name, class_name, title = spec
+        
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        imported = time.perf_counter()
+        widget = getattr(module, class_name)()
+        built = time.perf_counter()
+        self.startup_timings.append((f"{title} 导入", (imported - start) * 1000))
+        self.startup_timings.append((f"{title} 构建", (built - imported) * 1000))
+        logger.info(f"页面 {title} 已加载: 导入 {(imported - start) * 1000:.0f} ms, "
+                    f"构建 {(built - imported) * 1000:.0f} ms")
+        
+        # 用真实页面替换占位页（替换过程中不触发 currentChanged）
+        placeholder = self.tab_placeholders.pop(attr)
+        index = self.tab_widget.indexOf(placeholder)
+        was_current = self.tab_widget.currentIndex() == index
+        self.tab_widget.blockSignals(True)
         try:
-            # 扫描打包页：刷新待打包与活动包裹
-            if hasattr(self, 'scan_packaging'):
-                if hasattr(self.scan_packaging, 'load_pending_components'):
-                    self.scan_packaging.load_pending_components()
-                if hasattr(self.scan_packaging, 'load_active_packages'):
-                    self.scan_packaging.load_active_packages()
-                if hasattr(self.scan_packaging, 'load_orders'):
-                    self.scan_packaging.load_orders()
-            # 托盘管理页：刷新数据
-            if hasattr(self, 'pallet_management') and hasattr(self.pallet_management, 'refresh_data'):
-                self.pallet_management.refresh_data()
-            # 报表统计：刷新统计
-            if hasattr(self, 'reports') and hasattr(self.reports, 'load_statistics'):
-                self.reports.load_statistics()
-        except Exception:
-            pass
+            self.tab_widget.removeTab(index)
+            self.tab_widget.insertTab(index, widget, title)
+            if was_current:
+                self.tab_widget.setCurrentIndex(index)
+        finally:
+            self.tab_widget.blockSignals(False)
+        placeholder.deleteLater()
+        
+        setattr(self, attr, widget)
+        self.subscribe_tab(attr, widget)
+        return widget
     
-    def on_admin_packages_deleted(self, *args):
-        """管理员删除包裹后，联动刷新相关页面"""
-        try:
-            # 扫描打包页：刷新活动包裹
-            if hasattr(self, 'scan_packaging') and hasattr(self.scan_packaging, 'load_active_packages'):
-                self.scan_packaging.load_active_packages()
-            # 托盘管理页：刷新数据
-            if hasattr(self, 'pallet_management') and hasattr(self.pallet_management, 'refresh_data'):
-                self.pallet_management.refresh_data()
-            # 报表统计：刷新统计
-            if hasattr(self, 'reports') and hasattr(self.reports, 'load_statistics'):
-                self.reports.load_statistics()
-        except Exception:
-            pass
+    def subscribe_tab(self, attr, widget):
+        """为新构建的页面注册领域事件订阅（构建前的变更已包含在首次加载的数据中）"""
+        package_kinds = (
+            EventKind.COMPONENT_PACKED, EventKind.COMPONENT_UNPACKED, EventKind.COMPONENTS_DELETED,
+            EventKind.PACKAGE_CREATED, EventKind.PACKAGE_DELETED,
+        )
+        if attr == 'order_management':
+            refresher = LazyRefresh(widget, widget.refresh_view, widget.on_domain_event, kinds=package_kinds)
+        elif attr == 'scan_packaging':
+            refresher = LazyRefresh(widget, widget.load_active_packages, widget.on_domain_event)
+        elif attr == 'pallet_management':
+            refresher = LazyRefresh(widget, widget.refresh_data, widget.on_domain_event)
+        elif attr == 'reports':
+            # 报表为汇总统计，没有增量形式
+            refresher = LazyRefresh(widget, widget.load_statistics)
+        else:
+            return
+        self.tab_refreshers.append(refresher)
+    
+    def on_tab_changed(self, index):
+        """切换页面：占位页在此时构建，被标记为脏的页面刷新一次"""
+        widget = self.tab_widget.widget(index)
+        for attr, placeholder in list(self.tab_placeholders.items()):
+            if placeholder is widget:
+                try:
+                    self.ensure_tab(attr)
+                except Exception as e:
+                    logger.error(f"加载页面失败: {attr}", exc_info=True)
+                    ErrorHandler.show_error(self, e, "加载页面")
+                return
+        for refresher in self.tab_refreshers:
+            if refresher.widget is widget:
+                try:
+                    refresher.on_shown()
+                except Exception:
+                    logger.error("刷新页面失败", exc_info=True)
+    
+    def log_startup_report(self):
+        """输出启动耗时报告"""
+        lines = [f"  {name}: {ms:.0f} ms" for name, ms in self.startup_timings]
+        logger.info("启动耗时:\n" + "\n".join(lines))
     
-    def on_admin_pallets_deleted(self, *args):
-        """管理员删除托盘后，联动刷新相关页面"""
-        try:
-            # 托盘管理页：刷新托盘列表与整体数据
-            if hasattr(self, 'pallet_management'):
-                if hasattr(self.pallet_management, 'load_pallets'):
-                    self.pallet_management.load_pallets()
-                if hasattr(self.pallet_management, 'refresh_data'):
-                    self.pallet_management.refresh_data()
-            # 报表统计：刷新统计
-            if hasattr(self, 'reports') and hasattr(self.reports, 'load_statistics'):
-                self.reports.load_statistics()
-        except Exception:
-            pass
-
-    def on_pallet_data_changed(self):
-        """托盘数据更改时的跨页面联动刷新"""
-        try:
-            # 刷新扫描打包页的活动包裹
-            if hasattr(self, 'scan_packaging') and hasattr(self.scan_packaging, 'load_active_packages'):
-                self.scan_packaging.load_active_packages()
-            # 刷新报表统计
-            if hasattr(self, 'reports') and hasattr(self.reports, 'load_statistics'):
-                self.reports.load_statistics()
-        except Exception:
-            pass
-            
     def init_menu_bar(self):
         """初始化菜单栏"""
         menubar = self.menuBar()
@@ -380,14 +349,14 @@ class MainWindow(QMainWindow):
         """导入数据"""
         # 切换到订单管理标签页并触发导入
         self.tab_widget.setCurrentIndex(0)
-        self.order_management.import_csv_data()
+        self.ensure_tab('order_management').import_csv_data()
     
     @handle_errors(lambda self=None: self, "导出数据")
     def export_data(self):
         """导出数据"""
         # 切换到报表统计标签页并触发导出（调用报表页的导出对话框）
         self.tab_widget.setCurrentIndex(4)
-        self.reports.export_data()
+        self.ensure_tab('reports').export_data()
     
     @handle_errors(lambda self=None: self, "备份数据库")
     def backup_database(self):
@@ -441,6 +410,21 @@ class MainWindow(QMainWindow):
         )
         
         if reply == QMessageBox.Yes:
+            # 写完后台队列中的操作日志
+            try:
+                db.shutdown_log_writer()
+            except Exception:
+                logger.error("写入剩余操作日志失败", exc_info=True)
+            try:
+                stats = db.get_write_stats()
+                logger.info(
+                    f"写入争用统计: 提交 {stats['submitted']} 次, 最大排队 {stats['queue_depth_max']}, "
+                    f"平均排队 {stats['queue_wait_ms_avg']:.1f} ms, 最长取锁等待 {stats['lock_wait_ms_max']:.0f} ms, "
+                    f"最长跨进程锁等待 {stats['begin_wait_ms_max']:.0f} ms, 锁重试 {stats['busy_retries']} 次"
+                )
+                db.write_coordinator.shutdown()
+            except Exception:
+                logger.error("关闭写协调器失败", exc_info=True)
             logger.info("应用程序正常退出")
             event.accept()
         else:
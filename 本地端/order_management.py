@@ -1,6 +1,7 @@
 import sys
 import csv
 import json
+import sqlite3
 from datetime import datetime
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
                              QPushButton, QTableWidget, QTableWidgetItem, QLabel,
@@ -11,6 +12,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QEvent
 from PyQt5.QtGui import QFont
 from database import db
+from scan_service import scan_service
 
 class OrderSelectionDialog(QDialog):
     """订单选择对话框"""
@@ -981,11 +983,28 @@ class ImportConfigDialog(QDialog):
             return ','  # 默认返回逗号
 
 class ImportWorker(QThread):
-    """清单导入工作线程"""
+    """清单导入工作线程
+    
+    按块流式读取文件：每块用一次集合查询解决编码重复，executemany 批量插入，
+    每块在各自的短写事务内提交；取消或出错时删除本次已导入的板件。
+    进度信号限制在约10次/秒。
+    """
     progress = pyqtSignal(int)
     status = pyqtSignal(str)
     finished = pyqtSignal(dict)
     error = pyqtSignal(str)
+    # 已取消，且本次已导入的板件已删除
+    cancelled = pyqtSignal()
+    
+    CHUNK_SIZE = 2000
+    PROGRESS_INTERVAL = 0.1  # 秒
+    
+    INSERT_SQL = '''
+        INSERT INTO components 
+        (order_id, component_name, material, finished_size, 
+         component_code, room_number, cabinet_number, remarks, custom_field1, custom_field2)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
     
     def __init__(self, file_path, config, order_id, order_number, customer_name, customer_address):
         super().__init__()
@@ -995,31 +1014,32 @@ class ImportWorker(QThread):
         self.order_number = order_number
         self.customer_name = customer_name
         self.customer_address = customer_address
+        self._cancelled = False
+        self._last_report = 0.0
+    
+    def cancel(self):
+        """请求取消导入（在块之间检查，已提交的板件随后删除）"""
+        self._cancelled = True
     
     def run(self):
         try:
             import os
+            import time
             file_ext = os.path.splitext(self.file_path)[1].lower()
             
             if file_ext == '.csv':
                 self.status.emit("正在读取CSV文件...")
-                rows = self._read_csv_file()
+                total_rows, rows = self._stream_csv_file()
             elif file_ext in ['.xlsx', '.xls']:
                 self.status.emit("正在读取Excel文件...")
-                rows = self._read_excel_file()
+                total_rows, rows = self._stream_excel_file()
             else:
                 raise ValueError(f"不支持的文件格式: {file_ext}")
             
             # 跳过表头行
-            if rows:
-                rows = rows[1:]
-            
-            total_rows = len(rows)
-            self.status.emit(f"共读取到 {total_rows} 行数据")
-            
-            # 使用现有订单
-            conn = db.get_connection()
-            cursor = conn.cursor()
+            next(rows, None)
+            total_rows = max(0, total_rows - 1)
+            self.status.emit(f"共 {total_rows} 行数据，开始导入...")
             
             # 使用传入的订单ID
             order_id = self.order_id
@@ -1028,74 +1048,54 @@ class ImportWorker(QThread):
             success_count = 0
             error_count = 0
             errors = []
+            processed = 0
+            started = time.monotonic()
             
-            for i, row in enumerate(rows):
+            # 每块一个短写事务，块之间释放写锁，其他工位与本机的写入可以穿插进行
+            imported_codes = []
+            try:
+                for chunk in self._chunks(rows):
+                    if self._cancelled:
+                        raise _ImportCancelled()
+                    with db.immediate_transaction() as conn:
+                        ok, failed, codes = self._import_chunk(conn.cursor(), order_id, chunk, processed)
+                    imported_codes.extend(codes)
+                    success_count += ok
+                    error_count += len(failed)
+                    errors.extend(failed)
+                    processed += len(chunk)
+                    self._report(processed, total_rows)
+            except BaseException as e:
+                # 取消或出错：删除本次已提交的板件，保持“要么全部导入、要么不导入”
+                self.status.emit("正在撤销已导入的数据...")
                 try:
-                    self.progress.emit(int((i + 1) / total_rows * 100))
-                    self.status.emit(f"正在导入第 {i + 1}/{total_rows} 行数据...")
-                    
-                    # 根据配置映射字段（使用列号）
-                    component_data = {}
-                    for field_key, column_index in self.config['mapping'].items():
-                        if column_index < len(row):
-                            component_data[field_key] = row[column_index].strip()
-                    
-                    # 处理component_code，保持原始编码
-                    component_code = component_data.get('component_code', '').strip()
-                    if not component_code:
-                        # 如果component_code为空，生成一个代码（但不添加序号）
-                        component_code = f"{self.order_number}_COMP_{i+1:04d}"
-                    
-                    # 检查component_code是否已存在，如果存在则添加后缀
-                    original_code = component_code
-                    suffix = 1
-                    while True:
-                        cursor.execute('SELECT id FROM components WHERE component_code = ?', (component_code,))
-                        if not cursor.fetchone():
-                            break
-                        component_code = f"{original_code}_{suffix:03d}"
-                        suffix += 1
-                    
-                    # 插入板件数据
-                    cursor.execute('''
-                        INSERT INTO components 
-                        (order_id, component_name, material, finished_size, 
-                         component_code, room_number, cabinet_number, remarks, custom_field1, custom_field2)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        order_id,
-                        component_data.get('component_name', ''),
-                        component_data.get('material', ''),
-                        component_data.get('finished_size', ''),
-                        component_code,
-                        component_data.get('room_number', ''),
-                        component_data.get('cabinet_number', ''),
-                        component_data.get('remarks', ''),
-                        component_data.get('custom_field1', ''),
-                        component_data.get('custom_field2', '')
-                    ))
-                    
-                    success_count += 1
-                    
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"第{i+1}行: {str(e)}")
-            
-            conn.commit()
-            conn.close()
+                    self._discard_imported(order_id, imported_codes)
+                except sqlite3.Error as discard_error:
+                    reason = "导入已取消" if isinstance(e, _ImportCancelled) else f"导入失败：{e}"
+                    raise RuntimeError(
+                        f"{reason}，但撤销已导入的板件失败：{discard_error}\n"
+                        f"订单中可能残留部分本次导入的板件，请检查后手动删除"
+                    ) from e
+                finally:
+                    scan_service.invalidate_component_index()
+                raise
+            scan_service.invalidate_component_index()
             
             # 记录操作日志
             db.log_operation('import_csv', {
                 'order_id': order_id,
                 'file_path': self.file_path,
-                'total_rows': total_rows,
+                'total_rows': processed,
                 'success_count': success_count,
                 'error_count': error_count
             })
             
+            self.progress.emit(100)
+            self.status.emit(f"导入完成，共 {processed} 行，用时 {time.monotonic() - started:.1f} 秒")
+            
             result = {
                 'order_id': order_id,
-                'total_rows': total_rows,
+                'total_rows': processed,
                 'success_count': success_count,
                 'error_count': error_count,
                 'errors': errors
@@ -1103,49 +1103,221 @@ class ImportWorker(QThread):
             
             self.finished.emit(result)
             
+        except _ImportCancelled:
+            self.cancelled.emit()
         except Exception as e:
             self.error.emit(str(e))
     
-    def _read_csv_file(self):
-        """读取CSV文件"""
-        import csv
-        with open(self.file_path, 'r', encoding=self.config['encoding']) as file:
-            # 检测分隔符
-            delimiter = self.config['delimiter']
-            if delimiter == '\\t':
-                delimiter = '\t'
-            
-            reader = csv.reader(file, delimiter=delimiter)
-            rows = list(reader)
-        return rows
+    def _discard_imported(self, order_id, codes):
+        """删除本次导入已提交的板件（按块分批事务，已被扫码入包的板件保留）
+        
+        删除失败时抛出 sqlite3.Error，由调用方经 error 信号告知用户
+        """
+        kept = 0
+        for start in range(0, len(codes), self.CHUNK_SIZE):
+            batch = json.dumps(codes[start:start + self.CHUNK_SIZE], ensure_ascii=False)
+            with db.immediate_transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM components
+                    WHERE order_id = ? AND package_id IS NULL
+                      AND component_code IN (SELECT value FROM json_each(?))
+                ''', (order_id, batch))
+                kept += len(codes[start:start + self.CHUNK_SIZE]) - cursor.rowcount
+        if kept:
+            self.status.emit(f"撤销导入时有 {kept} 个板件已入包，未删除")
+    
+    def _chunks(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def _report(self, processed, total_rows):
+        """节流的进度信号（约10次/秒）"""
+        import time
+        now = time.monotonic()
+        if now - self._last_report < self.PROGRESS_INTERVAL and processed < total_rows:
+            return
+        self._last_report = now
+        if total_rows:
+            self.progress.emit(min(99, int(processed / total_rows * 100)))
+        self.status.emit(f"正在导入第 {processed}/{max(processed, total_rows)} 行数据...")
     
-    def _read_excel_file(self):
-        """读取Excel文件"""
+    def _import_chunk(self, cursor, order_id, chunk, offset):
+        """导入一块数据行，返回 (成功数, 错误信息列表, 已插入的编码列表)
+        
+        offset 为块首行在数据中的序号（从0开始），用于生成编码与错误行号
+        """
+        errors = []
+        records = []
+        for i, row in enumerate(chunk, start=offset):
+            try:
+                # 根据配置映射字段（使用列号）
+                component_data = {}
+                for field_key, column_index in self.config['mapping'].items():
+                    if column_index < len(row):
+                        component_data[field_key] = row[column_index].strip()
+                
+                # 处理component_code，保持原始编码
+                component_code = component_data.get('component_code', '').strip()
+                if not component_code:
+                    # 如果component_code为空，生成一个代码（但不添加序号）
+                    component_code = f"{self.order_number}_COMP_{i+1:04d}"
+                records.append((i, component_code, component_data))
+            except Exception as e:
+                errors.append(f"第{i+1}行: {str(e)}")
+        
+        # 已存在的编码：一次查询取出本块编码及其 “编码_” 前缀下已占用的后缀编码
+        codes = list(dict.fromkeys(code for _, code, _ in records))
+        codes_json = json.dumps(codes, ensure_ascii=False)
+        cursor.execute('''
+            SELECT component_code FROM components
+            WHERE component_code IN (SELECT value FROM json_each(?))
+        ''', (codes_json,))
+        taken = {r[0] for r in cursor.fetchall()}
+        # 块内重复的编码也需要加后缀
+        seen = set()
+        conflicted = set()
+        for _, code, _ in records:
+            if code in taken or code in seen:
+                conflicted.add(code)
+            seen.add(code)
+        if conflicted:
+            cursor.execute('''
+                SELECT c.component_code FROM json_each(?) j
+                JOIN components c
+                  ON c.component_code >= j.value || '_' AND c.component_code < j.value || '`'
+            ''', (json.dumps(sorted(conflicted), ensure_ascii=False),))
+            taken.update(r[0] for r in cursor.fetchall())
+        
+        # 检查component_code是否已存在，如果存在则添加后缀（取最小的未占用后缀）
+        params = []
+        for i, component_code, component_data in records:
+            original_code = component_code
+            suffix = 1
+            while component_code in taken:
+                component_code = f"{original_code}_{suffix:03d}"
+                suffix += 1
+            taken.add(component_code)
+            params.append((i, (
+                order_id,
+                component_data.get('component_name', ''),
+                component_data.get('material', ''),
+                component_data.get('finished_size', ''),
+                component_code,
+                component_data.get('room_number', ''),
+                component_data.get('cabinet_number', ''),
+                component_data.get('remarks', ''),
+                component_data.get('custom_field1', ''),
+                component_data.get('custom_field2', '')
+            )))
+        
+        # 批量插入；整块失败时在保存点内回滚后逐行插入，定位出错的行
+        cursor.execute('SAVEPOINT import_chunk')
         try:
-            import pandas as pd
-            # 读取Excel文件
-            df = pd.read_excel(self.file_path, header=None)
-            # 转换为列表格式
-            rows = df.values.tolist()
-            # 将NaN值转换为空字符串
-            for i, row in enumerate(rows):
-                rows[i] = [str(cell) if pd.notna(cell) else '' for cell in row]
-            return rows
-        except ImportError:
-            # 如果没有pandas，尝试使用openpyxl
+            cursor.executemany(self.INSERT_SQL, [values for _, values in params])
+            cursor.execute('RELEASE import_chunk')
+            return len(params), errors, [values[4] for _, values in params]
+        except sqlite3.Error:
+            cursor.execute('ROLLBACK TO import_chunk')
+            cursor.execute('RELEASE import_chunk')
+        inserted = []
+        for i, values in params:
+            try:
+                cursor.execute(self.INSERT_SQL, values)
+                inserted.append(values[4])
+            except sqlite3.Error as e:
+                errors.append(f"第{i+1}行: {str(e)}")
+        return len(inserted), errors, inserted
+    
+    def _stream_csv_file(self):
+        """流式读取CSV文件，返回 (总行数, 行迭代器)"""
+        encoding = self.config['encoding']
+        # 检测分隔符
+        delimiter = self.config['delimiter']
+        if delimiter == '\\t':
+            delimiter = '\t'
+        
+        # 先快速数一遍行数用于进度显示（不保留内容）
+        with open(self.file_path, 'r', encoding=encoding, newline='') as file:
+            total_rows = sum(1 for _ in file)
+        
+        def rows():
+            with open(self.file_path, 'r', encoding=encoding, newline='') as file:
+                yield from csv.reader(file, delimiter=delimiter)
+        return total_rows, rows()
+    
+    def _stream_excel_file(self):
+        """流式读取Excel文件，返回 (总行数, 行迭代器)
+        
+        .xlsx 使用 openpyxl 只读模式逐行读取；.xls 或缺少 openpyxl 时用 pandas 整表读取
+        """
+        import os
+        if os.path.splitext(self.file_path)[1].lower() == '.xlsx':
             try:
                 from openpyxl import load_workbook
+            except ImportError:
+                load_workbook = None
+            if load_workbook is not None:
                 wb = load_workbook(self.file_path, read_only=True)
                 ws = wb.active
-                rows = []
-                for row in ws.iter_rows(values_only=True):
-                    # 将None值转换为空字符串
-                    row_data = [str(cell) if cell is not None else '' for cell in row]
-                    rows.append(row_data)
-                wb.close()
-                return rows
-            except ImportError:
-                raise ImportError("需要安装 pandas 或 openpyxl 来支持Excel文件")
+                
+                def rows():
+                    try:
+                        for row in ws.iter_rows(values_only=True):
+                            # 将None值转换为空字符串
+                            yield [str(cell) if cell is not None else '' for cell in row]
+                    finally:
+                        wb.close()
+                return ws.max_row or 0, rows()
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError("需要安装 pandas 或 openpyxl 来支持Excel文件")
+        df = pd.read_excel(self.file_path, header=None)
+        
+        def rows():
+            for row in df.itertuples(index=False, name=None):
+                # 将NaN值转换为空字符串
+                yield [str(cell) if pd.notna(cell) else '' for cell in row]
+        return len(df), rows()
+
+
+class _ImportCancelled(Exception):
+    """导入被用户取消"""
+
+
+class ImportProgressDialog(QDialog):
+    """导入进度对话框
+    
+    导入线程结束（完成、出错，或取消后撤销完毕）前不能关闭：
+    Esc 与窗口关闭按钮等同于点击“取消”。
+    """
+    cancel_requested = pyqtSignal()
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._closable = False
+    
+    def reject(self):
+        if self._closable:
+            super().reject()
+        else:
+            self.cancel_requested.emit()
+    
+    def close_when_done(self, accepted=False):
+        """导入线程已结束，关闭对话框"""
+        self._closable = True
+        if accepted:
+            self.accept()
+        else:
+            self.reject()
+
 
 class OrderManagement(QWidget):
     """订单管理模块"""
@@ -1340,6 +1512,27 @@ class OrderManagement(QWidget):
             # 存储订单ID
             self.orders_table.item(i, 0).setData(Qt.UserRole, order[0])
     
+    def selected_order_id(self):
+        """当前选中订单的ID（未选中返回 None）"""
+        current_row = self.orders_table.currentRow()
+        item = self.orders_table.item(current_row, 0) if current_row >= 0 else None
+        return item.data(Qt.UserRole) if item else None
+    
+    def refresh_view(self):
+        """重载订单列表与当前订单详情"""
+        order_id = self.selected_order_id()
+        self.load_orders()
+        if order_id is not None:
+            self.load_order_details(order_id)
+    
+    def on_domain_event(self, event):
+        """板件/包装变化：只在正在查看的订单受影响时重载其详情"""
+        order_id = self.selected_order_id()
+        if order_id is None or (event.order_ids and order_id not in event.order_ids):
+            return True
+        self.load_order_details(order_id)
+        return True
+    
     def on_order_selected(self):
         """订单选择事件"""
         current_row = self.orders_table.currentRow()
@@ -1470,6 +1663,11 @@ class OrderManagement(QWidget):
         if not file_path:
             return
         
+        # 上一次导入（含取消后的撤销）尚未结束时不能开始新的导入
+        if getattr(self, 'import_worker', None) is not None and self.import_worker.isRunning():
+            QMessageBox.information(self, "提示", "上一次导入尚未结束，请稍后再试")
+            return
+        
         # 配置导入（传递CSV文件路径）
         config_dialog = ImportConfigDialog(self, file_path)
         if config_dialog.exec_() != QDialog.Accepted:
@@ -1486,7 +1684,7 @@ class OrderManagement(QWidget):
         customer_address = selected_order['customer_address']
         
         # 显示进度对话框
-        progress_dialog = QDialog(self)
+        progress_dialog = ImportProgressDialog(self)
         progress_dialog.setWindowTitle("导入进度")
         progress_dialog.setModal(True)
         progress_dialog.resize(400, 150)
@@ -1508,15 +1706,17 @@ class OrderManagement(QWidget):
         self.import_worker.status.connect(status_label.setText)
         self.import_worker.finished.connect(lambda result: self.import_finished(result, progress_dialog))
         self.import_worker.error.connect(lambda error: self.import_error(error, progress_dialog))
+        self.import_worker.cancelled.connect(lambda: self.import_cancelled(progress_dialog))
         
-        cancel_btn.clicked.connect(lambda: self.cancel_import(progress_dialog))
+        cancel_btn.clicked.connect(lambda: self.cancel_import(cancel_btn))
+        progress_dialog.cancel_requested.connect(lambda: self.cancel_import(cancel_btn))
         
         self.import_worker.start()
         progress_dialog.exec_()
     
     def import_finished(self, result, progress_dialog):
         """导入完成"""
-        progress_dialog.accept()
+        progress_dialog.close_when_done(accepted=True)
         
         message = f"""导入完成！
         
@@ -1534,9 +1734,14 @@ class OrderManagement(QWidget):
     
     def import_error(self, error, progress_dialog):
         """导入错误"""
-        progress_dialog.reject()
+        progress_dialog.close_when_done()
         QMessageBox.critical(self, "导入错误", f"导入失败：\n{str(error)}")
     
+    def import_cancelled(self, progress_dialog):
+        """导入已取消，已导入的板件已删除"""
+        progress_dialog.close_when_done()
+        QMessageBox.information(self, "导入已取消", "导入已取消，本次已导入的板件已删除")
+    
     def delete_order(self):
         """删除订单"""
         current_row = self.orders_table.currentRow()
@@ -1582,6 +1787,7 @@ class OrderManagement(QWidget):
             
             conn.commit()
             conn.close()
+            scan_service.invalidate_component_index()
             
             # 记录操作日志
             db.log_operation('delete_order', {
@@ -1631,11 +1837,13 @@ class OrderManagement(QWidget):
                     self.orders_table.selectRow(row)
                     break
     
-    def cancel_import(self, progress_dialog):
-        """取消导入"""
+    def cancel_import(self, cancel_btn):
+        """取消导入：当前块写完后删除已导入的板件，进度对话框在工作线程发出 cancelled 后关闭"""
         if hasattr(self, 'import_worker'):
-            self.import_worker.terminate()
-        progress_dialog.reject()
+            # 不能 terminate：强行终止可能停在写事务中，也来不及删除已导入的板件
+            self.import_worker.cancel()
+        cancel_btn.setEnabled(False)
+        cancel_btn.setText("正在取消...")
 
     def search_component(self):
         """搜索板件编号，显示所属订单号，并选中订单"""
@@ -1655,12 +1863,13 @@ class OrderManagement(QWidget):
             rows = cursor.fetchall()
             # 未找到则模糊搜索
             if not rows:
-                cursor.execute('''
+                condition, params = db.search_condition('components', text, 'c')
+                cursor.execute(f'''
                     SELECT c.component_code, o.order_number, o.id
                     FROM components c JOIN orders o ON c.order_id = o.id
-                    WHERE c.component_code LIKE ?
+                    WHERE {condition}
                     LIMIT 50
-                ''', (f"%{text}%",))
+                ''', params)
                 rows = cursor.fetchall()
             conn.close()
             if rows:
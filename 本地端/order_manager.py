@@ -11,7 +11,7 @@ import sqlite3
 import json
 from datetime import datetime
 from typing import List, Dict, Optional, Any
-from database import Database
+from database import Database, close_database
 
 
 class OrderManager:
@@ -67,6 +67,7 @@ class OrderManager:
             
             # 使用Database创建数据库结构
             temp_db = Database(db_file)
+            temp_db.close_pool()
             
             # 更新订单索引
             orders_data = self._load_orders_index()
@@ -107,6 +108,7 @@ class OrderManager:
             
             # 删除数据库文件
             db_file = os.path.join(self.orders_dir, f"{order_id}.db")
+            close_database(db_file)
             if os.path.exists(db_file):
                 os.remove(db_file)
             
@@ -159,6 +161,8 @@ class OrderManager:
     
     def close_current_order(self):
         """关闭当前订单"""
+        if self.current_db is not None:
+            self.current_db.close_pool()
         self.current_db = None
         self.current_order = None
     
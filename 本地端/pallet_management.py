@@ -10,24 +10,23 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget,
                              QMenu, QAction, QFileDialog, QApplication)
 from PyQt5.QtCore import Qt, QDate, pyqtSignal, QTimer
 from PyQt5.QtGui import QFont, QColor, QPixmap, QImage
-import numpy as np
-from qr_handler import QRCodeHandler
 from database import db
 from datetime import datetime
 from order_manager import OrderManager
 from order_management import OrderSelectionDialog
 import traceback
 import sqlite3
-import time
 from error_handling import Prompt
 from status_utils import package_status_cn, pallet_status_cn, normalize_package_status
+from event_bus import event_bus, EventKind
+from write_dispatch import WriteSubmitter
 try:
     from voice import speak as voice_speak
 except Exception:
     def voice_speak(_text: str):
         pass
 
-class PalletManagement(QWidget):
+class PalletManagement(WriteSubmitter, QWidget):
     """托盘管理模块"""
     data_changed = pyqtSignal()
     
@@ -106,6 +105,26 @@ class PalletManagement(QWidget):
         
         scan_layout.addLayout(scan_input_layout)
         
+        # 批量装托：扫码只入队，确认后一次校验、一次提交
+        batch_layout = QHBoxLayout()
+        self.batch_load_cb = QCheckBox("批量装托")
+        self.batch_load_cb.toggled.connect(self.on_batch_load_toggled)
+        batch_layout.addWidget(self.batch_load_cb)
+        self.batch_load_label = QLabel("待装托: 0")
+        batch_layout.addWidget(self.batch_load_label)
+        batch_layout.addStretch()
+        self.batch_load_commit_btn = QPushButton("确认装托")
+        self.batch_load_commit_btn.clicked.connect(self.commit_batch_load)
+        batch_layout.addWidget(self.batch_load_commit_btn)
+        self.batch_load_clear_btn = QPushButton("清空")
+        self.batch_load_clear_btn.clicked.connect(self.clear_batch_load)
+        batch_layout.addWidget(self.batch_load_clear_btn)
+        scan_layout.addLayout(batch_layout)
+        self.batch_load_queue = []
+        # 批量装托写入进行中（期间不能再次确认，避免重复提交同一批包裹）
+        self._batch_pending = False
+        self.update_batch_load_display()
+        
         # 扫描状态
         self.scan_status_label = QLabel("状态: 等待扫描")
         self.scan_status_label.setStyleSheet("color: #7f8c8d; font-size: 12px;")
@@ -543,9 +562,156 @@ class PalletManagement(QWidget):
         """手动扫描/添加包裹"""
         package_number = self.scan_input.text().strip()
         if package_number:
-            self.add_package_to_pallet(package_number)
+            if self.batch_load_cb.isChecked():
+                self.queue_batch_load(package_number)
+            else:
+                self.add_package_to_pallet(package_number)
             self.scan_input.clear()
     
+    # ----- 批量装托 -----
+    def on_batch_load_toggled(self, checked):
+        """切换批量装托模式；退出时丢弃未确认的队列"""
+        if not checked and self.batch_load_queue:
+            if not Prompt.ask_confirm(f"还有 {len(self.batch_load_queue)} 个包裹未确认装托，退出批量模式将清空队列。是否继续？"):
+                self.batch_load_cb.blockSignals(True)
+                self.batch_load_cb.setChecked(True)
+                self.batch_load_cb.blockSignals(False)
+                return
+            self.batch_load_queue = []
+        self.update_batch_load_display()
+    
+    def update_batch_load_display(self):
+        checked = self.batch_load_cb.isChecked()
+        count = len(self.batch_load_queue)
+        self.batch_load_label.setText(f"待装托: {count}")
+        for widget in (self.batch_load_label, self.batch_load_commit_btn, self.batch_load_clear_btn):
+            widget.setVisible(checked)
+        self.batch_load_commit_btn.setEnabled(count > 0 and not self._batch_pending)
+        self.batch_load_clear_btn.setEnabled(count > 0)
+    
+    def queue_batch_load(self, package_number):
+        """批量模式下扫码：只加入队列（同一包裹只保留一次）"""
+        if package_number in self.batch_load_queue:
+            self.scan_status_label.setText(f"状态: 包裹 {package_number} 已在队列中")
+            self.scan_status_label.setStyleSheet("color: #f39c12; font-size: 12px;")
+            return
+        self.batch_load_queue.append(package_number)
+        self.scan_status_label.setText(f"状态: 包裹 {package_number} 已加入队列（共 {len(self.batch_load_queue)} 个）")
+        self.scan_status_label.setStyleSheet("color: #2980b9; font-size: 12px;")
+        self.update_batch_load_display()
+    
+    def clear_batch_load(self):
+        self.batch_load_queue = []
+        self.update_batch_load_display()
+        self.scan_status_label.setText("状态: 已清空装托队列")
+        self.scan_status_label.setStyleSheet("color: #7f8c8d; font-size: 12px;")
+    
+    def commit_batch_load(self):
+        """确认批量装托：一次集合校验，冲突合并为一次确认，一个事务提交，刷新一次"""
+        if not self.batch_load_queue or self._batch_pending:
+            return
+        if not self.current_pallet_id:
+            Prompt.show_warning("请先选择一个托盘")
+            return
+        
+        try:
+            check = db.check_pallet_batch(self.current_pallet_id, self.batch_load_queue)
+            if str(check['pallet_status'] or '').strip().lower() in ('sealed', 'closed'):
+                Prompt.show_warning("当前托盘已封托或已关闭，不能添加包裹")
+                return
+            
+            failed = [f"{number}: 包裹不存在" for number in check['missing']]
+            loadable, other_pallet, other_order = [], [], []
+            for pkg in check['packages']:
+                number = pkg['package_number']
+                if normalize_package_status(pkg['status']) == 'open':
+                    failed.append(f"{number}: 未完成封包")
+                    continue
+                if pkg['pallet_id'] == self.current_pallet_id:
+                    failed.append(f"{number}: 已在当前托盘中")
+                    continue
+                if pkg['pallet_id']:
+                    other_pallet.append(f"{number}（托盘 {pkg['pallet_number']}）")
+                if self.current_order_id and pkg['order_id'] != self.current_order_id:
+                    other_order.append(f"{number}（订单 {pkg['order_number'] or '未知订单'}）")
+                loadable.append(pkg)
+            
+            if not loadable:
+                Prompt.show_batch_result("批量装托", len(self.batch_load_queue), 0, failed)
+                return
+            
+            # 跨托盘/跨订单的包裹汇总为一次确认
+            if other_pallet or other_order:
+                def section(title, items):
+                    shown = "\n".join(items[:10])
+                    more = f"\n... 还有 {len(items) - 10} 个" if len(items) > 10 else ""
+                    return f"\n\n{title}（{len(items)} 个）:\n{shown}{more}"
+                message = f"将装入 {len(loadable)} 个包裹。"
+                if other_pallet:
+                    message += section("以下包裹已在其他托盘中，将移动到当前托盘", other_pallet)
+                if other_order:
+                    message += section("以下包裹不属于当前选择的订单", other_order)
+                if not Prompt.ask_confirm(message + "\n\n是否继续？", title="确认批量装托"):
+                    return
+            
+            pallet_id = self.current_pallet_id
+            # 写入期间继续扫码的包裹留在队列中
+            submitted = list(self.batch_load_queue)
+            self._batch_pending = True
+            self.update_batch_load_display()
+            self.scan_status_label.setText(f"状态: 正在装托 {len(loadable)} 个包裹...")
+            self.scan_status_label.setStyleSheet("color: #2980b9; font-size: 12px;")
+            self.submit_write(
+                lambda conn: db.load_packages_to_pallet(pallet_id, [pkg['package_id'] for pkg in loadable]),
+                lambda future: self._on_batch_loaded(future, pallet_id, loadable, failed, submitted),
+            )
+        except Exception as e:
+            self.scan_status_label.setText(f"状态: 批量装托失败 - {str(e)}")
+            self.scan_status_label.setStyleSheet("color: #e74c3c; font-size: 12px;")
+            QMessageBox.critical(self, "错误", f"批量装托失败：{str(e)}")
+            traceback.print_exc()
+    
+    def _on_batch_loaded(self, future, pallet_id, loadable, failed, submitted):
+        """批量装托写入完成（界面线程）"""
+        self._batch_pending = False
+        error = future.exception()
+        if error is not None:
+            self.update_batch_load_display()
+            self.scan_status_label.setText(f"状态: 批量装托失败 - {str(error)}")
+            self.scan_status_label.setStyleSheet("color: #e74c3c; font-size: 12px;")
+            QMessageBox.critical(self, "错误", f"批量装托失败：{str(error)}")
+            return
+        loaded_ids = set(future.result())
+        loaded = [pkg for pkg in loadable if pkg['package_id'] in loaded_ids]
+        failed = failed + [
+            f"{pkg['package_number']}: 状态已变化，未装入" for pkg in loadable if pkg['package_id'] not in loaded_ids
+        ]
+        total = len(submitted)
+        submitted = set(submitted)
+        self.batch_load_queue = [number for number in self.batch_load_queue if number not in submitted]
+        self.update_batch_load_display()
+        
+        self.scan_status_label.setText(f"状态: 批量装托完成，装入 {len(loaded)} 个包裹")
+        self.scan_status_label.setStyleSheet("color: #27ae60; font-size: 12px;")
+        try:
+            voice_speak(f"批量装托完成，共 {len(loaded)} 个包裹")
+        except Exception:
+            pass
+        
+        # 一次刷新并发布一个事件
+        self.refresh_data()
+        if loaded:
+            self.publish_change(
+                EventKind.PACKAGE_PALLETIZED,
+                package_ids=[pkg['package_id'] for pkg in loaded],
+                package_numbers=[pkg['package_number'] for pkg in loaded],
+                # 包含被移出包裹的原托盘
+                pallet_ids=[pallet_id] + list({pkg['pallet_id'] for pkg in loaded if pkg['pallet_id']}),
+                order_ids=list({pkg['order_id'] for pkg in loaded}),
+            )
+        if failed:
+            Prompt.show_batch_result("批量装托", total, len(loaded), failed)
+    
     def add_package_to_pallet(self, package_number):
         """将包裹添加到托盘（仅允许已封包/已完成的包裹）"""
         if not self.current_pallet_id:
@@ -593,15 +759,6 @@ class PalletManagement(QWidget):
                 Prompt.show_warning(f"包裹 {package_number} 未完成封包，不能入托")
                 conn.close()
                 return
-            # 若为completed，先自动设为sealed
-            if normalize_package_status(pkg_status) == 'completed':
-                try:
-                    cursor.execute('UPDATE packages SET status = ? WHERE id = ?', ('sealed', package_id))
-                    conn.commit()
-                    pkg_status = 'sealed'
-                except Exception:
-                    pass
-            
             # 检查包裹是否已在其他托盘中
             if current_pallet_id and current_pallet_id != self.current_pallet_id:
                 cursor.execute('SELECT pallet_number FROM pallets WHERE id = ?', (current_pallet_id,))
@@ -624,122 +781,111 @@ class PalletManagement(QWidget):
                     title="确认"):
                     conn.close()
                     return
-            
-            # 更新包裹的托盘ID（加入锁重试）
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    cursor.execute('UPDATE packages SET pallet_id = ? WHERE id = ?', (self.current_pallet_id, package_id))
-                    conn.commit()
-                    break
-                except sqlite3.OperationalError as e:
-                    if 'database is locked' in str(e) and attempt < max_retries - 1:
-                        time.sleep(0.3)
-                        continue
-                    else:
-                        raise
             conn.close()
-
-            # 审计日志
-            try:
-                db.log_operation('add_to_pallet', f"包裹 {package_number} 入托盘 {self.current_pallet_id}")
-            except Exception:
-                pass
             
-            self.scan_status_label.setText(f"状态: 包裹 {package_number} 添加成功")
-            self.scan_status_label.setStyleSheet("color: #27ae60; font-size: 12px;")
-            try:
-                voice_speak(f"托盘添加包裹成功。包裹号 {package_number}")
-            except Exception:
-                pass
-            
-            # 刷新显示
-            self.load_pallets()
-            # 更新包裹列表区域为显示该订单下剩余包裹
-            try:
-                self.current_order_id = package_order_id
-                self.update_order_display()
-                if hasattr(self, 'show_all_packages_cb'):
-                    self.show_all_packages_cb.setChecked(False)
-                # 重置分页并加载订单包裹
-                self.packages_page = 1
-                self.load_order_packages()
-            except Exception:
-                # 兜底：若失败则继续显示当前托盘的包裹
-                self.load_packages_for_pallet(self.current_pallet_id)
-            
-            # 统一刷新并发出跨页信号
-            try:
-                self.refresh_data()
-                self.data_changed.emit()
-            except Exception:
-                pass
+            # 入托写入交给写线程（已完成的包裹同时置为已封包），锁等待不阻塞界面
+            pallet_id = self.current_pallet_id
+            self.scan_status_label.setText(f"状态: 包裹 {package_number} 正在入托...")
+            self.scan_status_label.setStyleSheet("color: #2980b9; font-size: 12px;")
+            self.submit_write(
+                lambda conn: db.load_packages_to_pallet(pallet_id, [package_id]),
+                lambda future: self._on_package_added(
+                    future, package_number, package_id, package_order_id, pallet_id, current_pallet_id
+                ),
+            )
             
         except Exception as e:
             self.scan_status_label.setText(f"状态: 添加失败 - {str(e)}")
             self.scan_status_label.setStyleSheet("color: #e74c3c; font-size: 12px;")
             QMessageBox.critical(self, "错误", f"添加包裹失败：{str(e)}")
             traceback.print_exc()
+    
+    def _on_package_added(self, future, package_number, package_id, package_order_id, pallet_id, previous_pallet_id):
+        """单个包裹入托写入完成（界面线程）"""
+        error = future.exception()
+        if error is not None:
+            self.scan_status_label.setText(f"状态: 添加失败 - {str(error)}")
+            self.scan_status_label.setStyleSheet("color: #e74c3c; font-size: 12px;")
+            QMessageBox.critical(self, "错误", f"添加包裹失败：{str(error)}")
+            return
+        if not future.result():
+            # 已在当前托盘中，或写入前状态已被其他工位改变
+            reason = "已在当前托盘中" if previous_pallet_id == pallet_id else "状态已变化"
+            self.scan_status_label.setText(f"状态: 包裹 {package_number} 未入托（{reason}）")
+            self.scan_status_label.setStyleSheet("color: #f39c12; font-size: 12px;")
+            return
+        
+        self.scan_status_label.setText(f"状态: 包裹 {package_number} 添加成功")
+        self.scan_status_label.setStyleSheet("color: #27ae60; font-size: 12px;")
+        try:
+            voice_speak(f"托盘添加包裹成功。包裹号 {package_number}")
+        except Exception:
+            pass
+        
+        # 刷新显示
+        self.load_pallets()
+        # 更新包裹列表区域为显示该订单下剩余包裹
+        try:
+            self.current_order_id = package_order_id
+            self.update_order_display()
+            if hasattr(self, 'show_all_packages_cb'):
+                self.show_all_packages_cb.setChecked(False)
+            # 重置分页并加载订单包裹
+            self.packages_page = 1
+            self.load_order_packages()
+        except Exception:
+            # 兜底：若失败则继续显示当前托盘的包裹
+            self.load_packages_for_pallet(pallet_id)
+        
+        # 统一刷新并发出跨页信号
+        try:
+            self.refresh_data()
+            pallet_ids = [pallet_id] + ([previous_pallet_id] if previous_pallet_id else [])
+            self.publish_change(EventKind.PACKAGE_PALLETIZED, package_ids=[package_id], package_numbers=[package_number], pallet_ids=pallet_ids, order_ids=[package_order_id])
+        except Exception:
+            pass
 
-    def load_pallets(self):
-        """加载托盘列表"""
+    def load_pallets(self, keep_total=False):
+        """加载托盘列表（keep_total: 翻页时沿用缓存的托盘总数）"""
         try:
             # 未选择订单时，不显示任何托盘
             if not getattr(self, 'current_order_id', None):
                 self.pallets_table.setRowCount(0)
                 return
-            conn = db.get_connection()
-            cursor = conn.cursor()
             # 每页大小
             try:
                 page_size = int(db.get_setting('pallets_page_size', '100'))
             except Exception:
                 page_size = 100
-            offset = max(0, (getattr(self, 'pallets_page', 1) - 1) * page_size)
             
             # 显示：
             # 1) 该订单的托盘（p.order_id = current_order_id）
-            # 2) 包含该订单包裹的托盘（EXISTS 包裹子查询）
-            # 统计总数用于分页（支持搜索）
+            # 2) 包含该订单包裹的托盘
+            # 两者都记录在 pallet_orders 中，按 (创建时间, ID) 键集分页，每页代价与页码无关
             search_text = (self.pallet_search_edit.text().strip() if hasattr(self, 'pallet_search_edit') else '')
-            count_sql = '''
-                SELECT COUNT(*)
-                FROM pallets p
-                WHERE (p.order_id = ?
-                   OR EXISTS (
-                        SELECT 1 FROM packages pp
-                        WHERE pp.pallet_id = p.id AND pp.order_id = ?
-                   ))
-            '''
-            count_params = [self.current_order_id, self.current_order_id]
-            if search_text:
-                count_sql += ' AND p.pallet_number LIKE ?'
-                count_params.append(f'%{search_text}%')
-            cursor.execute(count_sql, count_params)
-            total = cursor.fetchone()[0] or 0
+            keyset_key = (self.current_order_id, search_text, page_size)
+            keyset = getattr(self, '_pallets_keyset', None)
+            if keyset is None or keyset['key'] != keyset_key:
+                # 订单/搜索条件变化：回到第一页并重新统计总数
+                keyset = {'key': keyset_key, 'cursors': [None], 'total': None}
+                self._pallets_keyset = keyset
+                self.pallets_page = 1
+            # 翻页时沿用缓存的总数，其余情况（数据变化后的重载）重新统计
+            if keyset['total'] is None or not keep_total:
+                keyset['total'] = db.count_order_pallets(self.current_order_id, search_text)
+            total = keyset['total']
             self.pallets_total_pages = max(1, (total + page_size - 1) // page_size)
-
-            query = '''
-                SELECT p.id, p.pallet_number, p.pallet_type, p.status, p.created_at,
-                       COUNT(pkg.id) as package_count, p.pallet_index
-                FROM pallets p
-                LEFT JOIN packages pkg ON p.id = pkg.pallet_id
-                WHERE (p.order_id = ?
-                   OR EXISTS (
-                        SELECT 1 FROM packages pp
-                        WHERE pp.pallet_id = p.id AND pp.order_id = ?
-                   ))
-            '''
-            qparams = [self.current_order_id, self.current_order_id]
-            if search_text:
-                query += ' AND p.pallet_number LIKE ?'
-                qparams.append(f'%{search_text}%')
-            query += ' GROUP BY p.id, p.pallet_number, p.pallet_type, p.status, p.created_at, p.pallet_index ORDER BY p.created_at DESC LIMIT ? OFFSET ?'
-            qparams.extend([page_size, offset])
-            cursor.execute(query, qparams)
-            
-            pallets = cursor.fetchall()
-            conn.close()
+            if self.pallets_page > min(self.pallets_total_pages, len(keyset['cursors'])):
+                self.pallets_page = 1
+            
+            pallets = db.get_order_pallets_page(
+                self.current_order_id, search_text, page_size,
+                after=keyset['cursors'][self.pallets_page - 1]
+            )
+            # 记录下一页的起点
+            del keyset['cursors'][self.pallets_page:]
+            if pallets:
+                keyset['cursors'].append(pallets[-1][7])
             
             self.pallets_table.setRowCount(len(pallets))
             self.update_pallets_page_label()
@@ -830,6 +976,7 @@ class PalletManagement(QWidget):
 
     def _pil_to_qpixmap(self, pil_image):
         try:
+            import numpy as np
             arr = np.array(pil_image.convert('RGB'))
             h, w, ch = arr.shape
             bytes_per_line = ch * w
@@ -870,7 +1017,8 @@ class PalletManagement(QWidget):
                 QMessageBox.information(self, "已复制", f"托盘号 {pallet_number} 已复制到剪贴板")
                 return
 
-            # 生成二维码图片（带托盘号文字）
+            # 生成二维码图片（带托盘号文字；二维码/图像库较重，用到时才导入）
+            from qr_handler import QRCodeHandler
             handler = QRCodeHandler()
             try:
                 # 使用通用生成：二维码 + 文本（托盘号）
@@ -1039,8 +1187,10 @@ class PalletManagement(QWidget):
                     base_sql += " AND p.order_id = ?"
                     params.append(order_id)
                 if text:
-                    base_sql += " AND (p.pallet_number LIKE ? OR o.order_number LIKE ?)"
-                    params.extend([f"%{text}%", f"%{text}%"]) 
+                    pallet_condition, pallet_params = db.search_condition('pallets', text, 'p')
+                    order_condition, order_params = db.search_condition('orders', text, 'o')
+                    base_sql += f" AND ({pallet_condition} OR {order_condition})"
+                    params.extend(pallet_params + order_params)
                 base_sql += " ORDER BY p.created_at DESC"
                 cur.execute(base_sql, params)
                 rows = cur.fetchall()
@@ -1054,42 +1204,61 @@ class PalletManagement(QWidget):
             only_same_order.stateChanged.connect(lambda _s: refresh_candidates())
 
             def on_ok():
-                try:
-                    target_id = target_combo.currentData()
-                    # 查找选中包裹并迁移（仅允许已完成或已封包的包裹）
-                    moved = 0
-                    for num in numbers:
-                        cur.execute('SELECT id, status FROM packages WHERE package_number = ? AND pallet_id = ?', (num, self.current_pallet_id))
-                        pr = cur.fetchone()
-                        if pr:
-                            pkg_id, pkg_status = pr
-                            if pkg_status not in ('completed', 'sealed'):
-                                QMessageBox.information(self, "提示", f"包裹 {num} 未完成封包，无法移动")
-                                continue
-                            cur.execute('UPDATE packages SET pallet_id = ? WHERE id = ?', (target_id, pkg_id))
-                            moved += 1
-                    conn.commit()
-                    # 刷新界面
-                    self.update_pallet_info_display()
-                    self.update_selected_pallet_info_panel()
-                    QMessageBox.information(self, "成功", f"已移动 {moved} 个包裹")
-                    # 统一刷新并发出跨页信号
-                    self.refresh_data()
-                    try:
-                        self.data_changed.emit()
-                    except Exception:
-                        pass
-                    dlg.accept()
-                except Exception as e:
-                    QMessageBox.critical(self, "错误", f"移动失败：{str(e)}")
+                if target_combo.currentData() is None:
+                    QMessageBox.information(dlg, "提示", "请选择目标托盘")
+                    return
+                dlg.accept()
 
             btns.accepted.connect(on_ok)
             btns.rejected.connect(dlg.reject)
-            dlg.exec_()
+            accepted = dlg.exec_() == QDialog.Accepted
+            target_id = target_combo.currentData()
             conn.close()
+            if not accepted:
+                return
+
+            pallet_id = self.current_pallet_id
+
+            def move(conn):
+                # 查找选中包裹并迁移（仅允许已完成或已封包的包裹）
+                moved, not_ready = [], []
+                for num in numbers:
+                    pr = conn.execute('SELECT id, status FROM packages WHERE package_number = ? AND pallet_id = ?',
+                                      (num, pallet_id)).fetchone()
+                    if not pr:
+                        continue
+                    pkg_id, pkg_status = pr
+                    if pkg_status not in ('completed', 'sealed'):
+                        not_ready.append(num)
+                        continue
+                    conn.execute('UPDATE packages SET pallet_id = ? WHERE id = ?', (target_id, pkg_id))
+                    moved.append(num)
+                return moved, not_ready
+
+            self.submit_write(move, lambda future: self._on_packages_moved(future, pallet_id, target_id))
         except Exception as e:
             QMessageBox.critical(self, "错误", f"移动包裹失败：{str(e)}")
 
+    def _on_packages_moved(self, future, pallet_id, target_id):
+        """移动包裹写入完成（界面线程）"""
+        error = future.exception()
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"移动失败：{str(error)}")
+            return
+        moved, not_ready = future.result()
+        # 刷新界面
+        self.update_pallet_info_display()
+        self.update_selected_pallet_info_panel()
+        if not_ready:
+            QMessageBox.information(self, "提示", f"以下包裹未完成封包，无法移动：{'、'.join(not_ready)}")
+        QMessageBox.information(self, "成功", f"已移动 {len(moved)} 个包裹")
+        # 统一刷新并发出跨页信号
+        self.refresh_data()
+        try:
+            self.publish_change(EventKind.PACKAGE_PALLETIZED, package_numbers=moved, pallet_ids=[pallet_id, target_id])
+        except Exception:
+            pass
+
     def delete_packages(self):
         """移除托盘：将选中的包裹从当前托盘中移出；封托/关闭时禁止移出"""
         try:
@@ -1100,48 +1269,56 @@ class PalletManagement(QWidget):
             cur = conn.cursor()
             cur.execute('SELECT status, pallet_number FROM pallets WHERE id = ?', (self.current_pallet_id,))
             row = cur.fetchone()
+            conn.close()
             status, pallet_number = (row[0], row[1]) if row else (None, "")
 
             numbers = self._get_selected_package_numbers()
             if not numbers:
-                conn.close()
                 QMessageBox.information(self, "提示", "请在托盘包裹列表中选择要移出的包裹")
                 return
 
             # 新增：封托/关闭时直接禁止移出
             if status in ('sealed', 'closed'):
-                conn.close()
                 QMessageBox.information(self, "提示", "当前托盘已封托或已关闭，不能移出包裹")
                 return
 
-            # 执行移出：将选中包裹的 pallet_id 置为 NULL
-            removed = 0
-            for num in numbers:
-                cur.execute('''
-                    UPDATE packages 
-                    SET pallet_id = NULL,
-                        status = CASE WHEN status = 'sealed' THEN 'completed' ELSE status END
-                    WHERE package_number = ? AND pallet_id = ?
-                ''', (num, self.current_pallet_id))
-                if cur.rowcount:
-                    removed += 1
-
-            conn.commit()
-            conn.close()
-
-            # 刷新界面与列表
-            self.update_pallet_info_display()
-            self.update_selected_pallet_info_panel()
-            self.refresh_data()
-            try:
-                self.data_changed.emit()
-            except Exception:
-                pass
-
-            QMessageBox.information(self, "成功", f"已将 {removed} 个包裹移出托盘")
+            pallet_id = self.current_pallet_id
+
+            def remove(conn):
+                # 执行移出：将选中包裹的 pallet_id 置为 NULL
+                removed = 0
+                for num in numbers:
+                    cursor = conn.execute('''
+                        UPDATE packages 
+                        SET pallet_id = NULL,
+                            status = CASE WHEN status = 'sealed' THEN 'completed' ELSE status END
+                        WHERE package_number = ? AND pallet_id = ?
+                    ''', (num, pallet_id))
+                    if cursor.rowcount:
+                        removed += 1
+                return removed
+
+            self.submit_write(remove, lambda future: self._on_packages_removed(future, numbers, pallet_id))
         except Exception as e:
             QMessageBox.critical(self, "错误", f"移除托盘失败：{str(e)}")
 
+    def _on_packages_removed(self, future, numbers, pallet_id):
+        """包裹移出托盘写入完成（界面线程）"""
+        error = future.exception()
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"移除托盘失败：{str(error)}")
+            return
+        # 刷新界面与列表
+        self.update_pallet_info_display()
+        self.update_selected_pallet_info_panel()
+        self.refresh_data()
+        try:
+            self.publish_change(EventKind.PACKAGE_UNPALLETIZED, package_numbers=numbers, pallet_ids=[pallet_id])
+        except Exception:
+            pass
+
+        QMessageBox.information(self, "成功", f"已将 {future.result()} 个包裹移出托盘")
+
     def edit_pallet(self):
         """编辑托盘信息（类型、序号、状态）"""
         try:
@@ -1190,36 +1367,40 @@ class PalletManagement(QWidget):
             btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
             grid.addWidget(btns, 4, 0, 1, 2)
 
-            def on_ok():
-                try:
-                    new_index = index_edit.text().strip()
-                    new_type = 'physical' if type_combo.currentIndex() == 0 else 'virtual'
-                    new_status = ['open', 'sealed', 'closed'][status_combo.currentIndex()]
-                    conn2 = db.get_connection()
-                    cur2 = conn2.cursor()
-                    cur2.execute('UPDATE pallets SET pallet_index = ?, pallet_type = ?, status = ? WHERE id = ?',
-                                 (new_index if new_index else None, new_type, new_status, self.current_pallet_id))
-                    conn2.commit()
-                    conn2.close()
-                    # 刷新列表与信息区
-                    self.load_pallets()
-                    self.update_pallet_info_display()
-                    self.update_selected_pallet_info_panel()
-                    # 统一刷新并发出跨页信号
-                    self.refresh_data()
-                    try:
-                        self.data_changed.emit()
-                    except Exception:
-                        pass
-                    dialog.accept()
-                except Exception as e:
-                    QMessageBox.critical(self, "错误", f"保存失败：{str(e)}")
-
-            btns.accepted.connect(on_ok)
+            btns.accepted.connect(dialog.accept)
             btns.rejected.connect(dialog.reject)
-            dialog.exec_()
+            if dialog.exec_() != QDialog.Accepted:
+                return
+
+            new_index = index_edit.text().strip()
+            new_type = 'physical' if type_combo.currentIndex() == 0 else 'virtual'
+            new_status = ['open', 'sealed', 'closed'][status_combo.currentIndex()]
+            pallet_id = self.current_pallet_id
+
+            def update_pallet(conn):
+                conn.execute('UPDATE pallets SET pallet_index = ?, pallet_type = ?, status = ? WHERE id = ?',
+                             (new_index if new_index else None, new_type, new_status, pallet_id))
+
+            self.submit_write(update_pallet, lambda future: self._on_pallet_edited(future, pallet_id))
         except Exception as e:
             QMessageBox.critical(self, "错误", f"编辑托盘失败：{str(e)}")
+
+    def _on_pallet_edited(self, future, pallet_id):
+        """编辑托盘写入完成（界面线程）"""
+        error = future.exception()
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"保存失败：{str(error)}")
+            return
+        # 刷新列表与信息区
+        self.load_pallets()
+        self.update_pallet_info_display()
+        self.update_selected_pallet_info_panel()
+        # 统一刷新并发出跨页信号
+        self.refresh_data()
+        try:
+            self.publish_change(EventKind.PALLET_CHANGED, pallet_ids=[pallet_id])
+        except Exception:
+            pass
     
     def load_packages_for_pallet(self, pallet_id):
         """加载指定托盘的包裹"""
@@ -1233,14 +1414,15 @@ class PalletManagement(QWidget):
             offset = max(0, (getattr(self, 'packages_page', 1) - 1) * page_size)
             # 总数统计（支持搜索）
             search_text = self.package_search_edit.text().strip() if hasattr(self, 'package_search_edit') else ''
+            search_sql, search_params = self._package_search_condition(search_text)
             if search_text:
-                count_sql = '''
+                count_sql = f'''
                     SELECT COUNT(*)
                     FROM packages p
                     LEFT JOIN orders o ON p.order_id = o.id
-                    WHERE p.pallet_id = ? AND (p.package_number LIKE ? OR o.order_number LIKE ?)
+                    WHERE p.pallet_id = ? AND {search_sql}
                 '''
-                cursor.execute(count_sql, (pallet_id, f'%{search_text}%', f'%{search_text}%'))
+                cursor.execute(count_sql, [pallet_id] + search_params)
             else:
                 cursor.execute('SELECT COUNT(*) FROM packages WHERE pallet_id = ?', (pallet_id,))
             total = cursor.fetchone()[0] or 0
@@ -1256,8 +1438,8 @@ class PalletManagement(QWidget):
             '''
             params = [pallet_id]
             if search_text:
-                query += ' AND (p.package_number LIKE ? OR o.order_number LIKE ?)'
-                params.extend([f'%{search_text}%', f'%{search_text}%'])
+                query += f' AND {search_sql}'
+                params.extend(search_params)
             query += ' ORDER BY p.created_at DESC LIMIT ? OFFSET ?'
             params.extend([page_size, offset])
             cursor.execute(query, params)
@@ -1272,6 +1454,12 @@ class PalletManagement(QWidget):
             QMessageBox.critical(self, "错误", f"加载包裹列表失败：{str(e)}")
             traceback.print_exc()
     
+    def _package_search_condition(self, search_text):
+        """包裹列表搜索条件：包裹号或订单号包含关键字（走编号搜索索引）"""
+        package_condition, package_params = db.search_condition('packages', search_text, 'p')
+        order_condition, order_params = db.search_condition('orders', search_text, 'o')
+        return f'({package_condition} OR {order_condition})', package_params + order_params
+    
     def load_order_packages(self):
         """加载当前订单的包裹"""
         if not self.current_order_id:
@@ -1286,13 +1474,14 @@ class PalletManagement(QWidget):
                 page_size = 100
             offset = max(0, (getattr(self, 'packages_page', 1) - 1) * page_size)
             search_text = self.package_search_edit.text().strip() if hasattr(self, 'package_search_edit') else ''
+            search_sql, search_params = self._package_search_condition(search_text)
             if search_text:
-                count_sql = '''
+                count_sql = f'''
                     SELECT COUNT(*) FROM packages p
                     LEFT JOIN orders o ON p.order_id = o.id
-                    WHERE p.order_id = ? AND p.status = 'completed' AND (p.package_number LIKE ? OR o.order_number LIKE ?)
+                    WHERE p.order_id = ? AND p.status = 'completed' AND {search_sql}
                 '''
-                cursor.execute(count_sql, (self.current_order_id, f'%{search_text}%', f'%{search_text}%'))
+                cursor.execute(count_sql, [self.current_order_id] + search_params)
             else:
                 cursor.execute("SELECT COUNT(*) FROM packages WHERE order_id = ? AND status = 'completed'", (self.current_order_id,))
             total = cursor.fetchone()[0] or 0
@@ -1308,8 +1497,8 @@ class PalletManagement(QWidget):
             '''
             params = [self.current_order_id]
             if search_text:
-                query += ' AND (p.package_number LIKE ? OR o.order_number LIKE ?)'
-                params.extend([f'%{search_text}%', f'%{search_text}%'])
+                query += f' AND {search_sql}'
+                params.extend(search_params)
             query += ' ORDER BY p.created_at DESC LIMIT ? OFFSET ?'
             params.extend([page_size, offset])
             cursor.execute(query, params)
@@ -1335,13 +1524,14 @@ class PalletManagement(QWidget):
                 page_size = 100
             offset = max(0, (getattr(self, 'packages_page', 1) - 1) * page_size)
             search_text = self.package_search_edit.text().strip() if hasattr(self, 'package_search_edit') else ''
+            search_sql, search_params = self._package_search_condition(search_text)
             if search_text:
-                count_sql = '''
+                count_sql = f'''
                     SELECT COUNT(*) FROM packages p
                     LEFT JOIN orders o ON p.order_id = o.id
-                    WHERE p.status = 'completed' AND (p.package_number LIKE ? OR o.order_number LIKE ?)
+                    WHERE p.status = 'completed' AND {search_sql}
                 '''
-                cursor.execute(count_sql, (f'%{search_text}%', f'%{search_text}%'))
+                cursor.execute(count_sql, search_params)
             else:
                 cursor.execute("SELECT COUNT(*) FROM packages WHERE status = 'completed'")
             total = cursor.fetchone()[0] or 0
@@ -1357,8 +1547,8 @@ class PalletManagement(QWidget):
             '''
             params = []
             if search_text:
-                query += ' AND (p.package_number LIKE ? OR o.order_number LIKE ?)'
-                params.extend([f'%{search_text}%', f'%{search_text}%'])
+                query += f' AND {search_sql}'
+                params.extend(search_params)
             query += ' ORDER BY p.created_at DESC LIMIT ? OFFSET ?'
             params.extend([page_size, offset])
             cursor.execute(query, params)
@@ -1457,22 +1647,44 @@ class PalletManagement(QWidget):
         self.pallets_page = 1
         self.load_pallets()
     
-    def refresh_data(self):
-        """刷新数据"""
-        # 保持当前分页，重新加载数据
-        self.load_pallets()
+    def publish_change(self, kind, **ids):
+        """发布托盘页的领域事件（保留 data_changed 信号兼容旧连接）"""
+        event_bus.publish(kind, source=self, **ids)
+        self.data_changed.emit()
+    
+    def on_domain_event(self, event):
+        """其他页面的变更：包装状态变化只需重载包裹列表与待打托数量，其余整页刷新"""
+        if event.kind in (EventKind.COMPONENT_PACKED, EventKind.COMPONENT_UNPACKED):
+            return True  # 进行中的包装不在托盘页显示
+        if event.kind == EventKind.COMPONENTS_DELETED and event.component_ids:
+            return True  # 只会删除未入包的板件
+        if event.kind == EventKind.PACKAGE_DELETED and not event.package_ids:
+            return False  # 管理员删除：范围未知
+        if event.kind in (EventKind.PACKAGE_CREATED, EventKind.PACKAGE_FINISHED,
+                          EventKind.PACKAGE_REOPENED, EventKind.PACKAGE_DELETED):
+            self.reload_packages_view()
+            return True
+        return False
+    
+    def reload_packages_view(self):
+        """按当前显示模式重载包裹列表（保持分页）并更新待打托数量"""
         if self.show_all_packages_cb.isChecked():
             self.load_packages()
         elif self.current_order_id:
             self.load_order_packages()
         elif self.current_pallet_id:
             self.load_packages_for_pallet(self.current_pallet_id)
-        # 同步更新待打托数量
         try:
             self.update_pending_to_pallet_count()
         except Exception:
             pass
     
+    def refresh_data(self):
+        """刷新数据"""
+        # 保持当前分页，重新加载数据
+        self.load_pallets()
+        self.reload_packages_view()
+    
     def update_pending_to_pallet_count(self):
         """统计待打托包裹数（已完成但未入托）并更新工具栏标签"""
         try:
@@ -1624,12 +1836,12 @@ class PalletManagement(QWidget):
     def on_pallets_prev_page(self):
         if getattr(self, 'pallets_page', 1) > 1:
             self.pallets_page -= 1
-            self.load_pallets()
+            self.load_pallets(keep_total=True)
 
     def on_pallets_next_page(self):
         if getattr(self, 'pallets_page', 1) < getattr(self, 'pallets_total_pages', 1):
             self.pallets_page += 1
-            self.load_pallets()
+            self.load_pallets(keep_total=True)
 
     def on_packages_prev_page(self):
         if getattr(self, 'packages_page', 1) > 1:
@@ -1681,72 +1893,63 @@ class PalletManagement(QWidget):
                 return
 
             is_virtual = radio_virtual.isChecked()
-
-            conn = db.get_connection()
-            cursor = conn.cursor()
-
-            pallet_number = db.generate_pallet_number(is_virtual=is_virtual)
             pallet_type = 'virtual' if is_virtual else 'physical'
-
-            # 计算稳定托盘序号（每订单内填补缺口）
-            next_index = None
-            try:
-                next_index = db.get_next_pallet_index(self.current_order_id)
-            except Exception:
-                next_index = None
-
-            # 插入加入锁重试与唯一冲突自愈
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    cursor.execute('''
-                        INSERT INTO pallets (pallet_number, pallet_type, status, created_at, order_id, pallet_index)
-                        VALUES (?, ?, 'open', datetime('now'), ?, ?)
-                    ''', (pallet_number, pallet_type, self.current_order_id, next_index))
-                    conn.commit()
-                    break
-                except sqlite3.IntegrityError as e:
-                    # 托盘号唯一约束冲突，重新生成托盘号后重试
-                    if 'UNIQUE constraint failed: pallets.pallet_number' in str(e):
+            order_id = self.current_order_id
+
+            def insert_pallet(conn):
+                # 托盘号与稳定托盘序号（每订单内填补缺口）在同一写事务内分配
+                pallet_number = db.generate_pallet_number(is_virtual=is_virtual)
+                next_index = db.allocate_pallet_index(conn, order_id)
+                # 唯一冲突自愈：托盘号冲突时重新生成
+                for _ in range(3):
+                    try:
+                        conn.execute('''
+                            INSERT INTO pallets (pallet_number, pallet_type, status, created_at, order_id, pallet_index)
+                            VALUES (?, ?, 'open', datetime('now'), ?, ?)
+                        ''', (pallet_number, pallet_type, order_id, next_index))
+                        break
+                    except sqlite3.IntegrityError as e:
+                        if 'UNIQUE constraint failed: pallets.pallet_number' not in str(e):
+                            raise
                         pallet_number = db.generate_pallet_number(is_virtual=is_virtual)
-                        continue
-                    else:
-                        raise
-                except sqlite3.OperationalError as e:
-                    if 'database is locked' in str(e) and attempt < max_retries - 1:
-                        time.sleep(0.3)
-                        continue
-                    else:
-                        raise
-            conn.close()
-
-            # 记录操作日志
-            try:
+                else:
+                    raise RuntimeError("托盘号冲突，请重试")
+                # 记录操作日志
                 db.log_operation('create_pallet', {
                     'pallet_number': pallet_number,
-                    'order_id': self.current_order_id,
+                    'order_id': order_id,
                     'pallet_type': pallet_type
-                })
-            except Exception:
-                pass
+                }, conn=conn)
+                return pallet_number
 
-            self.load_pallets()
-            QMessageBox.information(self, "成功", f"{('虚拟托盘' if is_virtual else '实体托盘')} {pallet_number} 创建成功")
-            try:
-                voice_speak(f"{('虚拟托盘' if is_virtual else '实体托盘')}创建成功。编号 {pallet_number}")
-            except Exception:
-                pass
-            # 统一刷新并发出跨页信号
-            try:
-                self.refresh_data()
-                self.data_changed.emit()
-            except Exception:
-                pass
+            self.new_tray_btn.setEnabled(False)
+            self.submit_write(insert_pallet, lambda future: self._on_pallet_created(future, is_virtual, order_id))
 
         except Exception as e:
             QMessageBox.critical(self, "错误", f"创建托盘失败：{str(e)}")
             traceback.print_exc()
     
+    def _on_pallet_created(self, future, is_virtual, order_id):
+        """新建托盘写入完成（界面线程）"""
+        self.new_tray_btn.setEnabled(True)
+        error = future.exception()
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"创建托盘失败：{str(error)}")
+            return
+        pallet_number = future.result()
+        self.load_pallets()
+        QMessageBox.information(self, "成功", f"{('虚拟托盘' if is_virtual else '实体托盘')} {pallet_number} 创建成功")
+        try:
+            voice_speak(f"{('虚拟托盘' if is_virtual else '实体托盘')}创建成功。编号 {pallet_number}")
+        except Exception:
+            pass
+        # 统一刷新并发出跨页信号
+        try:
+            self.refresh_data()
+            self.publish_change(EventKind.PALLET_CREATED, order_ids=[order_id])
+        except Exception:
+            pass
+    
     def create_virtual_pallet(self):
         """创建虚拟托盘"""
         try:
@@ -1754,47 +1957,25 @@ class PalletManagement(QWidget):
             if not self.current_order_id:
                 QMessageBox.warning(self, "警告", "请先选择订单，托盘必须绑定订单后才能创建")
                 return
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            
-            # 生成虚拟托盘号
-            pallet_number = db.generate_pallet_number(is_virtual=True)
-            
-            # 插入新虚拟托盘
-            # 计算稳定托盘序号（每订单内填补缺口）
-            next_index = None
-            try:
-                next_index = db.get_next_pallet_index(self.current_order_id)
-            except Exception:
-                next_index = None
-
-            cursor.execute('''
-                INSERT INTO pallets (pallet_number, pallet_type, status, created_at, order_id, pallet_index)
-                VALUES (?, 'virtual', 'open', datetime('now'), ?, ?)
-            ''', (pallet_number, self.current_order_id, next_index))
-            
-            conn.commit()
-            conn.close()
-            
-            self.load_pallets()
-            QMessageBox.information(self, "成功", f"虚拟托盘 {pallet_number} 创建成功")
-            # 统一刷新并发出跨页信号
-            try:
-                self.refresh_data()
-                self.data_changed.emit()
-            except Exception:
-                pass
-
-            # 记录操作日志
-            try:
+            order_id = self.current_order_id
+            
+            def insert_pallet(conn):
+                # 虚拟托盘号与稳定托盘序号（每订单内填补缺口）在同一写事务内分配
+                pallet_number = db.generate_pallet_number(is_virtual=True)
+                next_index = db.allocate_pallet_index(conn, order_id)
+                conn.execute('''
+                    INSERT INTO pallets (pallet_number, pallet_type, status, created_at, order_id, pallet_index)
+                    VALUES (?, 'virtual', 'open', datetime('now'), ?, ?)
+                ''', (pallet_number, order_id, next_index))
+                # 记录操作日志
                 db.log_operation('create_pallet', {
                     'pallet_number': pallet_number,
-                    'order_id': self.current_order_id,
+                    'order_id': order_id,
                     'pallet_type': 'virtual'
-                })
-            except Exception:
-                pass
+                }, conn=conn)
+                return pallet_number
             
+            self.submit_write(insert_pallet, lambda future: self._on_pallet_created(future, True, order_id))
         except Exception as e:
             QMessageBox.critical(self, "错误", f"创建虚拟托盘失败：{str(e)}")
             traceback.print_exc()
@@ -1823,114 +2004,109 @@ class PalletManagement(QWidget):
             # 检查托盘中是否有包裹
             cursor.execute('SELECT COUNT(*) FROM packages WHERE pallet_id = ?', (self.current_pallet_id,))
             package_count = cursor.fetchone()[0]
+            conn.close()
             
             if package_count > 0:
                 reply = QMessageBox.question(self, "确认删除", 
                     f"托盘 {pallet_number} 中还有 {package_count} 个包裹，删除托盘将会将这些包裹移出托盘。\n\n确定要删除吗？",
                     QMessageBox.Yes | QMessageBox.No)
-                if reply != QMessageBox.Yes:
-                    conn.close()
-                    return
-                
-                # 将包裹从托盘中移出
-                cursor.execute('''UPDATE packages 
-                                   SET pallet_id = NULL,
-                                       status = CASE WHEN status = 'sealed' THEN 'completed' ELSE status END 
-                                   WHERE pallet_id = ?''', (self.current_pallet_id,))
             else:
                 reply = QMessageBox.question(self, "确认删除", 
                     f"确定要删除托盘 {pallet_number} 吗？",
                     QMessageBox.Yes | QMessageBox.No)
-                if reply != QMessageBox.Yes:
-                    conn.close()
-                    return
-            
-            # 删除托盘
-            cursor.execute('DELETE FROM pallets WHERE id = ?', (self.current_pallet_id,))
-            
-            conn.commit()
-            conn.close()
-            
-            # 清除当前选择
-            self.current_pallet_id = None
-            self.pallet_info_label.setText("请选择托盘查看详细信息")
-            self.pallet_packages_table.setRowCount(0)
-            
-            # 刷新托盘列表
-            self.load_pallets()
+            if reply != QMessageBox.Yes:
+                return
             
-            QMessageBox.information(self, "成功", f"托盘 {pallet_number} 删除成功")
-            # 统一刷新并发出跨页信号
-            try:
-                self.refresh_data()
-                self.data_changed.emit()
-            except Exception:
-                pass
-
-            # 云端删除同步：托盘
-            try:
-                from real_time_cloud_sync import get_sync_service
-                svc = getattr(self, 'cloud_sync_service', None) or get_sync_service()
-                if pallet_number:
-                    svc.trigger_sync('delete_pallets', {'items': [{'pallet_number': pallet_number}]}, force=True)
-            except Exception as e:
-                print(f"触发云端删除托盘失败: {e}")
-
-            # 记录操作日志
-            try:
+            pallet_id = self.current_pallet_id
+            
+            def remove_pallet(conn):
+                # 将包裹从托盘中移出（包括确认期间其他工位装入的包裹）
+                conn.execute('''UPDATE packages 
+                                SET pallet_id = NULL,
+                                    status = CASE WHEN status = 'sealed' THEN 'completed' ELSE status END 
+                                WHERE pallet_id = ?''', (pallet_id,))
+                # 删除托盘
+                conn.execute('DELETE FROM pallets WHERE id = ?', (pallet_id,))
+                # 记录操作日志
                 db.log_operation('delete_pallet', {
                     'pallet_number': pallet_number,
                     'order_id': pallet_order_id,
                     'pallet_type': pallet_type,
                     'package_count': package_count
-                })
-            except Exception:
-                pass
-            # 云端删除同步：托盘
-            try:
-                from real_time_cloud_sync import get_sync_service
-                svc = getattr(self, 'cloud_sync_service', None) or get_sync_service()
-                if pallet_number:
-                    svc.trigger_sync('delete_pallets', {'items': [{'pallet_number': pallet_number}]}, force=True)
-            except Exception as e:
-                print(f"触发云端删除托盘失败: {e}")
+                }, conn=conn)
+            
+            self.submit_write(remove_pallet, lambda future: self._on_pallet_deleted(future, pallet_id, pallet_number))
             
         except Exception as e:
             QMessageBox.critical(self, "错误", f"删除托盘失败：{str(e)}")
             traceback.print_exc()
     
+    def _on_pallet_deleted(self, future, pallet_id, pallet_number):
+        """删除托盘写入完成（界面线程）"""
+        error = future.exception()
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"删除托盘失败：{str(error)}")
+            return
+        
+        # 清除当前选择
+        if self.current_pallet_id == pallet_id:
+            self.current_pallet_id = None
+            self.pallet_info_label.setText("请选择托盘查看详细信息")
+            self.pallet_packages_table.setRowCount(0)
+        
+        # 刷新托盘列表
+        self.load_pallets()
+        
+        QMessageBox.information(self, "成功", f"托盘 {pallet_number} 删除成功")
+        # 统一刷新并发出跨页信号
+        try:
+            self.refresh_data()
+            self.publish_change(EventKind.PALLET_DELETED)
+        except Exception:
+            pass
+
+        # 云端删除同步：托盘
+        try:
+            from real_time_cloud_sync import get_sync_service
+            svc = getattr(self, 'cloud_sync_service', None) or get_sync_service()
+            if pallet_number:
+                svc.trigger_sync('delete_pallets', {'items': [{'pallet_number': pallet_number}]}, force=True)
+        except Exception as e:
+            print(f"触发云端删除托盘失败: {e}")
+    
     def seal_pallet(self):
         """封托"""
         if not self.current_pallet_id:
             QMessageBox.warning(self, "警告", "请先选择托盘")
             return
         
-        try:
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+        pallet_id = self.current_pallet_id
+        
+        def update_pallet(conn):
+            conn.execute('''
                 UPDATE pallets 
                 SET status = 'sealed', sealed_at = datetime('now')
                 WHERE id = ?
-            ''', (self.current_pallet_id,))
-            
-            conn.commit()
-            conn.close()
-            
-            self.load_pallets()
-            self.update_pallet_info_display()
-            QMessageBox.information(self, "成功", "托盘封托成功")
-            # 统一刷新并发出跨页信号
-            self.refresh_data()
-            try:
-                self.data_changed.emit()
-            except Exception:
-                pass
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"封托失败：{str(e)}")
-            traceback.print_exc()
+            ''', (pallet_id,))
+        
+        self.submit_write(update_pallet, lambda future: self._on_pallet_status_changed(future, pallet_id, "封托"))
+    
+    def _on_pallet_status_changed(self, future, pallet_id, action):
+        """封托/解托写入完成（界面线程）"""
+        error = future.exception()
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"{action}失败：{str(error)}")
+            return
+        
+        self.load_pallets()
+        self.update_pallet_info_display()
+        QMessageBox.information(self, "成功", f"托盘{action}成功")
+        # 统一刷新并发出跨页信号
+        self.refresh_data()
+        try:
+            self.publish_change(EventKind.PALLET_CHANGED, pallet_ids=[pallet_id])
+        except Exception:
+            pass
     
     def unseal_pallet(self):
         """解托"""
@@ -1938,45 +2114,24 @@ class PalletManagement(QWidget):
             QMessageBox.warning(self, "警告", "请先选择托盘")
             return
         
-        try:
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+        pallet_id = self.current_pallet_id
+        
+        def update_pallet(conn):
+            conn.execute('''
                 UPDATE pallets 
                 SET status = 'open', sealed_at = NULL
                 WHERE id = ?
-            ''', (self.current_pallet_id,))
+            ''', (pallet_id,))
             
             # 记录操作日志
-            try:
-                cursor.execute('SELECT pallet_number FROM pallets WHERE id = ?', (self.current_pallet_id,))
-                r = cursor.fetchone()
-                pallet_number = r[0] if r else ''
-                db.log_operation('unseal_pallet', {
-                    'pallet_id': self.current_pallet_id,
-                    'pallet_number': pallet_number,
-                    'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
-            except Exception:
-                pass
-
-            conn.commit()
-            conn.close()
-            
-            self.load_pallets()
-            self.update_pallet_info_display()
-            QMessageBox.information(self, "成功", "托盘解托成功")
-            # 统一刷新并发出跨页信号
-            self.refresh_data()
-            try:
-                self.data_changed.emit()
-            except Exception:
-                pass
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"解托失败：{str(e)}")
-            traceback.print_exc()
+            r = conn.execute('SELECT pallet_number FROM pallets WHERE id = ?', (pallet_id,)).fetchone()
+            db.log_operation('unseal_pallet', {
+                'pallet_id': pallet_id,
+                'pallet_number': r[0] if r else '',
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }, conn=conn)
+        
+        self.submit_write(update_pallet, lambda future: self._on_pallet_status_changed(future, pallet_id, "解托"))
     
     def move_package_to_pallet(self):
         """移动包裹到托盘"""
@@ -1991,24 +2146,24 @@ class PalletManagement(QWidget):
         
         package_id = self.packages_table.item(current_row, 0).data(Qt.UserRole)
         package_number = self.packages_table.item(current_row, 0).text()
+        pallet_id = self.current_pallet_id
         
-        try:
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('UPDATE packages SET pallet_id = ? WHERE id = ?', (self.current_pallet_id, package_id))
-            conn.commit()
-            conn.close()
-            
+        def move(conn):
+            conn.execute('UPDATE packages SET pallet_id = ? WHERE id = ?', (pallet_id, package_id))
+        
+        def on_done(future):
+            error = future.exception()
+            if error is not None:
+                QMessageBox.critical(self, "错误", f"移动包裹失败：{str(error)}")
+                return
             QMessageBox.information(self, "成功", f"包裹 {package_number} 已移动到当前托盘")
             self.refresh_data()
             try:
-                self.data_changed.emit()
+                self.publish_change(EventKind.PACKAGE_PALLETIZED, package_ids=[package_id], package_numbers=[package_number], pallet_ids=[pallet_id])
             except Exception:
                 pass
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"移动包裹失败：{str(e)}")
+        
+        self.submit_write(move, on_done)
     
     def remove_package_from_pallet(self):
         """从托盘中移出包裹"""
@@ -2021,29 +2176,30 @@ class PalletManagement(QWidget):
         package_number = self.packages_table.item(current_row, 0).text()
         
         reply = QMessageBox.question(self, "确认", f"确定要将包裹 {package_number} 从托盘中移出吗？")
-        if reply == QMessageBox.Yes:
+        if reply != QMessageBox.Yes:
+            return
+        
+        def remove(conn):
+            conn.execute('''
+                UPDATE packages 
+                SET pallet_id = NULL,
+                    status = CASE WHEN status = 'sealed' THEN 'completed' ELSE status END
+                WHERE id = ?
+            ''', (package_id,))
+        
+        def on_done(future):
+            error = future.exception()
+            if error is not None:
+                QMessageBox.critical(self, "错误", f"移出包裹失败：{str(error)}")
+                return
+            QMessageBox.information(self, "成功", f"包裹 {package_number} 已从托盘中移出")
+            self.refresh_data()
             try:
-                conn = db.get_connection()
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    UPDATE packages 
-                    SET pallet_id = NULL,
-                        status = CASE WHEN status = 'sealed' THEN 'completed' ELSE status END
-                    WHERE id = ?
-                ''', (package_id,))
-                conn.commit()
-                conn.close()
-                
-                QMessageBox.information(self, "成功", f"包裹 {package_number} 已从托盘中移出")
-                self.refresh_data()
-                try:
-                    self.data_changed.emit()
-                except Exception:
-                    pass
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"移出包裹失败：{str(e)}")
+                self.publish_change(EventKind.PACKAGE_UNPALLETIZED, package_ids=[package_id], package_numbers=[package_number])
+            except Exception:
+                pass
+        
+        self.submit_write(remove, on_done)
     
     def generate_pallet_report(self):
         """生成托盘清单"""
@@ -2199,8 +2355,7 @@ class PalletManagement(QWidget):
                 order_row = cursor.fetchone()
                 if order_row:
                     order_number, customer_name, customer_address = order_row
-                cursor.execute('SELECT COUNT(*) FROM packages WHERE order_id = ?', (order_id,))
-                package_total_in_order = str(cursor.fetchone()[0])
+                package_total_in_order = str(db.get_order_stats(order_id)['total_packages'])
                 cursor.execute('SELECT COUNT(*) FROM pallets WHERE order_id = ?', (order_id,))
                 pallet_total_in_order = str(cursor.fetchone()[0])
 
@@ -2209,6 +2364,7 @@ class PalletManagement(QWidget):
             printed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             print_count = 0
             try:
+                db.flush_operation_logs()
                 cursor.execute(
                     "SELECT COUNT(*) FROM operation_logs WHERE operation_type = 'print_pallet_label' AND operation_data LIKE ?",
                     (f'%"pallet_number":"{pallet_info[0]}"%',)
@@ -9,13 +9,6 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
                              QProgressDialog, QApplication, QCompleter, QToolTip)
 from PyQt5.QtCore import Qt, QDate, QThread, pyqtSignal, QStringListModel, QRect
 from PyQt5.QtGui import QFont, QPainter, QColor
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as XLImage
-from io import BytesIO
-from qr_handler import QRCodeHandler
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-from openpyxl.utils.dataframe import dataframe_to_rows
 from database import db
 from order_management import OrderSelectionDialog
 
@@ -52,6 +45,9 @@ class ExportWorker(QThread):
     
     def export_packages(self):
         """导出包裹数据"""
+        import pandas as pd
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, Alignment, PatternFill
         self.status_updated.emit("正在查询包裹数据...")
         
         conn = db.get_connection()
@@ -72,8 +68,7 @@ class ExportWorker(QThread):
             FROM packages p
             LEFT JOIN orders o ON p.order_id = o.id
             LEFT JOIN components c ON c.package_id = p.id
-            LEFT JOIN pallet_packages pp ON pp.package_id = p.id
-            LEFT JOIN pallets pal ON pp.pallet_id = pal.id
+            LEFT JOIN pallets pal ON pal.id = p.pallet_id
             WHERE 1=1
         '''
         
@@ -206,6 +201,9 @@ class ExportWorker(QThread):
     
     def export_pallets(self):
         """导出托盘数据（参考用户提供的格式）"""
+        import pandas as pd
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, Alignment, PatternFill
         self.status_updated.emit("正在查询托盘数据...")
         
         conn = db.get_connection()
@@ -222,8 +220,7 @@ class ExportWorker(QThread):
                 COUNT(DISTINCT c.id) as component_count,
                 GROUP_CONCAT(DISTINCT o.customer_name) as customers
             FROM pallets pal
-            LEFT JOIN pallet_packages pp ON pp.pallet_id = pal.id
-            LEFT JOIN packages p ON p.id = pp.package_id
+            LEFT JOIN packages p ON p.pallet_id = pal.id
             LEFT JOIN components c ON c.package_id = p.id
             LEFT JOIN orders o ON p.order_id = o.id
             WHERE 1=1
@@ -275,8 +272,7 @@ class ExportWorker(QThread):
                 GROUP_CONCAT(c.component_name, '; ') as component_list,
                 p.created_at as package_created_at
             FROM pallets pal
-            JOIN pallet_packages pp ON pp.pallet_id = pal.id
-            JOIN packages p ON p.id = pp.package_id
+            JOIN packages p ON p.pallet_id = pal.id
             LEFT JOIN orders o ON p.order_id = o.id
             LEFT JOIN components c ON c.package_id = p.id
             WHERE 1=1
@@ -312,7 +308,7 @@ class ExportWorker(QThread):
             # 仅包含含有所选订单包裹的托盘的虚拟物品
             virtual_query = virtual_query.replace(
                 "WHERE 1=1",
-                "WHERE EXISTS (SELECT 1 FROM pallet_packages pp2 JOIN packages p2 ON p2.id = pp2.package_id LEFT JOIN orders o2 ON p2.order_id = o2.id WHERE pp2.pallet_id = pal.id AND o2.order_number = ?)"
+                "WHERE EXISTS (SELECT 1 FROM packages p2 JOIN orders o2 ON p2.order_id = o2.id WHERE p2.pallet_id = pal.id AND o2.order_number = ?)"
             )
             virtual_params.append(self.filters['order_number'])
         
@@ -402,6 +398,12 @@ class ExportWorker(QThread):
     
     def export_package_components(self):
         """导出包裹-板件明细（满足用户指定字段）"""
+        import pandas as pd
+        from io import BytesIO
+        from openpyxl import Workbook
+        from openpyxl.drawing.image import Image as XLImage
+        from openpyxl.styles import Font, Alignment, PatternFill
+        from qr_handler import QRCodeHandler
         self.status_updated.emit("正在查询包裹-板件明细...")
         conn = db.get_connection()
 
@@ -506,6 +508,12 @@ class ExportWorker(QThread):
 
     def export_pallet_package_components(self):
         """导出托盘-包裹-板件明细（可选导出托盘/包裹二维码）"""
+        import pandas as pd
+        from io import BytesIO
+        from openpyxl import Workbook
+        from openpyxl.drawing.image import Image as XLImage
+        from openpyxl.styles import Font, Alignment, PatternFill
+        from qr_handler import QRCodeHandler
         self.status_updated.emit("正在查询托盘-包裹-板件明细...")
         conn = db.get_connection()
 
@@ -675,6 +683,9 @@ class ExportWorker(QThread):
 
     def export_comprehensive(self):
         """导出综合数据"""
+        import pandas as pd
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, Alignment, PatternFill
         self.status_updated.emit("正在查询综合数据...")
         
         conn = db.get_connection()
@@ -702,8 +713,7 @@ class ExportWorker(QThread):
             FROM components c
             LEFT JOIN orders o ON c.order_id = o.id
             LEFT JOIN packages p ON c.package_id = p.id
-            LEFT JOIN pallet_packages pp ON pp.package_id = p.id
-            LEFT JOIN pallets pal ON pp.pallet_id = pal.id
+            LEFT JOIN pallets pal ON pal.id = p.pallet_id
             WHERE 1=1
         '''
         
@@ -1563,27 +1573,19 @@ class Reports(QWidget):
         total_orders = cursor.fetchone()[0]
         self.total_orders_label.setText(str(total_orders))
         
-        if self.selected_order_id:
-            cursor.execute("SELECT COUNT(*) FROM components WHERE order_id = ?", (self.selected_order_id,))
-        else:
-            cursor.execute("SELECT COUNT(*) FROM components")
-        total_components = cursor.fetchone()[0]
+        # 板件/包裹计数取触发器维护的订单汇总（未选订单时为全部订单合计）
+        order_stats = db.get_order_stats(self.selected_order_id)
+        total_components = order_stats['total_components']
         self.total_components_label.setText(str(total_components))
         
-        if self.selected_order_id:
-            cursor.execute("SELECT COUNT(*) FROM packages WHERE order_id = ?", (self.selected_order_id,))
-        else:
-            cursor.execute("SELECT COUNT(*) FROM packages")
-        total_packages = cursor.fetchone()[0]
+        total_packages = order_stats['total_packages']
         self.total_packages_label.setText(str(total_packages))
         
         if self.selected_order_id:
+            # 装有该订单包裹的托盘（触发器维护的 pallet_orders）
             cursor.execute('''
-                SELECT COUNT(DISTINCT pal.id)
-                FROM pallets pal
-                LEFT JOIN pallet_packages pp ON pp.pallet_id = pal.id
-                LEFT JOIN packages p ON pp.package_id = p.id
-                WHERE p.order_id = ?
+                SELECT COUNT(*) FROM pallet_orders
+                WHERE order_id = ? AND package_count > 0
             ''', (self.selected_order_id,))
         else:
             cursor.execute("SELECT COUNT(*) FROM pallets")
@@ -1592,19 +1594,11 @@ class Reports(QWidget):
         
         # 新增统计卡片数据
         # 已打包板件
-        if self.selected_order_id:
-            cursor.execute("SELECT COUNT(*) FROM components WHERE order_id = ? AND package_id IS NOT NULL", (self.selected_order_id,))
-        else:
-            cursor.execute("SELECT COUNT(*) FROM components WHERE package_id IS NOT NULL")
-        packaged_components = cursor.fetchone()[0]
+        packaged_components = order_stats['packaged_components']
         self.packaged_components_label.setText(str(packaged_components))
         
         # 未打包板件
-        if self.selected_order_id:
-            cursor.execute("SELECT COUNT(*) FROM components WHERE order_id = ? AND package_id IS NULL", (self.selected_order_id,))
-        else:
-            cursor.execute("SELECT COUNT(*) FROM components WHERE package_id IS NULL")
-        unpackaged_components = cursor.fetchone()[0]
+        unpackaged_components = max(0, total_components - packaged_components)
         self.unpackaged_components_label.setText(str(unpackaged_components))
         
         # 已封装包装
@@ -1618,11 +1612,9 @@ class Reports(QWidget):
         # 已封托托盘
         if self.selected_order_id:
             cursor.execute('''
-                SELECT COUNT(DISTINCT pal.id)
-                FROM pallets pal
-                LEFT JOIN pallet_packages pp ON pp.pallet_id = pal.id
-                LEFT JOIN packages p ON pp.package_id = p.id
-                WHERE p.order_id = ? AND pal.status = 'sealed'
+                SELECT COUNT(*) FROM pallet_orders po
+                JOIN pallets pal ON pal.id = po.pallet_id
+                WHERE po.order_id = ? AND po.package_count > 0 AND pal.status = 'sealed'
             ''', (self.selected_order_id,))
         else:
             cursor.execute("SELECT COUNT(*) FROM pallets WHERE status = 'sealed'")
@@ -1788,7 +1780,7 @@ class Reports(QWidget):
                 self.packages_table.setItem(i, j, QTableWidgetItem(text))
         
         # 托盘统计
-        # 使用 pallet_packages 作为托盘与包裹的关联来源；在选择订单时，仅显示与该订单相关的托盘
+        # 托盘与包裹的关联以 packages.pallet_id 为准；在选择订单时，仅显示与该订单相关的托盘
         params = []
         if self.selected_order_id:
             pallets_query = '''
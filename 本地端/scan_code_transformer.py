@@ -0,0 +1,223 @@
+"""
+扫码编码转换
+把 system_settings 中的 scan_config 一次性编译为转换函数（切片步骤列表），
+按配置内容缓存；配置未变化时每次扫码只执行预先确定的切片/拼接。
+
+执行顺序与原实现一致，组合配置为：去前缀 → 去后缀 → 插入字符 → 提取中间字符。
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+from database import db as default_db
+
+logger = logging.getLogger(__name__)
+
+_UNSET = object()
+
+# 处理方式（与扫码配置对话框中的单选按钮 ID 对应）
+PROCESS_NONE = 0
+PROCESS_REMOVE_PREFIX = 1
+PROCESS_REMOVE_SUFFIX = 2
+PROCESS_EXTRACT = 3
+PROCESS_INSERT = 4
+PROCESS_COMBO = 5
+
+DEFAULT_SCAN_CONFIG = {
+    'process_type': PROCESS_NONE,
+    'prefix_length': 1,
+    'suffix_length': 1,
+    'start_pos': 1,
+    'extract_length': 5,
+    'insert_position': 0,
+    'insert_content': '',
+    'combo_remove_prefix': False,
+    'combo_prefix_length': 1,
+    'combo_remove_suffix': False,
+    'combo_suffix_length': 1,
+    'combo_insert_chars': False,
+    'combo_insert_position': 0,
+    'combo_insert_content': '',
+    'combo_extract_middle': False,
+    'combo_start_pos': 1,
+    'combo_extract_length': 5,
+}
+
+
+def parse_scan_config(raw) -> dict:
+    """把设置值（JSON 字符串或字典）解析为完整配置，解析失败时返回默认配置"""
+    config = dict(DEFAULT_SCAN_CONFIG)
+    if isinstance(raw, dict):
+        config.update(raw)
+    elif raw and isinstance(raw, str):
+        try:
+            parsed = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            parsed = None
+        if isinstance(parsed, dict):
+            config.update(parsed)
+    return config
+
+
+def _remove_prefix(length):
+    def step(code):
+        return code[length:] if len(code) > length else ""
+    return step
+
+
+def _remove_suffix(length):
+    def step(code):
+        return code[:-length] if len(code) > length else ""
+    return step
+
+
+def _extract(start_pos, length):
+    start = start_pos - 1  # 转为0基索引
+    end = start + length
+
+    def step(code):
+        return code[start:end] if len(code) > start else ""
+    return step
+
+
+def _insert(position, content):
+    # 开头/末尾/中间三种情况都等价于按 position 切开后拼接
+    def step(code):
+        return code[:position] + content + code[position:]
+    return step
+
+
+def _identity(code):
+    return code
+
+
+def compile_scan_config(config) -> Callable[[str], str]:
+    """把配置（JSON 字符串或字典）编译为 code -> code 的转换函数"""
+    config = parse_scan_config(config)
+    process_type = int(config['process_type'])
+
+    if process_type == PROCESS_REMOVE_PREFIX:
+        steps = [_remove_prefix(int(config['prefix_length']))]
+    elif process_type == PROCESS_REMOVE_SUFFIX:
+        steps = [_remove_suffix(int(config['suffix_length']))]
+    elif process_type == PROCESS_EXTRACT:
+        steps = [_extract(int(config['start_pos']), int(config['extract_length']))]
+    elif process_type == PROCESS_INSERT:
+        steps = [_insert(int(config['insert_position']), str(config['insert_content'] or ''))]
+    elif process_type == PROCESS_COMBO:
+        steps = []
+        if config['combo_remove_prefix']:
+            steps.append(_remove_prefix(int(config['combo_prefix_length'])))
+        if config['combo_remove_suffix']:
+            steps.append(_remove_suffix(int(config['combo_suffix_length'])))
+        if config['combo_insert_chars']:
+            steps.append(_insert(int(config['combo_insert_position']),
+                                 str(config['combo_insert_content'] or '')))
+        if config['combo_extract_middle']:
+            steps.append(_extract(int(config['combo_start_pos']),
+                                  int(config['combo_extract_length'])))
+    else:
+        steps = []
+
+    if not steps:
+        return _identity
+    if len(steps) == 1:
+        return steps[0]
+
+    def transform(code):
+        for step in steps:
+            code = step(code)
+        return code
+    return transform
+
+
+class ScanCodeTransformer:
+    """按当前 scan_config 转换扫码内容，编译结果按配置内容缓存"""
+
+    SETTING_KEY = 'scan_config'
+
+    def __init__(self, database=None):
+        self.db = database or default_db
+        self._lock = threading.Lock()
+        self._raw = _UNSET  # 编译时的设置值，作为配置版本键
+        self._compiled: Callable[[str], str] = _identity
+        self.compile_count = 0
+
+    def compiled(self) -> Callable[[str], str]:
+        """当前配置对应的转换函数（设置值未变化时直接复用）"""
+        # 设置缓存未失效时返回同一个字符串对象，比较通常只是一次身份判断
+        raw = self.db.get_setting(self.SETTING_KEY, None)
+        with self._lock:
+            if raw is self._raw or raw == self._raw:
+                return self._compiled
+            try:
+                compiled = compile_scan_config(raw)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"扫码配置无效，按不处理执行: {e}")
+                compiled = _identity
+            self._raw = raw
+            self._compiled = compiled
+            self.compile_count += 1
+            return compiled
+
+    def transform(self, code: str) -> str:
+        return self.compiled()(code)
+
+    def transform_many(self, codes: Iterable[str]) -> List[str]:
+        """批量转换（导入、批量补扫），整批只取一次配置"""
+        transform = self.compiled()
+        return [transform(code) for code in codes]
+
+    def invalidate(self):
+        with self._lock:
+            self._raw = _UNSET
+
+
+# 全局扫码转换实例
+scan_code_transformer = ScanCodeTransformer()
+
+
+def benchmark(config: Optional[dict] = None, count: int = 100000) -> dict:
+    """微基准：比较逐码解析配置与编译后转换的单码耗时（微秒）"""
+    if config is None:
+        config = {
+            'process_type': PROCESS_COMBO,
+            'combo_remove_prefix': True, 'combo_prefix_length': 2,
+            'combo_remove_suffix': True, 'combo_suffix_length': 1,
+            'combo_extract_middle': True, 'combo_start_pos': 1, 'combo_extract_length': 8,
+        }
+    raw = json.dumps(config)
+    codes = [f"XX{i:010d}Z" for i in range(count)]
+
+    started = time.perf_counter()
+    for code in codes:
+        compile_scan_config(raw)(code)
+    per_code_parse = (time.perf_counter() - started) / count * 1e6
+
+    transform = compile_scan_config(raw)
+    started = time.perf_counter()
+    for code in codes:
+        transform(code)
+    per_code_compiled = (time.perf_counter() - started) / count * 1e6
+
+    started = time.perf_counter()
+    [transform(code) for code in codes]
+    per_code_batch = (time.perf_counter() - started) / count * 1e6
+
+    return {
+        'count': count,
+        'parse_each_us': round(per_code_parse, 3),
+        'compiled_us': round(per_code_compiled, 3),
+        'batch_us': round(per_code_batch, 3),
+    }
+
+
+if __name__ == '__main__':
+    result = benchmark()
+    print(f"转换 {result['count']} 个编码（单码耗时，微秒）:")
+    print(f"  每次解析配置: {result['parse_each_us']}")
+    print(f"  编译后转换:   {result['compiled_us']}")
+    print(f"  批量转换:     {result['batch_us']}")
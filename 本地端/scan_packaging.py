@@ -3,18 +3,23 @@ import json
 import re
 from datetime import datetime
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
-                             QPushButton, QTableWidget, QTableWidgetItem, QLabel,
+                             QPushButton, QTableWidget, QTableWidgetItem, QTableView, QLabel,
                              QLineEdit, QTextEdit, QComboBox, QMessageBox,
                              QDialog, QDialogButtonBox, QGroupBox, QCheckBox,
                              QSplitter, QHeaderView, QTabWidget, QSpinBox,
                              QButtonGroup, QRadioButton, QFrame, QMenu, QAction,
-                             QFileDialog, QApplication)
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+                             QFileDialog, QApplication, QStyledItemDelegate,
+                             QStyleOptionButton, QStyle)
+from PyQt5.QtCore import (Qt, QTimer, pyqtSignal, QAbstractTableModel, QModelIndex, QEvent,
+                          QSortFilterProxyModel)
 from PyQt5.QtGui import QFont, QPixmap, QPainter, QColor, QImage
-import numpy as np
-from qr_handler import QRCodeHandler
 from database import db
 from error_handling import ErrorHandler, undo_manager, Prompt
+from scan_service import scan_service, ScanStatus
+from scan_queue import ScanQueue
+from event_bus import event_bus, EventKind
+from write_dispatch import WriteSubmitter
+from scan_code_transformer import scan_code_transformer, compile_scan_config, parse_scan_config
 from order_management import OrderSelectionDialog
 try:
     from voice import speak as voice_speak
@@ -58,6 +63,7 @@ class QRPreviewDialog(QDialog):
         self.image_label.setPixmap(pixmap)
 
     def _pil_to_qpixmap(self, pil_image):
+        import numpy as np
         arr = np.array(pil_image.convert('RGB'))
         h, w, ch = arr.shape
         bytes_per_line = ch * w
@@ -305,54 +311,7 @@ class ScanConfigDialog(QDialog):
     
     def load_config(self):
         """加载配置"""
-        try:
-            config_str = db.get_setting('scan_config', None)
-            if config_str and isinstance(config_str, str):
-                import json
-                config = json.loads(config_str)
-            elif isinstance(config_str, dict):
-                config = config_str
-            else:
-                config = {
-                    'process_type': 0,
-                    'prefix_length': 1,
-                    'suffix_length': 1,
-                    'start_pos': 1,
-                    'extract_length': 5,
-                    'insert_position': 0,
-                    'insert_content': '',
-                    'combo_remove_prefix': False,
-                    'combo_prefix_length': 1,
-                    'combo_remove_suffix': False,
-                    'combo_suffix_length': 1,
-                    'combo_insert_chars': False,
-                    'combo_insert_position': 0,
-                    'combo_insert_content': '',
-                    'combo_extract_middle': False,
-                    'combo_start_pos': 1,
-                    'combo_extract_length': 5
-                }
-        except (json.JSONDecodeError, TypeError):
-            # 如果配置解析失败，使用默认配置
-            config = {
-                'process_type': 0,
-                'prefix_length': 1,
-                'suffix_length': 1,
-                'start_pos': 1,
-                'extract_length': 5,
-                'insert_position': 0,
-                'insert_content': '',
-                'combo_remove_prefix': False,
-                'combo_prefix_length': 1,
-                'combo_remove_suffix': False,
-                'combo_suffix_length': 1,
-                'combo_insert_chars': False,
-                'combo_insert_position': 0,
-                'combo_insert_content': '',
-                'combo_extract_middle': False,
-                'combo_start_pos': 1,
-                'combo_extract_length': 5
-            }
+        config = parse_scan_config(db.get_setting('scan_config', None))
         
         # 加载基本配置
         self.process_group.button(config.get('process_type', 0)).setChecked(True)
@@ -388,9 +347,9 @@ class ScanConfigDialog(QDialog):
         self.combo_start_spin.setEnabled(combo_extract_enabled)
         self.combo_length_spin.setEnabled(combo_extract_enabled)
     
-    def save_config(self):
-        """保存配置"""
-        config = {
+    def current_config(self):
+        """界面上当前的配置"""
+        return {
             'process_type': self.process_group.checkedId(),
             'prefix_length': self.prefix_length_spin.value(),
             'suffix_length': self.suffix_length_spin.value(),
@@ -409,6 +368,10 @@ class ScanConfigDialog(QDialog):
             'combo_start_pos': self.combo_start_spin.value(),
             'combo_extract_length': self.combo_length_spin.value()
         }
+    
+    def save_config(self):
+        """保存配置"""
+        config = self.current_config()
         
         db.set_setting('scan_config', config)
         self.accept()
@@ -424,68 +387,12 @@ class ScanConfigDialog(QDialog):
         self.test_result.setText(result)
     
     def process_scan_code(self, code):
-        """处理扫码"""
-        process_type = self.process_group.checkedId()
-        
-        if process_type == 0:  # 不处理
-            return code
-        elif process_type == 1:  # 去掉前缀
-            length = self.prefix_length_spin.value()
-            return code[length:] if len(code) > length else ""
-        elif process_type == 2:  # 去掉后缀
-            length = self.suffix_length_spin.value()
-            return code[:-length] if len(code) > length else ""
-        elif process_type == 3:  # 提取中间
-            start = self.start_pos_spin.value() - 1  # 转为0基索引
-            length = self.extract_length_spin.value()
-            return code[start:start+length] if len(code) > start else ""
-        elif process_type == 4:  # 插入字符
-            position = self.insert_position_spin.value()
-            content = self.insert_content_edit.text()
-            if position == 0:  # 插入到开头
-                return content + code
-            elif position >= len(code):  # 插入到末尾
-                return code + content
-            else:  # 插入到中间
-                return code[:position] + content + code[position:]
-        elif process_type == 5:  # 组合配置
-            result = code
-            
-            # 执行顺序：去前缀 → 去后缀 → 插入字符 → 提取中间字符
-            
-            # 1. 去掉前缀
-            if self.combo_remove_prefix_check.isChecked():
-                length = self.combo_prefix_spin.value()
-                result = result[length:] if len(result) > length else ""
-            
-            # 2. 去掉后缀
-            if self.combo_remove_suffix_check.isChecked():
-                length = self.combo_suffix_spin.value()
-                result = result[:-length] if len(result) > length else ""
-            
-            # 3. 插入字符
-            if self.combo_insert_check.isChecked():
-                position = self.combo_insert_pos_spin.value()
-                content = self.combo_insert_content_edit.text()
-                if position == 0:  # 插入到开头
-                    result = content + result
-                elif position >= len(result):  # 插入到末尾
-                    result = result + content
-                else:  # 插入到中间
-                    result = result[:position] + content + result[position:]
-            
-            # 4. 提取中间字符
-            if self.combo_extract_check.isChecked():
-                start = self.combo_start_spin.value() - 1  # 转为0基索引
-                length = self.combo_length_spin.value()
-                result = result[start:start+length] if len(result) > start else ""
-            
-            return result
-        
-        return code
-
-class PackageDialog(QDialog):
+        """按界面上当前的配置处理扫码（与实际扫码使用同一套转换逻辑）"""
+        return compile_scan_config(self.current_config())(code)
+
+class PackageDialog(WriteSubmitter, QDialog):
     """包装对话框"""
+    
     def __init__(self, package_data=None, parent=None, order_id=None):
         super().__init__(parent)
         self.package_data = package_data
@@ -823,108 +730,105 @@ class PackageDialog(QDialog):
         packing_method = pack_method_map.get(pack_type, 'mixed')
         remarks = self.remarks_edit.toPlainText()
         
-        try:
+        # 将pack_type和remarks合并到notes字段中
+        notes = f"打包方式: {pack_type}"
+        if remarks.strip():
+            notes += f"\n备注: {remarks}"
+        if has_manual_components:
+            notes += "\n包含手动添加的板件"
+        
+        # 如选择按房间/柜号分组，且有手动板件，校验一致性
+        if has_manual_components:
+            if packing_method == 'by_room':
+                rooms = set()
+                for row in range(self.components_table.rowCount()):
+                    room = self.components_table.item(row, 4).text() if self.components_table.item(row, 4) else ""
+                    if room:
+                        rooms.add(room.strip())
+                if len(rooms) > 1:
+                    QMessageBox.warning(self, "警告", f"按房间分组时，板件房间号需一致。当前房间号: {', '.join(sorted(rooms))}")
+                    try:
+                        voice_speak("房间号不一致，请检查")
+                    except Exception:
+                        pass
+                    return
+            elif packing_method == 'by_cabinet':
+                cabinets = set()
+                for row in range(self.components_table.rowCount()):
+                    cabinet = self.components_table.item(row, 5).text() if self.components_table.item(row, 5) else ""
+                    if cabinet:
+                        cabinets.add(cabinet.strip())
+                if len(cabinets) > 1:
+                    QMessageBox.warning(self, "警告", f"按柜号分组时，板件柜号需一致。当前柜号: {', '.join(sorted(cabinets))}")
+                    try:
+                        voice_speak("柜号不一致，请检查")
+                    except Exception:
+                        pass
+                    return
+        
+        # 手动添加的板件（在界面线程取出表格内容，写入交给写线程）
+        manual_components = []
+        for row in range(self.components_table.rowCount()):
+            manual_components.append(tuple(
+                self.components_table.item(row, column).text() if self.components_table.item(row, column) else ""
+                for column in range(6)
+            ))
+        
+        def insert_package(conn):
+            cursor = conn.cursor()
+            # 包装号与稳定包裹序号（每订单内填补缺口）在同一写事务内分配
             package_number = db.generate_package_number()
+            next_index = db.allocate_package_index(conn, order_id)
             
-            # 将pack_type和remarks合并到notes字段中
-            notes = f"打包方式: {pack_type}"
-            if remarks.strip():
-                notes += f"\n备注: {remarks}"
-            if has_manual_components:
-                notes += "\n包含手动添加的板件"
+            # 创建包装，保存稳定序号package_index；若有手动板件则标记为手动创建
+            cursor.execute('''
+                INSERT INTO packages (package_number, order_id, package_index, packing_method, notes, status, created_at, is_manual)
+                VALUES (?, ?, ?, ?, ?, 'open', CURRENT_TIMESTAMP, ?)
+            ''', (package_number, order_id, next_index, packing_method, notes, 1 if has_manual_components else 0))
             
-            conn = db.get_connection()
-            try:
-                cursor = conn.cursor()
-                
-                # 如选择按房间/柜号分组，且有手动板件，校验一致性
-                if has_manual_components:
-                    if packing_method == 'by_room':
-                        rooms = set()
-                        for row in range(self.components_table.rowCount()):
-                            room = self.components_table.item(row, 4).text() if self.components_table.item(row, 4) else ""
-                            if room:
-                                rooms.add(room.strip())
-                        if len(rooms) > 1:
-                            QMessageBox.warning(self, "警告", f"按房间分组时，板件房间号需一致。当前房间号: {', '.join(sorted(rooms))}")
-                            try:
-                                voice_speak("房间号不一致，请检查")
-                            except Exception:
-                                pass
-                            return
-                    elif packing_method == 'by_cabinet':
-                        cabinets = set()
-                        for row in range(self.components_table.rowCount()):
-                            cabinet = self.components_table.item(row, 5).text() if self.components_table.item(row, 5) else ""
-                            if cabinet:
-                                cabinets.add(cabinet.strip())
-                        if len(cabinets) > 1:
-                            QMessageBox.warning(self, "警告", f"按柜号分组时，板件柜号需一致。当前柜号: {', '.join(sorted(cabinets))}")
-                            try:
-                                voice_speak("柜号不一致，请检查")
-                            except Exception:
-                                pass
-                            return
-
-                # 计算稳定包裹序号（每订单内填补缺口）
-                try:
-                    next_index = db.get_next_package_index(order_id)
-                except Exception:
-                    next_index = None
-
-                # 创建包装，保存稳定序号package_index；若有手动板件则标记为手动创建
-                cursor.execute('''
-                    INSERT INTO packages (package_number, order_id, package_index, packing_method, notes, status, created_at, is_manual)
-                    VALUES (?, ?, ?, ?, ?, 'open', CURRENT_TIMESTAMP, ?)
-                ''', (package_number, order_id, next_index, packing_method, notes, 1 if has_manual_components else 0))
-                
-                package_id = cursor.lastrowid
-                
-                # 保存手动添加的板件
-                if has_manual_components:
-                    for row in range(self.components_table.rowCount()):
-                        component_name = self.components_table.item(row, 0).text() if self.components_table.item(row, 0) else ""
-                        material = self.components_table.item(row, 1).text() if self.components_table.item(row, 1) else ""
-                        size = self.components_table.item(row, 2).text() if self.components_table.item(row, 2) else ""
-                        code = self.components_table.item(row, 3).text() if self.components_table.item(row, 3) else ""
-                        room = self.components_table.item(row, 4).text() if self.components_table.item(row, 4) else ""
-                        cabinet = self.components_table.item(row, 5).text() if self.components_table.item(row, 5) else ""
-                        
-                        # 插入手动添加的板件
-                        cursor.execute('''
-                            INSERT INTO components 
-                            (order_id, component_name, material, finished_size, component_code, 
-                             room_number, cabinet_number, package_id, status)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'packed')
-                        ''', (order_id, component_name, material, size, code, room, cabinet, package_id))
-                
-                # 更新包装的板件数量
+            package_id = cursor.lastrowid
+            
+            # 保存手动添加的板件
+            for component_name, material, size, code, room, cabinet in manual_components:
                 cursor.execute('''
-                    UPDATE packages SET component_count = (
-                        SELECT COUNT(*) FROM components WHERE package_id = ?
-                    ) WHERE id = ?
-                ''', (package_id, package_id))
-                
-                conn.commit()
-                
-                # 记录操作日志
-                db.log_operation('create_package', {
-                    'package_number': package_number,
-                    'order_id': order_id,
-                    'pack_type': pack_type,
-                    'packing_method': packing_method,
-                    'is_manual': has_manual_components,
-                    'manual_component_count': self.components_table.rowCount() if has_manual_components else 0
-                })
-                
-                QMessageBox.information(self, "成功", f"包装 {package_number} 创建成功")
-                self.accept()
-                
-            finally:
-                conn.close()
+                    INSERT INTO components 
+                    (order_id, component_name, material, finished_size, component_code, 
+                     room_number, cabinet_number, package_id, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'packed')
+                ''', (order_id, component_name, material, size, code, room, cabinet, package_id))
             
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"创建包装失败：\n{str(e)}")
+            # 更新包装的板件数量
+            cursor.execute('''
+                UPDATE packages SET component_count = (
+                    SELECT COUNT(*) FROM components WHERE package_id = ?
+                ) WHERE id = ?
+            ''', (package_id, package_id))
+            
+            # 记录操作日志（与包装一起提交）
+            db.log_operation('create_package', {
+                'package_number': package_number,
+                'order_id': order_id,
+                'pack_type': pack_type,
+                'packing_method': packing_method,
+                'is_manual': has_manual_components,
+                'manual_component_count': len(manual_components)
+            }, conn=conn)
+            return package_number
+        
+        self.create_btn.setEnabled(False)
+        self.submit_write(insert_package, lambda future: self._on_package_created(future, has_manual_components))
+    
+    def _on_package_created(self, future, has_manual_components):
+        """新建包装写入完成（界面线程）"""
+        self.create_btn.setEnabled(True)
+        error = future.exception()
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"创建包装失败：\n{str(error)}")
+            return
+        if has_manual_components:
+            scan_service.invalidate_component_index()
+        QMessageBox.information(self, "成功", f"包装 {future.result()} 创建成功")
+        self.accept()
     
     def remove_component(self, row):
         """移除板件"""
@@ -972,24 +876,31 @@ class PackageDialog(QDialog):
         
         reply = QMessageBox.question(self, "确认", "确定要完成这个包装吗？完成后将无法继续添加板件。")
         if reply == QMessageBox.Yes:
-            try:
-                conn = db.get_connection()
-                cursor = conn.cursor()
-                cursor.execute('''
+            package_id = self.package_data['id']
+            
+            def update_package(conn):
+                conn.execute('''
                     UPDATE packages 
                     SET status = 'completed', completed_at = CURRENT_TIMESTAMP 
                     WHERE id = ?
-                ''', (self.package_data['id'],))
-                conn.commit()
-                conn.close()
-                
-                self.package_data['status'] = 'completed'
-                self.update_status_display()
-                
-                QMessageBox.information(self, "成功", "包装已完成！")
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"完成包装失败：\n{str(e)}")
+                ''', (package_id,))
+            
+            self.complete_btn.setEnabled(False)
+            self.submit_write(update_package, lambda future: self._on_status_saved(
+                future, 'completed', "包装已完成！", "完成包装失败"))
+    
+    def _on_status_saved(self, future, status, success_text, error_text):
+        """完成/重新打开包装写入完成（界面线程）"""
+        error = future.exception()
+        if error is not None:
+            self.update_status_display()
+            QMessageBox.critical(self, "错误", f"{error_text}：\n{str(error)}")
+            return
+        
+        self.package_data['status'] = status
+        self.update_status_display()
+        
+        QMessageBox.information(self, "成功", success_text)
     
     def reopen_package(self):
         """重新打开包装"""
@@ -998,26 +909,297 @@ class PackageDialog(QDialog):
         
         reply = QMessageBox.question(self, "确认", "确定要重新打开这个包装吗？")
         if reply == QMessageBox.Yes:
-            try:
-                conn = db.get_connection()
-                cursor = conn.cursor()
-                cursor.execute('''
+            package_id = self.package_data['id']
+            
+            def update_package(conn):
+                conn.execute('''
                     UPDATE packages 
                     SET status = 'open', completed_at = NULL 
                     WHERE id = ?
-                ''', (self.package_data['id'],))
-                conn.commit()
-                conn.close()
-                
-                self.package_data['status'] = 'open'
-                self.update_status_display()
-                
-                QMessageBox.information(self, "成功", "包装已重新打开！")
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"重新打开包装失败：\n{str(e)}")
+                ''', (package_id,))
+            
+            self.reopen_btn.setEnabled(False)
+            self.submit_write(update_package, lambda future: self._on_status_saved(
+                future, 'open', "包装已重新打开！", "重新打开包装失败"))
+
+class PackagesTableModel(QAbstractTableModel):
+    """活动包装列表模型
+
+    行数据按 package_id 建立索引，扫码/完成/解包/删除只更新对应的一行
+    （发出该行的 dataChanged），不再整表重建 QTableWidgetItem。
+    """
+
+    HEADERS = ['包装号', '订单号', '包裹序号', '板件数量', '创建时间', '状态']
+    COL_NUMBER, COL_ORDER, COL_INDEX, COL_COUNT, COL_CREATED, COL_STATUS = range(6)
+
+    STATUS_TEXT = {
+        'open': '进行中',
+        'completed': '已完成',
+        'sealed': '已封装'
+    }
+
+    # 手动创建且已完成：浅红色；普通已完成：浅绿色
+    MANUAL_COMPLETED_COLOR = QColor(255, 182, 193)
+    COMPLETED_COLOR = QColor(144, 238, 144)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []      # 每行一个 dict
+        self._row_of = {}    # package_id -> 行号
+
+    @staticmethod
+    def format_created_at(value):
+        """创建时间统一为 YYYY-MM-DD HH:mm:ss（加载时格式化一次）"""
+        try:
+            s = str(value).replace('T', ' ').replace('Z', '')
+            return datetime.fromisoformat(s).strftime('%Y-%m-%d %H:%M:%S')
+        except Exception:
+            return str(value)
+
+    @classmethod
+    def make_row(cls, package_id, package_number, order_number, package_index,
+                 component_count, created_at, status, is_manual):
+        return {
+            'id': package_id,
+            'package_number': package_number or '',
+            'order_number': order_number or '',
+            'package_index': package_index,
+            'component_count': component_count or 0,
+            'created_text': cls.format_created_at(created_at),
+            'status': status,
+            'is_manual': bool(is_manual),
+        }
+
+    # ---- Qt 模型接口 ----
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == self.COL_NUMBER:
+                return row['package_number']
+            if column == self.COL_ORDER:
+                return row['order_number']
+            if column == self.COL_INDEX:
+                return str(row['package_index'] or '')
+            if column == self.COL_COUNT:
+                return str(row['component_count'])
+            if column == self.COL_CREATED:
+                return row['created_text']
+            if column == self.COL_STATUS:
+                return self.STATUS_TEXT.get(row['status'], str(row['status']))
+        elif role == Qt.UserRole:
+            return row['id']
+        elif role == Qt.BackgroundRole and row['status'] == 'completed':
+            return self.MANUAL_COMPLETED_COLOR if row['is_manual'] else self.COMPLETED_COLOR
+        return None
+
+    # ---- 数据维护 ----
+    def set_packages(self, rows):
+        """整体替换（选择订单/新建包装时）"""
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._reindex()
+        self.endResetModel()
+
+    def _reindex(self):
+        self._row_of = {row['id']: i for i, row in enumerate(self._rows)}
+
+    def clear(self):
+        self.set_packages([])
+
+    def row_of(self, package_id):
+        return self._row_of.get(package_id, -1)
+
+    def package_id_at(self, row):
+        return self._rows[row]['id'] if 0 <= row < len(self._rows) else None
+
+    def package_number_at(self, row):
+        return self._rows[row]['package_number'] if 0 <= row < len(self._rows) else ''
+
+    def row_of_number(self, package_number):
+        for i, row in enumerate(self._rows):
+            if row['package_number'] == package_number:
+                return i
+        return -1
+
+    def package(self, package_id):
+        row = self.row_of(package_id)
+        return self._rows[row] if row >= 0 else None
+
+    def update_package(self, package_id, **fields):
+        """修改一个包装的字段，只通知该行变化；包装不在列表中返回 False"""
+        row = self.row_of(package_id)
+        if row < 0:
+            return False
+        self._rows[row].update(fields)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+        return True
+
+    def adjust_component_count(self, package_id, delta):
+        package = self.package(package_id)
+        if package is None:
+            return False
+        return self.update_package(package_id, component_count=max(0, package['component_count'] + delta))
+
+    def remove_package(self, package_id):
+        row = self.row_of(package_id)
+        if row < 0:
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        self._reindex()
+        self.endRemoveRows()
+        return True
+
+
+class ComponentsTableModel(QAbstractTableModel):
+    """板件列表模型（当前包装板件 / 待包板件）
+
+    每行是查询得到的元组，第一列为板件ID（不显示）。
+    行数据一次查询取回，视图按 FETCH_BATCH 分批取行（canFetchMore/fetchMore），
+    不再为每个单元格创建 QTableWidgetItem 或按钮控件。
+    """
+
+    FETCH_BATCH = 500
+
+    def __init__(self, headers, action_text=None, parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        # 最后一列为操作列时由 ActionButtonDelegate 绘制按钮
+        self.action_text = action_text
+        self.actions_enabled = True
+        self._rows = []
+        self._fetched = 0
+
+    @property
+    def action_column(self):
+        return len(self.headers) - 1 if self.action_text else -1
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
 
-class ScanPackaging(QWidget):
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == self.action_column:
+                return self.action_text
+            value = row[column + 1]  # 跳过ID
+            return str(value) if value else ''
+        if role == Qt.UserRole:
+            return row[0]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._fetched < len(self._rows)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.FETCH_BATCH, len(self._rows) - self._fetched)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+
+    def fetch_all(self):
+        """一次取出全部行（全选/筛选前调用）"""
+        if self._fetched >= len(self._rows):
+            return
+        self.beginInsertRows(QModelIndex(), self._fetched, len(self._rows) - 1)
+        self._fetched = len(self._rows)
+        self.endInsertRows()
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._fetched = min(self.FETCH_BATCH, len(self._rows))
+        self.endResetModel()
+
+    def clear(self):
+        self.set_rows([])
+
+    def total_rows(self):
+        """全部行数（含尚未取到视图中的行）"""
+        return len(self._rows)
+
+    def component_id_at(self, row):
+        return self._rows[row][0] if 0 <= row < len(self._rows) else None
+
+    def prepend_row(self, row):
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._rows.insert(0, tuple(row))
+        self._fetched += 1
+        self.endInsertRows()
+
+    def set_actions_enabled(self, enabled):
+        self.actions_enabled = bool(enabled)
+        if self._fetched and self.action_text:
+            column = self.action_column
+            self.dataChanged.emit(self.index(0, column), self.index(self._fetched - 1, column))
+
+
+class RowSetFilterProxyModel(QSortFilterProxyModel):
+    """按源模型行号集合筛选的代理模型（匹配在外部用预先计算的索引完成）"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._visible_rows = None  # None 表示不筛选
+
+    def set_visible_rows(self, rows):
+        self._visible_rows = None if rows is None else set(rows)
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self._visible_rows is None or source_row in self._visible_rows
+
+
+class ActionButtonDelegate(QStyledItemDelegate):
+    """在操作列绘制按钮（不创建控件），点击时发出 clicked(行号)"""
+
+    clicked = pyqtSignal(int)
+
+    def paint(self, painter, option, index):
+        model = index.model()
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data(Qt.DisplayRole) or ''
+        button.state = QStyle.State_Enabled if model.actions_enabled else QStyle.State_None
+        QApplication.style().drawControl(QStyle.CE_PushButton, button, painter)
+
+    def editorEvent(self, event, model, option, index):
+        if (event.type() == QEvent.MouseButtonRelease and model.actions_enabled
+                and option.rect.contains(event.pos())):
+            self.clicked.emit(index.row())
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+class ScanPackaging(WriteSubmitter, QWidget):
     """扫描打包模块"""
     
     # 信号
@@ -1030,10 +1212,17 @@ class ScanPackaging(QWidget):
         self.current_package_id = None
         self.current_order_id = None  # 初始化时没有选择订单
         self.current_package_status = None  # 当前包装状态
+        self.order_stats = None  # 当前订单统计缓存（扫码时增量更新）
         self.scan_timer = QTimer()
         self.scan_timer.timeout.connect(self.process_scan_input)
         self.scan_buffer = ""
         
+        # 扫码接收队列：界面线程只入队，工作线程按序判定入包，结果以信号回到界面
+        self.scan_queue = ScanQueue(parent=self)
+        self.scan_queue.scan_processed.connect(self.on_scan_processed)
+        self.scan_queue.scan_failed.connect(self.on_scan_failed)
+        self.scan_queue.finish_requested.connect(self.on_scan_finish_requested)
+        
         # 板件编码搜索防抖定时器
         self.component_search_timer = QTimer()
         self.component_search_timer.setSingleShot(True)
@@ -1121,17 +1310,16 @@ class ScanPackaging(QWidget):
         
         left_layout.addWidget(QLabel("活动包装"))
         
-        self.packages_table = QTableWidget()
-        self.packages_table.setColumnCount(6)
-        self.packages_table.setHorizontalHeaderLabels([
-            '包装号', '订单号', '包裹序号', '板件数量', '创建时间', '状态'
-        ])
+        self.packages_model = PackagesTableModel(self)
+        self.packages_table = QTableView()
+        self.packages_table.setModel(self.packages_model)
+        self.packages_table.verticalHeader().setDefaultSectionSize(24)
         self.packages_table.horizontalHeader().setStretchLastSection(True)
-        self.packages_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.packages_table.setSelectionMode(QTableWidget.SingleSelection)
+        self.packages_table.setSelectionBehavior(QTableView.SelectRows)
+        self.packages_table.setSelectionMode(QTableView.SingleSelection)
         self.packages_table.setAlternatingRowColors(True)
-        self.packages_table.setStyleSheet("QTableWidget::item:selected{background-color: rgba(255,224,130,0.7); color:black;}")
-        self.packages_table.itemSelectionChanged.connect(self.on_package_selected)
+        self.packages_table.setStyleSheet("QTableView::item:selected{background-color: rgba(255,224,130,0.7); color:black;}")
+        self.packages_table.selectionModel().selectionChanged.connect(lambda *_: self.on_package_selected())
         # 确保垂直滚动条始终可见
         self.packages_table.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         # 右键菜单：预览/保存二维码、复制包裹号
@@ -1217,11 +1405,16 @@ class ScanPackaging(QWidget):
         self.manual_scan_btn.clicked.connect(self.manual_scan)
         scan_input_layout.addWidget(self.manual_scan_btn)
         
+        # 扫码队列中尚未处理完的数量
+        self.scan_backlog_label = QLabel("待处理: 0")
+        self.scan_queue.backlog_changed.connect(self.update_scan_backlog)
+        scan_input_layout.addWidget(self.scan_backlog_label)
+        
         scan_layout.addLayout(scan_input_layout)
         
         # 完成包装按钮
         self.finish_package_btn = QPushButton("完成包装")
-        self.finish_package_btn.clicked.connect(self.finish_package)
+        self.finish_package_btn.clicked.connect(lambda: self.finish_package())
         self.finish_package_btn.setEnabled(False)
         scan_layout.addWidget(self.finish_package_btn)
         
@@ -1244,12 +1437,20 @@ class ScanPackaging(QWidget):
         components_group = QGroupBox("当前包装板件")
         components_layout = QVBoxLayout(components_group)
         
-        self.current_components_table = QTableWidget()
-        self.current_components_table.setColumnCount(8)
-        self.current_components_table.setHorizontalHeaderLabels([
-            '板件名', '材质', '板件编码', '房间号', '柜号', '板件尺寸', '扫描时间', '操作'
-        ])
+        self.current_components_model = ComponentsTableModel(
+            ['板件名', '材质', '板件编码', '房间号', '柜号', '板件尺寸', '扫描时间', '操作'],
+            action_text="移除", parent=self
+        )
+        self.current_components_table = QTableView()
+        self.current_components_table.setModel(self.current_components_model)
         self.current_components_table.horizontalHeader().setStretchLastSection(True)
+        self.remove_delegate = ActionButtonDelegate(self.current_components_table)
+        self.remove_delegate.clicked.connect(
+            lambda row: self.remove_component_from_package(self.current_components_model.component_id_at(row))
+        )
+        self.current_components_table.setItemDelegateForColumn(
+            self.current_components_model.action_column, self.remove_delegate
+        )
         components_layout.addWidget(self.current_components_table)
         
         right_layout.addWidget(components_group)
@@ -1280,6 +1481,8 @@ class ScanPackaging(QWidget):
                 self.current_order_label.setText(f"{selected_order['customer_name'] or '未知客户'}")
                 self.current_order_label.setStyleSheet("color: black; font-style: normal;")
                 self.new_package_btn.setEnabled(True)
+                # 加载该订单的编码索引，扫码判定优先走内存
+                scan_service.load_component_index(self.current_order_id)
                 # 重新加载包装列表
                 self.load_active_packages()
                 # 刷新订单统计
@@ -1292,66 +1495,76 @@ class ScanPackaging(QWidget):
     
     def delete_package(self):
         """删除选中的包裹"""
-        current_row = self.packages_table.currentRow()
+        current_row = self.selected_package_row()
         if current_row < 0:
             QMessageBox.warning(self, "警告", "请先选择要删除的包裹")
             return
         
-        package_number = self.packages_table.item(current_row, 0).text()
+        package_number = self.packages_model.package_number_at(current_row)
         
         reply = QMessageBox.question(self, "确认删除", 
                                    f"确定要删除包裹 {package_number} 吗？\n仅允许删除未封包且未入托的包裹。",
                                    QMessageBox.Yes | QMessageBox.No)
         
         if reply == QMessageBox.Yes:
-            try:
-                conn = db.get_connection()
-                cursor = conn.cursor()
-                
-                # 获取包裹ID
-                cursor.execute('SELECT id, status, pallet_id FROM packages WHERE package_number = ?', (package_number,))
-                package_result = cursor.fetchone()
+            order_id = self.current_order_id
+            
+            def remove_package(conn):
+                # 在写事务内校验，避免确认期间被其他工位封包或入托
+                package_result = conn.execute(
+                    'SELECT id, status, pallet_id FROM packages WHERE package_number = ?', (package_number,)
+                ).fetchone()
                 if not package_result:
-                    QMessageBox.warning(self, "错误", "找不到指定的包裹")
-                    return
+                    return None, "找不到指定的包裹"
                 
                 package_id, status, pallet_id = package_result
                 # 仅允许删除open状态且未入托的包裹
                 if pallet_id is not None:
-                    QMessageBox.warning(self, "警告", "包裹已在托盘中，不能删除")
-                    conn.close()
-                    return
+                    return package_id, "包裹已在托盘中，不能删除"
                 if status != 'open':
-                    QMessageBox.warning(self, "警告", "仅允许删除未封包的包裹")
-                    conn.close()
-                    return
+                    return package_id, "仅允许删除未封包的包裹"
                 
                 # 将包裹内的板件状态还原为未打包
-                cursor.execute('''
+                conn.execute('''
                     UPDATE components 
                     SET package_id = NULL, status = 'pending' 
                     WHERE package_id = ?
                 ''', (package_id,))
                 
                 # 删除包裹
-                cursor.execute('DELETE FROM packages WHERE id = ?', (package_id,))
-                
-                conn.commit()
-                conn.close()
-                
-                QMessageBox.information(self, "成功", f"包裹 {package_number} 已删除，板件已还原为未打包状态")
-                self.load_active_packages()
-                # 云端删除同步：包裹（受系统设置控制）
-                try:
-                    if package_number:
-                        from real_time_cloud_sync import get_sync_service
-                        svc = getattr(self, 'cloud_sync_service', None) or get_sync_service()
-                        svc.trigger_sync('delete_packages', {'items': [{'package_number': package_number}]}, force=True)
-                except Exception as e:
-                    print(f"触发云端删除包裹失败: {e}")
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"删除包裹失败：\n{str(e)}")
+                conn.execute('DELETE FROM packages WHERE id = ?', (package_id,))
+                return package_id, None
+            
+            self.delete_package_btn.setEnabled(False)
+            self.submit_write(remove_package, lambda future: self._on_package_deleted(future, package_number, order_id))
+    
+    def _on_package_deleted(self, future, package_number, order_id):
+        """删除包裹写入完成（界面线程）"""
+        self.delete_package_btn.setEnabled(self.current_package_id is not None)
+        error = future.exception()
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"删除包裹失败：\n{str(error)}")
+            return
+        package_id, rejected = future.result()
+        if rejected:
+            QMessageBox.warning(self, "警告", rejected)
+            return
+        scan_service.on_package_deleted(package_id)
+        
+        QMessageBox.information(self, "成功", f"包裹 {package_number} 已删除，板件已还原为未打包状态")
+        self.packages_model.remove_package(package_id)
+        self.update_order_stats()
+        event_bus.publish(EventKind.PACKAGE_DELETED, package_ids=[package_id],
+                          package_numbers=[package_number], order_ids=[order_id],
+                          source=self)
+        # 云端删除同步：包裹（受系统设置控制）
+        try:
+            if package_number:
+                from real_time_cloud_sync import get_sync_service
+                svc = getattr(self, 'cloud_sync_service', None) or get_sync_service()
+                svc.trigger_sync('delete_packages', {'items': [{'package_number': package_number}]}, force=True)
+        except Exception as e:
+            print(f"触发云端删除包裹失败: {e}")
     
     def perform_search(self):
         """执行查找操作，验证输入并执行相应的搜索"""
@@ -1379,7 +1592,7 @@ class ScanPackaging(QWidget):
         
         # 如果搜索框为空，显示所有包裹
         if not search_text:
-            for row in range(self.packages_table.rowCount()):
+            for row in range(self.packages_model.rowCount()):
                 self.packages_table.setRowHidden(row, False)
             self.packages_table.clearSelection()
             return
@@ -1387,17 +1600,15 @@ class ScanPackaging(QWidget):
         search_text = search_text.lower()
         found = False
         
-        for row in range(self.packages_table.rowCount()):
-            package_item = self.packages_table.item(row, 0)
-            if package_item:
-                package_number = package_item.text().lower()
-                match = search_text in package_number
-                self.packages_table.setRowHidden(row, not match)
-                
-                # 高亮显示匹配的行
-                if match:
-                    self.packages_table.selectRow(row)
-                    found = True
+        for row in range(self.packages_model.rowCount()):
+            package_number = self.packages_model.package_number_at(row).lower()
+            match = search_text in package_number
+            self.packages_table.setRowHidden(row, not match)
+            
+            # 高亮显示匹配的行
+            if match:
+                self.packages_table.selectRow(row)
+                found = True
     
     def search_component_by_code(self, search_text):
         """根据板件编码搜索包裹"""
@@ -1405,7 +1616,7 @@ class ScanPackaging(QWidget):
         
         # 如果搜索框为空，显示所有包裹
         if not search_text:
-            for row in range(self.packages_table.rowCount()):
+            for row in range(self.packages_model.rowCount()):
                 self.packages_table.setRowHidden(row, False)
             self.packages_table.clearSelection()
             return
@@ -1415,14 +1626,15 @@ class ScanPackaging(QWidget):
             return
         
         try:
+            condition, params = db.search_condition('components', search_text, 'c')
             conn = db.get_connection()
             cursor = conn.cursor()
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT p.package_number 
                 FROM components c
                 JOIN packages p ON c.package_id = p.id
-                WHERE c.component_code LIKE ?
-            ''', (f'%{search_text}%',))
+                WHERE {condition}
+            ''', params)
             
             result = cursor.fetchone()
             conn.close()
@@ -1430,32 +1642,30 @@ class ScanPackaging(QWidget):
             if result:
                 package_number = result[0]
                 # 先隐藏所有行
-                for row in range(self.packages_table.rowCount()):
+                for row in range(self.packages_model.rowCount()):
                     self.packages_table.setRowHidden(row, True)
                 
                 # 只显示包含该板件的包裹
                 found = False
-                for row in range(self.packages_table.rowCount()):
-                    package_item = self.packages_table.item(row, 0)
-                    if package_item and package_item.text() == package_number:
-                        self.packages_table.setRowHidden(row, False)
-                        self.packages_table.selectRow(row)
-                        found = True
-                        break
+                row = self.packages_model.row_of_number(package_number)
+                if row >= 0:
+                    self.packages_table.setRowHidden(row, False)
+                    self.packages_table.selectRow(row)
+                    found = True
                 
                 if not found:
                     # 如果没找到，显示所有行
-                    for row in range(self.packages_table.rowCount()):
+                    for row in range(self.packages_model.rowCount()):
                         self.packages_table.setRowHidden(row, False)
             else:
                 # 没找到时显示所有行
-                for row in range(self.packages_table.rowCount()):
+                for row in range(self.packages_model.rowCount()):
                     self.packages_table.setRowHidden(row, False)
                 
         except Exception as e:
             # 静默处理错误，不显示弹窗
             # 出错时显示所有行
-            for row in range(self.packages_table.rowCount()):
+            for row in range(self.packages_model.rowCount()):
                 self.packages_table.setRowHidden(row, False)
 
     def on_component_search_text_changed(self, text):
@@ -1472,16 +1682,14 @@ class ScanPackaging(QWidget):
         """搜索包裹号"""
         search_text = self.package_search.text().lower()
         
-        for row in range(self.packages_table.rowCount()):
-            package_item = self.packages_table.item(row, 0)
-            if package_item:
-                package_number = package_item.text().lower()
-                match = search_text == "" or search_text in package_number
-                self.packages_table.setRowHidden(row, not match)
-                
-                # 高亮显示匹配的行
-                if match and search_text != "":
-                    self.packages_table.selectRow(row)
+        for row in range(self.packages_model.rowCount()):
+            package_number = self.packages_model.package_number_at(row).lower()
+            match = search_text == "" or search_text in package_number
+            self.packages_table.setRowHidden(row, not match)
+            
+            # 高亮显示匹配的行
+            if match and search_text != "":
+                self.packages_table.selectRow(row)
     
     def search_component(self):
         """搜索板件编码，找出所在包裹"""
@@ -1489,19 +1697,20 @@ class ScanPackaging(QWidget):
         
         if not search_text:
             # 清空搜索时显示所有包裹
-            for row in range(self.packages_table.rowCount()):
+            for row in range(self.packages_model.rowCount()):
                 self.packages_table.setRowHidden(row, False)
             return
         
         try:
+            condition, params = db.search_condition('components', search_text, 'c')
             conn = db.get_connection()
             cursor = conn.cursor()
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT p.package_number 
                 FROM components c
                 JOIN packages p ON c.package_id = p.id
-                WHERE c.component_code LIKE ?
-            ''', (f'%{search_text}%',))
+                WHERE {condition}
+            ''', params)
             
             result = cursor.fetchone()
             conn.close()
@@ -1509,13 +1718,11 @@ class ScanPackaging(QWidget):
             if result:
                 package_number = result[0]
                 # 高亮显示包含该板件的包裹
-                for row in range(self.packages_table.rowCount()):
-                    package_item = self.packages_table.item(row, 0)
-                    if package_item and package_item.text() == package_number:
-                        self.packages_table.selectRow(row)
-                        self.packages_table.setRowHidden(row, False)
-                        QMessageBox.information(self, "找到板件", f"板件 {search_text} 在包裹 {package_number} 中")
-                        break
+                row = self.packages_model.row_of_number(package_number)
+                if row >= 0:
+                    self.packages_table.selectRow(row)
+                    self.packages_table.setRowHidden(row, False)
+                    QMessageBox.information(self, "找到板件", f"板件 {search_text} 在包裹 {package_number} 中")
             else:
                 QMessageBox.information(self, "未找到", f"未找到包含板件编码 {search_text} 的包裹")
                 
@@ -1529,17 +1736,17 @@ class ScanPackaging(QWidget):
         self.component_search.clear()
         
         # 显示所有行
-        for row in range(self.packages_table.rowCount()):
+        for row in range(self.packages_model.rowCount()):
             self.packages_table.setRowHidden(row, False)
         
         # 清除选择
         self.packages_table.clearSelection()
     
     def load_active_packages(self):
-        """加载活动包装列表"""
+        """加载活动包装列表（整体加载，扫码等单行变化走 packages_model 的增量更新）"""
         # 如果没有选择订单，清空表格
         if not hasattr(self, 'current_order_id') or not self.current_order_id:
-            self.packages_table.setRowCount(0)
+            self.packages_model.clear()
             return
         
         conn = db.get_connection()
@@ -1558,48 +1765,40 @@ class ScanPackaging(QWidget):
         packages = cursor.fetchall()
         conn.close()
         
-        self.packages_table.setRowCount(len(packages))
-        for i, package in enumerate(packages):
-            self.packages_table.setItem(i, 0, QTableWidgetItem(package[1]))  # package_number
-            self.packages_table.setItem(i, 1, QTableWidgetItem(package[2] or ''))  # order_number
-            # 显示包裹序号
-            self.packages_table.setItem(i, 2, QTableWidgetItem(str(package[3] or '')))  # package_index
-            self.packages_table.setItem(i, 3, QTableWidgetItem(str(package[4])))  # component_count
-            # 创建时间统一为 YYYY-MM-DD HH:mm:ss
-            created_text = package[5]
-            try:
-                s = str(created_text)
-                s = s.replace('T', ' ').replace('Z', '')
-                dt = datetime.fromisoformat(s)
-                created_text = dt.strftime('%Y-%m-%d %H:%M:%S')
-            except Exception:
-                created_text = str(created_text)
-            self.packages_table.setItem(i, 4, QTableWidgetItem(created_text))  # created_at
-            # 状态改为中文显示
-            status_map = {
-                'open': '进行中',
-                'completed': '已完成',
-                'sealed': '已封装'
-            }
-            status_text = status_map.get(package[6], str(package[6]))
-            self.packages_table.setItem(i, 5, QTableWidgetItem(status_text))  # status
-            
-            # 存储包装ID
-            self.packages_table.item(i, 0).setData(Qt.UserRole, package[0])
+        self.packages_model.set_packages(PackagesTableModel.make_row(*package) for package in packages)
 
         # 刷新右侧订单统计
         self.update_order_stats()
 
+    def on_domain_event(self, event):
+        """其他页面的变更：入托/移出托盘只更新相关包装的状态，其余整表重载"""
+        if event.kind in (EventKind.PACKAGE_PALLETIZED, EventKind.PACKAGE_UNPALLETIZED):
+            if not event.package_ids and not event.package_numbers:
+                return False
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, status FROM packages
+                WHERE id IN (SELECT value FROM json_each(?))
+                   OR package_number IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(list(event.package_ids)), json.dumps(list(event.package_numbers))))
+            rows = cursor.fetchall()
+            conn.close()
+            for package_id, status in rows:
+                self.packages_model.update_package(package_id, status=status)
+            return True
+        if event.kind == EventKind.COMPONENTS_DELETED and event.component_ids:
+            # 只删除了待包板件：包装列表不变，刷新订单统计
+            self.update_order_stats()
+            return True
+        return False
+
     def on_packages_context_menu(self, pos):
         # 根据点击位置确定行
-        item = self.packages_table.itemAt(pos)
-        if not item:
-            return
-        row = item.row()
-        pkg_item = self.packages_table.item(row, 0)
-        if not pkg_item:
+        index = self.packages_table.indexAt(pos)
+        if not index.isValid():
             return
-        package_number = pkg_item.text()
+        package_number = self.packages_model.package_number_at(index.row())
 
         menu = QMenu(self)
         act_preview = QAction("预览包裹二维码", self)
@@ -1619,7 +1818,8 @@ class ScanPackaging(QWidget):
                 QApplication.clipboard().setText(package_number)
                 return
 
-            # 生成二维码图片
+            # 生成二维码图片（二维码/图像库较重，用到时才导入）
+            from qr_handler import QRCodeHandler
             handler = QRCodeHandler()
             pil_img = handler.create_qr_code_with_text(package_number)
 
@@ -1633,30 +1833,12 @@ class ScanPackaging(QWidget):
                     pil_img.save(fname, format='PNG')
         except Exception as e:
             QMessageBox.critical(self, "错误", f"操作失败：\n{str(e)}")
-            # 设置背景色
-            is_manual = package[7] if len(package) > 7 else 0  # is_manual字段
-            status = package[6]  # status字段
-            
-            if is_manual and status == 'completed':
-                # 手动创建且已完成的包装设置浅红色背景
-                light_red = QColor(255, 182, 193)  # 浅红色
-                for j in range(6):  # 为所有列设置背景色
-                    if self.packages_table.item(i, j):
-                        self.packages_table.item(i, j).setBackground(light_red)
-            elif status == 'completed':
-                # 普通已完成的包装设置浅绿色背景
-                light_green = QColor(144, 238, 144)  # 浅绿色
-                for j in range(6):  # 为所有列设置背景色
-                    if self.packages_table.item(i, j):
-                        self.packages_table.item(i, j).setBackground(light_green)
-
-        # 更新右侧订单统计
-        self.update_order_stats()
 
     def update_order_stats(self):
         """更新右侧订单统计信息"""
         try:
             if not getattr(self, 'current_order_id', None):
+                self.order_stats = None
                 for lbl in [
                     self.stats_total_components_label,
                     self.stats_packaged_components_label,
@@ -1669,52 +1851,49 @@ class ScanPackaging(QWidget):
                     lbl.setText('-')
                 return
 
-            conn = db.get_connection()
-            cur = conn.cursor()
-
-            # 总板件数、已包装板件数
-            cur.execute('SELECT COUNT(*) FROM components WHERE order_id = ?', (self.current_order_id,))
-            total_components = cur.fetchone()[0] or 0
-            cur.execute('SELECT COUNT(*) FROM components WHERE order_id = ? AND package_id IS NOT NULL', (self.current_order_id,))
-            packaged_components = cur.fetchone()[0] or 0
-            unpacked_components = max(0, total_components - packaged_components)
-
-            # 包裹统计
-            cur.execute('SELECT COUNT(*) FROM packages WHERE order_id = ?', (self.current_order_id,))
-            total_packages = cur.fetchone()[0] or 0
-            cur.execute('SELECT COUNT(*) FROM packages WHERE order_id = ? AND is_manual = 1', (self.current_order_id,))
-            manual_packages = cur.fetchone()[0] or 0
-            cur.execute('SELECT COALESCE(SUM(component_count), 0) FROM packages WHERE order_id = ? AND is_manual = 1', (self.current_order_id,))
-            manual_components_total = cur.fetchone()[0] or 0
-
-            conn.close()
-
-            # 进度
-            progress_pct = (packaged_components / total_components * 100) if total_components else 0
-            progress_text = f"{packaged_components}/{total_components}（{progress_pct:.1f}%）"
-
-            # 写入标签
-            self.stats_total_components_label.setText(str(total_components))
-            self.stats_packaged_components_label.setText(str(packaged_components))
-            self.stats_unpacked_label.setText(str(unpacked_components))
-            self.stats_total_packages_label.setText(str(total_packages))
-            self.stats_manual_packages_label.setText(str(manual_packages))
-            self.stats_manual_components_label.setText(str(manual_components_total))
-            self.stats_progress_label.setText(progress_text)
+            # 触发器维护的汇总计数，一次主键查询；扫码时按增量修改后直接重绘
+            self.order_stats = db.get_order_stats(self.current_order_id)
+            self.render_order_stats(self.order_stats)
         except Exception:
             # 出错时保持静默，不影响主界面
             pass
+
+    def render_order_stats(self, stats):
+        """把订单统计写入右侧标签"""
+        total_components = stats['total_components']
+        packaged_components = stats['packaged_components']
+        unpacked_components = max(0, total_components - packaged_components)
+
+        # 进度
+        progress_pct = (packaged_components / total_components * 100) if total_components else 0
+        progress_text = f"{packaged_components}/{total_components}（{progress_pct:.1f}%）"
+
+        # 写入标签
+        self.stats_total_components_label.setText(str(total_components))
+        self.stats_packaged_components_label.setText(str(packaged_components))
+        self.stats_unpacked_label.setText(str(unpacked_components))
+        self.stats_total_packages_label.setText(str(stats['total_packages']))
+        self.stats_manual_packages_label.setText(str(stats['manual_packages']))
+        self.stats_manual_components_label.setText(str(stats['manual_components_total']))
+        self.stats_progress_label.setText(progress_text)
+    
+    def selected_package_row(self):
+        """包装列表中选中的行（未选中返回 -1）"""
+        rows = self.packages_table.selectionModel().selectedRows()
+        return rows[0].row() if rows else -1
     
     def on_package_selected(self):
         """包装选择事件"""
-        current_row = self.packages_table.currentRow()
+        current_row = self.selected_package_row()
         if current_row >= 0:
-            package_id = self.packages_table.item(current_row, 0).data(Qt.UserRole)
+            package_id = self.packages_model.package_id_at(current_row)
             self.select_package(package_id)
     
     def select_package(self, package_id):
         """选择包装"""
         self.current_package_id = package_id
+        # 重新选择时丢弃旧的规则状态，首次扫码时按数据库重建
+        scan_service.invalidate_package(package_id)
         
         # 加载包装信息
         conn = db.get_connection()
@@ -1770,7 +1949,7 @@ class ScanPackaging(QWidget):
     def load_current_package_components(self):
         """加载当前包装的板件"""
         if not self.current_package_id:
-            self.current_components_table.setRowCount(0)
+            self.current_components_model.clear()
             self.current_count_label.setText("0")
             # 重置打包方式显示
             if hasattr(self, 'current_packing_method_label'):
@@ -1789,18 +1968,10 @@ class ScanPackaging(QWidget):
         components = cursor.fetchall()
         conn.close()
         
-        self.current_components_table.setRowCount(len(components))
-        for i, component in enumerate(components):
-            for j, value in enumerate(component[1:]):  # 跳过ID
-                self.current_components_table.setItem(i, j, QTableWidgetItem(str(value) if value else ''))
-            
-            # 添加移除按钮
-            remove_btn = QPushButton("移除")
-            remove_btn.clicked.connect(lambda checked, comp_id=component[0]: self.remove_component_from_package(comp_id))
-            # 根据包装状态控制移除按钮是否启用
-            if hasattr(self, 'current_package_status'):
-                remove_btn.setEnabled(self.current_package_status == 'open')
-            self.current_components_table.setCellWidget(i, 7, remove_btn)
+        # 根据包装状态控制移除按钮是否可用
+        if hasattr(self, 'current_package_status'):
+            self.current_components_model.actions_enabled = self.current_package_status == 'open'
+        self.current_components_model.set_rows(components)
         
         self.current_count_label.setText(str(len(components)))
     
@@ -1814,6 +1985,7 @@ class ScanPackaging(QWidget):
         if dialog.exec_() == QDialog.Accepted:
             self.load_active_packages()
             self.update_order_stats()
+            event_bus.publish(EventKind.PACKAGE_CREATED, order_ids=[self.current_order_id], source=self)
     
     def scan_config(self):
         """扫码配置"""
@@ -1828,16 +2000,19 @@ class ScanPackaging(QWidget):
             self.scan_input.clear()
     
     def process_scan_code(self, raw_code):
-        """处理扫描码"""
-        if not self.current_package_id:
+        """处理扫描码：入队后立即返回，由扫码队列按扫码顺序判定入包"""
+        # 排在完成码之后的扫码属于完成后新建的包装
+        finish_pending = self.scan_queue.has_pending_finish()
+        if not self.current_package_id and not finish_pending:
             QMessageBox.warning(self, "警告", "请先选择一个包装")
             return
+        if not finish_pending:
+            self.scan_queue.set_package(self.current_package_id)
         
         # 检查是否是通用完成码
         universal_code = db.get_setting('universal_finish_code', 'FINISH')
         if raw_code == universal_code:
-            self.finish_package()
-            self.new_package()
+            self.scan_queue.enqueue_finish(raw_code)
             return
         
         # 处理扫描码
@@ -1848,202 +2023,113 @@ class ScanPackaging(QWidget):
         history_text = f"[{timestamp}] {raw_code} -> {processed_code}\n"
         self.scan_history.append(history_text)
         
-        # 查找板件
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, component_name, material, component_code, room_number, cabinet_number
-            FROM components 
-            WHERE component_code = ? AND status = 'pending'
-        ''', (processed_code,))
-        component = cursor.fetchone()
-        
-        if not component:
+        self.scan_queue.enqueue(raw_code, processed_code)
+    
+    def update_scan_backlog(self, backlog):
+        """刷新扫码队列积压数量"""
+        self.scan_backlog_label.setText(f"待处理: {backlog}")
+    
+    def on_scan_finish_requested(self, job):
+        """完成码之前的扫码已全部处理：完成当前包装并新建包装，然后继续处理队列"""
+        submitted = False
+        try:
+            # 完成包装在写线程执行，写入结束后再新建包装并继续
+            submitted = self.finish_package(then=self._resume_after_finish)
+        finally:
+            if not submitted:
+                self._resume_after_finish()
+    
+    def _resume_after_finish(self):
+        """完成码处理的后半段：新建包装，然后恢复扫码队列"""
+        try:
+            self.new_package()
+        finally:
+            self.scan_queue.set_package(self.current_package_id)
+            self.scan_queue.resume()
+    
+    def on_scan_failed(self, job, message):
+        """扫码处理出错（该扫码未入包）"""
+        QMessageBox.critical(self, "错误", f"添加板件失败：{job.code}\n{message}")
+    
+    def on_scan_processed(self, job, result):
+        """扫码队列按顺序回报的判定结果"""
+        processed_code = job.code
+        if result.status == ScanStatus.NOT_FOUND:
             # 使用异常处理器处理无效扫描
             ErrorHandler.handle_invalid_scan(processed_code)
             return
-        
-        component_id = component[0]
-        component_room = component[4]
-        component_cabinet = component[5]
-        
-        # 检查是否已经在包装中
-        cursor.execute('''
-            SELECT p.package_number FROM components c
-            JOIN packages p ON c.package_id = p.id
-            WHERE c.id = ? AND c.package_id IS NOT NULL
-        ''', (component_id,))
-        existing = cursor.fetchone()
-        
-        if existing:
+        if result.status == ScanStatus.DUPLICATE:
             # 使用异常处理器处理重复扫描
-            ErrorHandler.handle_duplicate_scan(processed_code, existing[0])
+            ErrorHandler.handle_duplicate_scan(processed_code, result.existing_package_number or '')
             return
-        
-        # 校验当前包装的打包规则（房间/柜号一致性）
-        try:
-            cursor.execute('SELECT packing_method FROM packages WHERE id = ?', (self.current_package_id,))
-            pm_row = cursor.fetchone()
-            current_pm = pm_row[0] if pm_row else 'mixed'
-            if current_pm == 'by_room':
-                cursor.execute('SELECT DISTINCT room_number FROM components WHERE package_id = ?', (self.current_package_id,))
-                rooms = [r[0] for r in cursor.fetchall() if r and r[0]]
-                if rooms:
-                    base_room = rooms[0]
-                    if component_room and component_room != base_room:
-                        QMessageBox.warning(self, "警告", f"当前包装为按房间分组，房间号不一致：{base_room} vs {component_room}")
-                        try:
-                            voice_speak("房间号不一致，请检查")
-                        except Exception:
-                            pass
-                        return
-            elif current_pm == 'by_cabinet':
-                # 同时校验房间号与柜号一致性
-                # 先校验房间号一致
-                cursor.execute('SELECT DISTINCT room_number FROM components WHERE package_id = ?', (self.current_package_id,))
-                rooms = [r[0] for r in cursor.fetchall() if r and r[0]]
-                if rooms:
-                    base_room = rooms[0]
-                    if component_room and component_room != base_room:
-                        QMessageBox.warning(self, "警告", f"当前包装为按柜号分组，房间号不一致：{base_room} vs {component_room}")
-                        try:
-                            voice_speak("房间号不一致，请检查")
-                        except Exception:
-                            pass
-                        return
-                # 再校验柜号一致
-                cursor.execute('SELECT DISTINCT cabinet_number FROM components WHERE package_id = ?', (self.current_package_id,))
-                cabinets = [c[0] for c in cursor.fetchall() if c and c[0]]
-                if cabinets:
-                    base_cabinet = cabinets[0]
-                    if component_cabinet and component_cabinet != base_cabinet:
-                        QMessageBox.warning(self, "警告", f"当前包装为按柜号分组，柜号不一致：{base_cabinet} vs {component_cabinet}")
-                        try:
-                            voice_speak("柜号不一致，请检查")
-                        except Exception:
-                            pass
-                        return
-        except Exception:
-            # 规则校验出错时，不阻塞；仅继续执行
-            pass
-        
-        # 添加到当前包装
-        try:
-            # 更新板件状态
-            cursor.execute('''
-                UPDATE components 
-                SET package_id = ?, scanned_at = CURRENT_TIMESTAMP, status = 'packed' 
-                WHERE id = ?
-            ''', (self.current_package_id, component_id))
-            
-            conn.commit()
-            
-            # 记录撤销操作
-            undo_manager.add_operation('scan_component', 
-                                     {'component_id': component_id},
-                                     f"扫描板件: {processed_code}")
-            
-            # 记录操作日志
-            db.log_operation('scan_component', 
-                           f"扫描板件 {processed_code} 到包装 {self.current_package_id}")
-            
-            # 刷新界面
-            self.load_current_package_components()
-            self.load_active_packages()
-            self.update_order_stats()
-            
-            # 语音提醒：板件加入包装成功
+        if result.status == ScanStatus.PACKAGE_CLOSED:
+            QMessageBox.warning(self, "警告", "当前包装已不是进行中状态，无法继续扫描")
+            return
+        if result.status in (ScanStatus.ROOM_MISMATCH, ScanStatus.CABINET_MISMATCH):
+            group_text = "按房间分组" if result.packing_method == 'by_room' else "按柜号分组"
+            if result.status == ScanStatus.ROOM_MISMATCH:
+                QMessageBox.warning(self, "警告", f"当前包装为{group_text}，房间号不一致：{result.expected_value} vs {result.room_number}")
+                voice_text = "房间号不一致，请检查"
+            else:
+                QMessageBox.warning(self, "警告", f"当前包装为{group_text}，柜号不一致：{result.expected_value} vs {result.cabinet_number}")
+                voice_text = "柜号不一致，请检查"
             try:
-                voice_speak(f"板件加入包装成功。编码 {processed_code}")
+                voice_speak(voice_text)
             except Exception:
                 pass
+            return
 
-            # 发送信号
-            self.component_scanned.emit({
-                'component_id': component_id,
-                'component_code': processed_code,
-                'component_name': component[1]
-                })
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"添加板件失败：\n{str(e)}")
-        
-        conn.close()
+        # 记录撤销操作
+        undo_manager.add_operation('scan_component',
+                                 {'component_id': result.component_id},
+                                 f"扫描板件: {processed_code}")
+
+        # 只更新受影响的行：当前包装板件列表、包装列表中的该包装、订单统计
+        self.apply_scan_delta(result)
+
+        # 语音提醒：板件加入包装成功
+        try:
+            voice_speak(f"板件加入包装成功。编码 {processed_code}")
+        except Exception:
+            pass
+
+        # 发送信号
+        self.component_scanned.emit({
+            'component_id': result.component_id,
+            'component_code': processed_code,
+            'component_name': result.component_name
+            })
+        # 扫码异步完成，当前订单可能已切换：以板件所属订单为准
+        event_bus.publish(EventKind.COMPONENT_PACKED, component_ids=[result.component_id],
+                          package_ids=[result.package_id], order_ids=[result.order_id],
+                          source=self)
+
+    def apply_scan_delta(self, result):
+        """按扫码结果局部刷新界面，避免整表重载"""
+        # 当前包装板件列表：在顶部插入一行（队列处理期间可能已切换到其他包装）
+        if result.package_id == self.current_package_id:
+            self.current_components_model.prepend_row((
+                result.component_id, result.component_name, result.material, result.code,
+                result.room_number, result.cabinet_number, result.finished_size, result.updated_at
+            ))
+            self.current_count_label.setText(str(result.package_component_count))
+
+        # 包装列表：只改该包装的板件数量
+        self.packages_model.update_package(result.package_id, component_count=result.package_component_count)
+
+        # 订单统计：已包装 +1（仅限当前显示的订单；扫码异步完成时可能已切换订单，或板件属于其他订单）
+        if result.order_id != self.current_order_id:
+            return
+        stats = getattr(self, 'order_stats', None)
+        if stats:
+            stats['packaged_components'] += 1
+            self.render_order_stats(stats)
+        else:
+            self.update_order_stats()
     
     def apply_scan_config(self, code):
-        """应用扫描配置"""
-        try:
-            config_str = db.get_setting('scan_config', None)
-            if config_str and isinstance(config_str, str):
-                import json
-                config = json.loads(config_str)
-            elif isinstance(config_str, dict):
-                config = config_str
-            else:
-                config = {'process_type': 0}
-            
-            process_type = config.get('process_type', 0)
-        except (json.JSONDecodeError, TypeError):
-            # 如果配置解析失败，使用默认配置
-            config = {'process_type': 0}
-            process_type = 0
-        
-        if process_type == 0:  # 不处理
-            return code
-        elif process_type == 1:  # 去掉前缀
-            length = config.get('prefix_length', 1)
-            return code[length:] if len(code) > length else ""
-        elif process_type == 2:  # 去掉后缀
-            length = config.get('suffix_length', 1)
-            return code[:-length] if len(code) > length else ""
-        elif process_type == 3:  # 提取中间
-            start = config.get('start_pos', 1) - 1  # 转为0基索引
-            length = config.get('extract_length', 5)
-            return code[start:start+length] if len(code) > start else ""
-        elif process_type == 4:  # 插入字符
-            position = config.get('insert_position', 0)
-            content = config.get('insert_content', '')
-            if position == 0:  # 插入到开头
-                return content + code
-            elif position >= len(code):  # 插入到末尾
-                return code + content
-            else:  # 插入到中间
-                return code[:position] + content + code[position:]
-        elif process_type == 5:  # 组合配置
-            result = code
-            
-            # 执行顺序：去前缀 → 去后缀 → 插入字符 → 提取中间字符
-            
-            # 1. 去掉前缀
-            if config.get('combo_remove_prefix', False):
-                length = config.get('combo_prefix_length', 1)
-                result = result[length:] if len(result) > length else ""
-            
-            # 2. 去掉后缀
-            if config.get('combo_remove_suffix', False):
-                length = config.get('combo_suffix_length', 1)
-                result = result[:-length] if len(result) > length else ""
-            
-            # 3. 插入字符
-            if config.get('combo_insert_chars', False):
-                position = config.get('combo_insert_position', 0)
-                content = config.get('combo_insert_content', '')
-                if position == 0:  # 插入到开头
-                    result = content + result
-                elif position >= len(result):  # 插入到末尾
-                    result = result + content
-                else:  # 插入到中间
-                    result = result[:position] + content + result[position:]
-            
-            # 4. 提取中间字符
-            if config.get('combo_extract_middle', False):
-                start = config.get('combo_start_pos', 1) - 1  # 转为0基索引
-                length = config.get('combo_extract_length', 5)
-                result = result[start:start+length] if len(result) > start else ""
-            
-            return result
-        
-        return code
+        """应用扫描配置（配置编译后按版本缓存）"""
+        return scan_code_transformer.transform(code)
     
     def remove_component_from_package(self, component_id):
         """从包装中移除板件"""
@@ -2070,81 +2156,123 @@ class ScanPackaging(QWidget):
 
         reply = QMessageBox.question(self, "确认", "确定要移除这个板件吗？")
         if reply == QMessageBox.Yes:
-            try:
-                conn = db.get_connection()
-                cursor = conn.cursor()
+            current_package_id = self.current_package_id
+            
+            def remove(conn):
+                removed = conn.execute(
+                    'SELECT package_id, room_number, cabinet_number FROM components WHERE id = ?',
+                    (component_id,)
+                ).fetchone()
                 
                 # 从包装中移除（更新板件状态和包装关联）
-                cursor.execute('''
+                conn.execute('''
                     UPDATE components SET status = 'pending', package_id = NULL 
                     WHERE id = ?
                 ''', (component_id,))
                 
-                conn.commit()
-                conn.close()
-                
                 # 记录操作日志
                 db.log_operation('remove_component', {
-                    'package_id': self.current_package_id,
+                    'package_id': current_package_id,
                     'component_id': component_id
-                })
-                
-                # 刷新界面
-                self.load_current_package_components()
-                self.load_active_packages()
-                self.update_order_stats()
-                
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"移除板件失败：\n{str(e)}")
+                }, conn=conn)
+                return tuple(removed) if removed else None
+            
+            self.submit_write(remove, lambda future: self._on_component_removed(future, component_id))
+    
+    def _on_component_removed(self, future, component_id):
+        """移除板件写入完成（界面线程）"""
+        error = future.exception()
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"移除板件失败：\n{str(error)}")
+            return
+        removed = future.result()
+        if removed and removed[0]:
+            scan_service.on_component_removed(component_id, *removed)
+        
+        # 刷新界面：当前包装板件列表、该包装的数量、订单统计
+        self.load_current_package_components()
+        if removed and removed[0]:
+            self.packages_model.adjust_component_count(removed[0], -1)
+            event_bus.publish(EventKind.COMPONENT_UNPACKED, component_ids=[component_id],
+                              package_ids=[removed[0]], order_ids=[self.current_order_id],
+                              source=self)
+        stats = getattr(self, 'order_stats', None)
+        if stats and removed and removed[0]:
+            stats['packaged_components'] = max(0, stats['packaged_components'] - 1)
+            self.render_order_stats(stats)
+        else:
+            self.update_order_stats()
     
-    def finish_package(self):
-        """完成包装"""
+    def finish_package(self, then=None):
+        """完成包装
+        
+        写入在写线程执行；提交了写入时返回 True，并在写入结束（无论成败）后于界面线程调用 then()
+        """
         if not self.current_package_id:
             QMessageBox.warning(self, "警告", "请先选择一个包装")
-            return
+            return False
+        
+        package_id = self.current_package_id
         
         # 检查包装是否有板件
         conn = db.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT COUNT(*) FROM components WHERE package_id = ?
-        ''', (self.current_package_id,))
+        ''', (package_id,))
         count = cursor.fetchone()[0]
+        conn.close()
         
         if count == 0:
             Prompt.show_warning("包装中没有板件，无法完成")
-            return
+            return False
         
-        if Prompt.ask_confirm(f"确定要完成当前包装吗？\n包装中共有 {count} 个板件"):
-            try:
-                # 更新包装状态
-                cursor.execute('''
-                    UPDATE packages 
-                    SET status = 'completed', completed_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (self.current_package_id,))
-                
-                conn.commit()
-                
-                # 获取包装号
-                cursor.execute('SELECT package_number FROM packages WHERE id = ?', (self.current_package_id,))
-                package_number = cursor.fetchone()[0]
-                
-                conn.close()
-                
-                # 记录撤销操作
-                undo_manager.add_operation('finish_package', 
-                                         {'package_id': self.current_package_id},
-                                         f"完成包装: {package_number}")
-                
-                # 记录操作日志
-                db.log_operation('finish_package', 
-                               f"完成包装 {package_number}，包含 {count} 个板件")
-                
-                # 发送信号
-                self.package_completed.emit(package_number)
-                
-                # 清空当前选择
+        if not Prompt.ask_confirm(f"确定要完成当前包装吗？\n包装中共有 {count} 个板件"):
+            return False
+        
+        def update_package(conn):
+            # 更新包装状态
+            conn.execute('''
+                UPDATE packages 
+                SET status = 'completed', completed_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (package_id,))
+            
+            # 获取包装号
+            package_number = conn.execute('SELECT package_number FROM packages WHERE id = ?', (package_id,)).fetchone()[0]
+            
+            # 记录操作日志
+            db.log_operation('finish_package', 
+                           f"完成包装 {package_number}，包含 {count} 个板件", conn=conn)
+            return package_number
+        
+        # 写入期间不再接受该包装的扫码与重复操作
+        self.set_package_actions_enabled(False)
+        self.submit_write(update_package, lambda future: self._on_package_finished(future, package_id, then))
+        return True
+    
+    def _on_package_finished(self, future, package_id, then=None):
+        """完成包装写入完成（界面线程）"""
+        try:
+            error = future.exception()
+            if error is not None:
+                if self.current_package_id == package_id:
+                    self.set_package_actions_enabled(True)
+                Prompt.show_error(f"完成包装失败：\n{str(error)}")
+                return
+            package_number = future.result()
+            scan_service.invalidate_package(package_id)
+            
+            # 记录撤销操作
+            undo_manager.add_operation('finish_package', 
+                                     {'package_id': package_id},
+                                     f"完成包装: {package_number}")
+            
+            # 发送信号
+            self.package_completed.emit(package_number)
+            
+            # 清空当前选择（写入期间已切换到其他包装时保留新的选择）
+            if self.current_package_id == package_id:
                 self.current_package_id = None
                 self.current_package_status = None
                 self.current_package_label.setText("未选择")
@@ -2153,20 +2281,30 @@ class ScanPackaging(QWidget):
                 self.finish_package_btn.setEnabled(False)
                 self.unpack_btn.setEnabled(False)
                 self.delete_package_btn.setEnabled(False)
-                self.current_components_table.setRowCount(0)
+                self.current_components_model.clear()
                 
                 # 禁用扫描功能（没有选择包装时）
                 self.scan_input.setEnabled(False)
                 self.manual_scan_btn.setEnabled(False)
-                
-                # 刷新列表
-                self.load_active_packages()
-                self.update_order_stats()
-                
-                Prompt.show_info(f"包装 {package_number} 已完成")
-                
-            except Exception as e:
-                Prompt.show_error(f"完成包装失败：\n{str(e)}")
+            
+            # 刷新列表：只更新该包装的状态
+            self.packages_model.update_package(package_id, status='completed')
+            event_bus.publish(EventKind.PACKAGE_FINISHED, package_ids=[package_id],
+                              package_numbers=[package_number], order_ids=[self.current_order_id],
+                              source=self)
+            
+            Prompt.show_info(f"包装 {package_number} 已完成")
+        finally:
+            if then is not None:
+                then()
+    
+    def set_package_actions_enabled(self, enabled):
+        """按当前包装状态启用/禁用扫码与完成、解包按钮（写入进行中时全部禁用）"""
+        is_open = enabled and self.current_package_status == 'open'
+        self.finish_package_btn.setEnabled(is_open)
+        self.unpack_btn.setEnabled(enabled and self.current_package_status == 'completed')
+        self.scan_input.setEnabled(is_open)
+        self.manual_scan_btn.setEnabled(is_open)
     
     def unpack_package(self):
         """解包：将已完成的包装重新设置为开放状态"""
@@ -2174,13 +2312,16 @@ class ScanPackaging(QWidget):
             Prompt.show_warning("请先选择一个包装")
             return
         
+        package_id = self.current_package_id
+        
         # 获取包装信息
         conn = db.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT package_number, status, pallet_id FROM packages WHERE id = ?
-        ''', (self.current_package_id,))
+        ''', (package_id,))
         package_info = cursor.fetchone()
+        conn.close()
         
         if not package_info:
             Prompt.show_warning("包装不存在")
@@ -2198,49 +2339,56 @@ class ScanPackaging(QWidget):
             Prompt.show_warning("只能解包已完成的包装")
             return
         
-        if Prompt.ask_confirm(f"确定要解包 {package_number} 吗？\n解包后可以继续添加或移除板件。"):
-            try:
-                # 更新包装状态为开放
-                cursor.execute('''
-                    UPDATE packages 
-                    SET status = 'open', completed_at = NULL
-                    WHERE id = ?
-                ''', (self.current_package_id,))
-                
-                conn.commit()
-                conn.close()
-                
-                # 记录撤销操作
-                undo_manager.add_operation('unpack_package', 
-                                         {'package_id': self.current_package_id},
-                                         f"解包: {package_number}")
-                
-                # 记录操作日志
-                db.log_operation('unpack_package', 
-                               f"解包 {package_number}")
-                
-                # 更新当前包装状态
-                self.current_package_status = 'open'
-                
-                # 重新启用扫描功能
-                self.scan_input.setEnabled(True)
-                self.manual_scan_btn.setEnabled(True)
-                
-                # 更新按钮状态
-                self.finish_package_btn.setEnabled(True)
-                self.unpack_btn.setEnabled(False)
-                
-                # 刷新板件列表（重新加载移除按钮状态）
-                self.load_current_package_components()
-                
-                # 刷新包装列表
-                self.load_active_packages()
-                self.update_order_stats()
-                
-                Prompt.show_info(f"包装 {package_number} 已解包，可以继续编辑")
-                
-            except Exception as e:
-                Prompt.show_error(f"解包失败：\n{str(e)}")
+        if not Prompt.ask_confirm(f"确定要解包 {package_number} 吗？\n解包后可以继续添加或移除板件。"):
+            return
+        
+        def update_package(conn):
+            # 更新包装状态为开放
+            conn.execute('''
+                UPDATE packages 
+                SET status = 'open', completed_at = NULL
+                WHERE id = ?
+            ''', (package_id,))
+            
+            # 记录操作日志
+            db.log_operation('unpack_package', 
+                           f"解包 {package_number}", conn=conn)
+        
+        self.unpack_btn.setEnabled(False)
+        self.submit_write(update_package, lambda future: self._on_package_unpacked(future, package_id, package_number))
+    
+    def _on_package_unpacked(self, future, package_id, package_number):
+        """解包写入完成（界面线程）"""
+        error = future.exception()
+        if error is not None:
+            if self.current_package_id == package_id:
+                self.set_package_actions_enabled(True)
+            Prompt.show_error(f"解包失败：\n{str(error)}")
+            return
+        scan_service.invalidate_package(package_id)
+        
+        # 记录撤销操作
+        undo_manager.add_operation('unpack_package', 
+                                 {'package_id': package_id},
+                                 f"解包: {package_number}")
+        
+        if self.current_package_id == package_id:
+            # 更新当前包装状态
+            self.current_package_status = 'open'
+            
+            # 重新启用扫描功能，更新按钮状态
+            self.set_package_actions_enabled(True)
+            
+            # 刷新板件列表（重新加载移除按钮状态）
+            self.load_current_package_components()
+        
+        # 刷新包装列表：只更新该包装的状态
+        self.packages_model.update_package(package_id, status='open')
+        event_bus.publish(EventKind.PACKAGE_REOPENED, package_ids=[package_id],
+                          package_numbers=[package_number], order_ids=[self.current_order_id],
+                          source=self)
+        
+        Prompt.show_info(f"包装 {package_number} 已解包，可以继续编辑")
     
     def keyPressEvent(self, event):
         """键盘事件处理（用于扫码枪输入）"""
@@ -2651,13 +2799,22 @@ class ScanPackaging(QWidget):
             print(f"设置标签数据时发生错误: {e}")
 
 
-class PendingComponentsDialog(QDialog):
+class PendingComponentsDialog(WriteSubmitter, QDialog):
     """待包板件对话框"""
     components_deleted = pyqtSignal(int)
     
+    FILTER_DELAY_MS = 200  # 筛选输入防抖
+
     def __init__(self, parent=None, order_id=None):
         super().__init__(parent)
         self.order_id = order_id
+        # 筛选索引：每列一份小写文本数组；上一次的筛选条件与结果行号用于增量收窄
+        self.filter_columns = []
+        self.last_filters = None
+        self.last_matched_rows = None
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.timeout.connect(self.apply_filters)
         self.setWindowTitle("待包板件列表")
         self.setGeometry(200, 200, 1000, 600)
         self.init_ui()
@@ -2695,7 +2852,7 @@ class PendingComponentsDialog(QDialog):
             filter_input = QLineEdit()
             filter_input.setPlaceholderText(f"筛选{label}")
             filter_input.setMaximumWidth(100)
-            filter_input.textChanged.connect(self.apply_filters)
+            filter_input.textChanged.connect(self.schedule_filter)
             self.filter_inputs.append(filter_input)
             filter_layout.addWidget(filter_input)
         
@@ -2705,12 +2862,14 @@ class PendingComponentsDialog(QDialog):
         
         layout.addLayout(filter_layout)
         
-        # 待包板件表格
-        self.components_table = QTableWidget()
-        self.components_table.setColumnCount(8)
-        self.components_table.setHorizontalHeaderLabels([
+        # 待包板件表格（模型按需分批取行）
+        self.components_model = ComponentsTableModel([
             '板件名', '材质', '成品尺寸', '板件编码', '房间号', '柜号', '订单号', '扫描时间'
-        ])
+        ], parent=self)
+        self.components_proxy = RowSetFilterProxyModel(self)
+        self.components_proxy.setSourceModel(self.components_model)
+        self.components_table = QTableView()
+        self.components_table.setModel(self.components_proxy)
         
         # 设置列宽
         self.components_table.setColumnWidth(0, 120)  # 板件名
@@ -2723,8 +2882,8 @@ class PendingComponentsDialog(QDialog):
         self.components_table.setColumnWidth(7, 140)  # 扫描时间
         
         # 启用多选模式
-        self.components_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.components_table.setSelectionMode(QTableWidget.MultiSelection)
+        self.components_table.setSelectionBehavior(QTableView.SelectRows)
+        self.components_table.setSelectionMode(QTableView.MultiSelection)
         
         self.components_table.horizontalHeader().setStretchLastSection(False)
         layout.addWidget(self.components_table)
@@ -2745,6 +2904,13 @@ class PendingComponentsDialog(QDialog):
         
         button_layout.addStretch()
         
+        # 一键打包的拆分方式（userData 对应 db.pack_components 的 split_by）
+        self.pack_split_combo = QComboBox()
+        self.pack_split_combo.addItem("不拆分", None)
+        self.pack_split_combo.addItem("按房间拆分", 'room')
+        self.pack_split_combo.addItem("按柜号拆分", 'cabinet')
+        button_layout.addWidget(self.pack_split_combo)
+        
         self.one_click_pack_btn = QPushButton("一键打包选中项")
         self.one_click_pack_btn.clicked.connect(self.one_click_pack)
         self.one_click_pack_btn.setStyleSheet("QPushButton { background-color: #4CAF50; color: white; font-weight: bold; }")
@@ -2792,70 +2958,89 @@ class PendingComponentsDialog(QDialog):
         
         # 存储原始数据（包含ID）
         self.original_data = components
-        
-        # 显示数据（不包含ID列）
-        display_data = [component[1:] for component in components]  # 跳过第一列ID
+        # 预先计算每列的小写文本，筛选时只做子串判断
+        column_count = self.components_model.columnCount()
+        self.filter_columns = [
+            [str(component[column + 1]).lower() for component in components]
+            for column in range(column_count)
+        ]
+        self.last_filters = None
+        self.last_matched_rows = None
         
         # 更新统计标签
-        self.total_label.setText(f"总计: {len(display_data)} 个板件")
+        self.total_label.setText(f"总计: {len(components)} 个板件")
         self.filtered_label.setText("")
         
-        self.populate_table(display_data)
+        self.populate_table(components)
+        # 刷新后保留已输入的筛选条件
+        if any(input_field.text().strip() for input_field in self.filter_inputs):
+            self.apply_filters()
     
     def populate_table(self, data):
-        """填充表格数据"""
-        self.components_table.setRowCount(len(data))
-        for i, component in enumerate(data):
-            for j, value in enumerate(component):
-                item_text = str(value) if value else ''
-                item = QTableWidgetItem(item_text)
-                self.components_table.setItem(i, j, item)
+        """填充表格数据（行元组首列为板件ID）"""
+        self.components_proxy.set_visible_rows(None)
+        self.components_model.set_rows(data)
+    
+    def schedule_filter(self):
+        """筛选输入防抖：停止输入 FILTER_DELAY_MS 后再筛选"""
+        self.filter_timer.start(self.FILTER_DELAY_MS)
     
     def apply_filters(self):
-        """应用筛选"""
+        """应用筛选
+
+        各列条件均为上次条件的延伸（输入继续变长）时，只在上次的结果中查找；
+        否则从全部行开始。匹配结果交给代理模型显示，不重建表格。
+        """
+        self.filter_timer.stop()
         if not self.original_data:
             return
         
         # 获取筛选条件
         filters = [input_field.text().lower().strip() for input_field in self.filter_inputs]
+        if not any(filters):
+            self.last_filters = None
+            self.last_matched_rows = None
+            self.components_proxy.set_visible_rows(None)
+            self.filtered_label.setText("")
+            return
         
-        # 筛选数据
-        filtered_data = []
-        for component in self.original_data:
-            # 检查每列是否匹配筛选条件（跳过ID列）
-            display_component = component[1:]  # 跳过ID列
-            match = True
-            for i, filter_text in enumerate(filters):
-                if filter_text and filter_text not in str(display_component[i]).lower():
-                    match = False
-                    break
-            
-            if match:
-                filtered_data.append(display_component)
-        
-        # 更新表格
-        self.populate_table(filtered_data)
+        narrowing = (
+            self.last_filters is not None
+            and all(old in new for old, new in zip(self.last_filters, filters))
+        )
+        rows = self.last_matched_rows if narrowing else range(len(self.original_data))
+        for column, filter_text in enumerate(filters):
+            if filter_text and not (narrowing and filter_text == self.last_filters[column]):
+                values = self.filter_columns[column]
+                rows = [row for row in rows if filter_text in values[row]]
+        rows = list(rows)
+        
+        self.last_filters = filters
+        self.last_matched_rows = rows
+        # 匹配行可能尚未取到视图中，筛选前一次性取出
+        self.components_model.fetch_all()
+        self.components_proxy.set_visible_rows(rows)
         
         # 更新统计信息
-        if any(filters):
-            self.filtered_label.setText(f"筛选结果: {len(filtered_data)} 个板件")
-        else:
-            self.filtered_label.setText("")
+        self.filtered_label.setText(f"筛选结果: {len(rows)} 个板件")
     
     def clear_filters(self):
         """清除所有筛选"""
         for input_field in self.filter_inputs:
+            input_field.blockSignals(True)
             input_field.clear()
+            input_field.blockSignals(False)
         
         # 重新显示所有数据
-        if self.original_data:
-            display_data = [component[1:] for component in self.original_data]
-            self.populate_table(display_data)
+        self.last_filters = None
+        self.last_matched_rows = None
+        self.components_proxy.set_visible_rows(None)
         
         self.filtered_label.setText("")
     
     def select_all(self):
-        """全选"""
+        """全选（先取出尚未加载到视图的行）"""
+        self.components_model.fetch_all()
         self.components_table.selectAll()
     
     def select_none(self):
@@ -2864,115 +3049,79 @@ class PendingComponentsDialog(QDialog):
     
     def get_selected_component_ids(self):
         """获取选中的板件ID"""
-        selected_rows = set()
-        for item in self.components_table.selectedItems():
-            selected_rows.add(item.row())
-        
-        # 获取当前显示的数据对应的原始数据索引
-        current_display_data = []
-        for row in range(self.components_table.rowCount()):
-            row_data = []
-            for col in range(self.components_table.columnCount()):
-                item = self.components_table.item(row, col)
-                row_data.append(item.text() if item else '')
-            current_display_data.append(row_data)
-        
-        # 找到选中行对应的原始数据ID
-        selected_ids = []
-        for row in selected_rows:
-            if row < len(current_display_data):
-                # 在原始数据中查找匹配的行
-                display_row = current_display_data[row]
-                for original_component in self.original_data:
-                    original_display = original_component[1:]  # 跳过ID列
-                    if list(original_display) == display_row:
-                        selected_ids.append(original_component[0])  # 添加ID
-                        break
-        
-        return selected_ids
+        rows = sorted(
+            self.components_proxy.mapToSource(index).row()
+            for index in self.components_table.selectionModel().selectedRows()
+        )
+        return [self.components_model.component_id_at(row) for row in rows]
     
     def one_click_pack(self):
-        """一键打包选中的板件"""
+        """一键打包选中的板件（可按房间/柜号拆分为多个包裹）"""
         selected_ids = self.get_selected_component_ids()
         
         if not selected_ids:
             QMessageBox.warning(self, "警告", "请先选择要打包的板件")
             return
         
-        try:
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            
-            # 生成新的包裹号
-            package_number = db.generate_package_number()
-            
-            # 获取第一个板件的订单ID（假设同一批打包的板件属于同一订单）
-            cursor.execute('SELECT order_id FROM components WHERE id = ?', (selected_ids[0],))
-            order_result = cursor.fetchone()
-            order_id = order_result[0] if order_result else None
-            
-            # 计算包裹序号（按订单内补位规则）
-            try:
-                next_index = db.get_next_package_index(order_id)
-            except Exception:
-                next_index = None
-            
-            # 创建新包裹（打包方式统一为“mixed”），使用数据库时间戳
-            cursor.execute('''
-                INSERT INTO packages (package_number, order_id, package_index, packing_method, status, created_at, is_manual)
-                VALUES (?, ?, ?, ?, 'open', CURRENT_TIMESTAMP, ?)
-            ''', (package_number, order_id, next_index, 'mixed', 1))
-            
-            package_id = cursor.lastrowid
-            
-            # 将选中的板件添加到包裹中
-            for component_id in selected_ids:
-                cursor.execute('''
-                    UPDATE components 
-                    SET package_id = ?, scanned_at = ?
-                    WHERE id = ? AND package_id IS NULL
-                ''', (package_id, datetime.now(), component_id))
-            
-            # 更新包裹的板件数量统计字段
-            cursor.execute('''
-                UPDATE packages SET component_count = (
-                    SELECT COUNT(*) FROM components WHERE package_id = ?
-                ) WHERE id = ?
-            ''', (package_id, package_id))
-            
-            conn.commit()
-            
-            # 记录操作日志
-            db.log_operation('one_click_pack', 
-                           f"一键打包创建包裹 {package_number}，包含 {len(selected_ids)} 个板件")
-            
-            # 添加撤销操作
-            undo_manager.add_operation('one_click_pack', 
-                                     {'package_id': package_id, 'component_ids': selected_ids},
-                                     f"一键打包: {package_number}")
-            
-            conn.close()
-            
-            QMessageBox.information(self, "成功", 
-                                  f"成功创建包裹 {package_number}\n已打包 {len(selected_ids)} 个板件")
-            
-            # 刷新数据
+        split_by = self.pack_split_combo.currentData()
+        # 包装号/序号整块分配、板件集合更新都在写线程的同一事务内完成
+        self.one_click_pack_btn.setEnabled(False)
+        self.submit_write(
+            lambda conn: db.pack_components(selected_ids, split_by=split_by),
+            lambda future: self._on_packed(future, selected_ids),
+        )
+    
+    def _on_packed(self, future, selected_ids):
+        """一键打包写入完成（界面线程）"""
+        self.one_click_pack_btn.setEnabled(True)
+        error = future.exception()
+        if error is not None:
+            QMessageBox.critical(self, "错误", f"一键打包失败：\n{str(error)}")
+            return
+        packages = future.result()
+        scan_service.invalidate_component_index()
+        
+        if not packages:
+            QMessageBox.warning(self, "警告", "选中的板件均已入包，无需打包")
             self.load_pending_components()
-            
-            # 通知父窗口刷新
-            if hasattr(self.parent(), 'load_active_packages'):
-                self.parent().load_active_packages()
-                try:
-                    if hasattr(self.parent(), 'update_order_stats'):
-                        self.parent().update_order_stats()
-                except Exception:
-                    pass
+            return
         
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"一键打包失败：\n{str(e)}")
-            if 'conn' in locals():
-                conn.rollback()
-                conn.close()
+        # 添加撤销操作（每个包裹一条）
+        for package in packages:
+            undo_manager.add_operation('one_click_pack',
+                                     {'package_id': package['package_id'],
+                                      'component_ids': package['component_ids']},
+                                     f"一键打包: {package['package_number']}")
+        
+        packed_count = sum(len(package['component_ids']) for package in packages)
+        event_bus.publish(EventKind.PACKAGE_CREATED,
+                          package_ids=[package['package_id'] for package in packages],
+                          package_numbers=[package['package_number'] for package in packages],
+                          order_ids={package['order_id'] for package in packages},
+                          component_ids=[cid for package in packages for cid in package['component_ids']],
+                          source=self.parent())
+        if len(packages) == 1:
+            message = f"成功创建包裹 {packages[0]['package_number']}\n已打包 {packed_count} 个板件"
+        else:
+            numbers = '、'.join(package['package_number'] for package in packages[:5])
+            if len(packages) > 5:
+                numbers += ' 等'
+            message = f"成功创建 {len(packages)} 个包裹（{numbers}）\n已打包 {packed_count} 个板件"
+        if packed_count < len(selected_ids):
+            message += f"\n跳过 {len(selected_ids) - packed_count} 个已入包的板件"
+        QMessageBox.information(self, "成功", message)
+        
+        # 刷新数据
+        self.load_pending_components()
+        
+        # 通知父窗口刷新
+        if hasattr(self.parent(), 'load_active_packages'):
+            self.parent().load_active_packages()
+            try:
+                if hasattr(self.parent(), 'update_order_stats'):
+                    self.parent().update_order_stats()
+            except Exception:
+                pass
 
     def delete_selected_components(self):
         """删除选中的待包板件（仅允许pending且未入包/未入托）"""
@@ -2982,24 +3131,32 @@ class PendingComponentsDialog(QDialog):
             return
         if not Prompt.ask_confirm(f"确定要删除选中的 {len(selected_ids)} 个板件吗？", title="确认删除"):
             return
-        try:
-            conn = db.get_connection()
-            cursor = conn.cursor()
+        
+        def remove(conn):
             # 只删除未入包的板件（package_id IS NULL）
             placeholders = ','.join(['?'] * len(selected_ids))
-            cursor.execute(f'''DELETE FROM components WHERE id IN ({placeholders}) AND package_id IS NULL''', selected_ids)
-            deleted_count = cursor.rowcount if hasattr(cursor, 'rowcount') else None
-            conn.commit()
-            conn.close()
+            cursor = conn.execute(f'''DELETE FROM components WHERE id IN ({placeholders}) AND package_id IS NULL''', selected_ids)
+            return cursor.rowcount
+        
+        self.submit_write(remove, lambda future: self._on_components_deleted(future, selected_ids))
+    
+    def _on_components_deleted(self, future, selected_ids):
+        """删除待包板件写入完成（界面线程）"""
+        error = future.exception()
+        if error is not None:
+            Prompt.show_error(f"删除板件失败：\n{str(error)}")
+            return
+        deleted_count = future.result()
+        scan_service.invalidate_component_index()
+        event_bus.publish(EventKind.COMPONENTS_DELETED, component_ids=selected_ids,
+                          order_ids=[self.order_id])
 
-            Prompt.show_info(f"已删除 {deleted_count or len(selected_ids)} 个板件")
-            # 刷新当前列表
-            self.load_pending_components()
-            # 发出删除信号用于联动订单管理页刷新
-            try:
-                if self.order_id:
-                    self.components_deleted.emit(self.order_id)
-            except Exception:
-                pass
-        except Exception as e:
-            Prompt.show_error(f"删除板件失败：\n{str(e)}")
+        Prompt.show_info(f"已删除 {deleted_count or len(selected_ids)} 个板件")
+        # 刷新当前列表
+        self.load_pending_components()
+        # 发出删除信号用于联动订单管理页刷新
+        try:
+            if self.order_id:
+                self.components_deleted.emit(self.order_id)
+        except Exception:
+            pass
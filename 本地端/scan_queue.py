@@ -0,0 +1,208 @@
+"""
+扫码接收队列
+扫码枪连扫时，界面线程只负责把编码入队（带接收时间），
+由后台工作线程按接收顺序逐条判定并入包，结果通过信号回到界面线程。
+
+- 单一工作线程 + FIFO 队列：结果顺序与扫码顺序一致
+- 队列中连续、同一包装的编码合并为一批，需要写库的部分共用一个事务
+- 整批失败时逐条重试，单条失败也会以 scan_failed 信号回报，不丢扫码
+- 通用完成码作为屏障：之前的扫码处理完后暂停队列，界面完成包装后再继续
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from scan_service import scan_service as default_scan_service
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScanJob:
+    """一条待处理的扫码"""
+    seq: int
+    raw_code: str
+    code: str
+    # 入队时的当前包装；为 None 时在处理时取队列的当前包装（排在完成码之后的扫码）
+    package_id: Optional[int]
+    received_at: float
+    is_finish: bool = False
+
+    @property
+    def waited_ms(self) -> float:
+        return (time.time() - self.received_at) * 1000
+
+
+class ScanQueue(QObject):
+    """扫码接收队列（界面线程入队，工作线程按序处理）"""
+
+    # (ScanJob, ScanResult)
+    scan_processed = pyqtSignal(object, object)
+    # (ScanJob, 错误信息)
+    scan_failed = pyqtSignal(object, str)
+    # 到达通用完成码，队列已暂停，界面处理完成后调用 resume()
+    finish_requested = pyqtSignal(object)
+    # 尚未处理完的扫码数量
+    backlog_changed = pyqtSignal(int)
+
+    BATCH_MAX = 50
+
+    def __init__(self, service=None, parent=None):
+        super().__init__(parent)
+        self.service = service or default_scan_service
+        self._queue = queue.Queue()
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._backlog = 0
+        self._pending_finishes = 0
+        self._package_id = None
+        self._carry = None  # 上一批取出但不属于该批的扫码
+        self._thread = None
+
+    # ---- 界面线程 ----
+    def set_package(self, package_id):
+        """当前包装变化时调用（新入队的扫码归入该包装）"""
+        with self._lock:
+            self._package_id = package_id
+
+    def enqueue(self, raw_code, code) -> ScanJob:
+        """扫码入队"""
+        with self._lock:
+            # 排在完成码之后的扫码属于完成后新建的包装，处理时再确定
+            package_id = None if self._pending_finishes else self._package_id
+            job = ScanJob(next(self._seq), raw_code, code, package_id, time.time())
+            self._backlog += 1
+            backlog = self._backlog
+        self._queue.put(job)
+        self._ensure_worker()
+        self.backlog_changed.emit(backlog)
+        return job
+
+    def enqueue_finish(self, raw_code) -> ScanJob:
+        """通用完成码入队（作为屏障，之前的扫码全部处理完后才会完成包装）"""
+        with self._lock:
+            # 与 enqueue 相同：排在另一个完成码之后时，完成的是那次新建的包装
+            package_id = None if self._pending_finishes else self._package_id
+            job = ScanJob(next(self._seq), raw_code, raw_code, package_id, time.time(), is_finish=True)
+            self._backlog += 1
+            self._pending_finishes += 1
+            backlog = self._backlog
+        self._queue.put(job)
+        self._ensure_worker()
+        self.backlog_changed.emit(backlog)
+        return job
+
+    def resume(self):
+        """完成码处理结束（包装已完成/新建并 set_package 之后调用）"""
+        with self._lock:
+            self._pending_finishes = max(0, self._pending_finishes - 1)
+        self._resume.set()
+
+    def has_pending_finish(self) -> bool:
+        with self._lock:
+            return self._pending_finishes > 0
+
+    @property
+    def backlog(self) -> int:
+        with self._lock:
+            return self._backlog
+
+    def stop(self):
+        """停止工作线程（已入队的扫码处理完后退出）"""
+        self._resume.set()
+        self._queue.put(None)
+
+    # ---- 工作线程 ----
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='ScanQueueWorker', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._carry if self._carry is not None else self._queue.get()
+            self._carry = None
+            if job is None:
+                return
+            if job.is_finish:
+                self._handle_finish(job)
+                continue
+            batch = self._collect_batch(job)
+            self._process_batch(batch)
+
+    def _collect_batch(self, first):
+        """取出与 first 同一包装的连续扫码（遇到完成码或其他包装即停止）"""
+        batch = [first]
+        package_id = self._resolve_package(first)
+        while len(batch) < self.BATCH_MAX:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None or job.is_finish or self._resolve_package(job) != package_id:
+                self._carry = job
+                break
+            batch.append(job)
+        return batch
+
+    def _resolve_package(self, job):
+        if job.package_id is None:
+            with self._lock:
+                job.package_id = self._package_id
+        return job.package_id
+
+    def _handle_finish(self, job):
+        self._resolve_package(job)
+        self._resume.clear()
+        self.finish_requested.emit(job)
+        self._resume.wait()
+        self._done()
+
+    def _process_batch(self, batch):
+        package_id = batch[0].package_id
+        try:
+            if package_id is None:
+                raise ValueError("请先选择一个包装")
+            results = self.service.scan_batch(package_id, [job.code for job in batch])
+        except Exception as e:
+            if len(batch) == 1 or package_id is None:
+                for job in batch:
+                    self.scan_failed.emit(job, str(e))
+                    self._done()
+                return
+            logger.warning(f"批量扫码失败，逐条重试: {e}")
+            for job in batch:
+                self._process_one(job)
+            return
+        for job, result in zip(batch, results):
+            self.scan_processed.emit(job, result)
+            self._done()
+
+    def _process_one(self, job):
+        try:
+            result = self.service.scan(job.package_id, job.code)
+        except Exception as e:
+            logger.error(f"扫码处理失败 {job.code}: {e}")
+            self.scan_failed.emit(job, str(e))
+        else:
+            self.scan_processed.emit(job, result)
+        self._done()
+
+    def _done(self):
+        with self._lock:
+            self._backlog -= 1
+            backlog = self._backlog
+        self.backlog_changed.emit(backlog)
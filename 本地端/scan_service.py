@@ -0,0 +1,470 @@
+"""
+扫码打包服务
+把一次扫码的 查找板件 → 重复校验 → 打包规则校验 → 入包 → 记日志 合并到一个事务中，
+并返回增量结果（ScanResult），界面据此只更新受影响的行。
+
+选择订单后加载该订单的板件编码索引（ComponentIndex），规则不一致的扫码直接由内存索引回答；
+索引判定为编码不存在或已入包时，再用一次按编码的唯一索引查询确认
+（其他工位的导入、解包不会使本机索引失效），数据库不同意时重新加载索引。
+"""
+
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from database import db as default_db
+
+
+class ScanStatus:
+    """扫码结果状态"""
+    OK = 'ok'
+    NOT_FOUND = 'not_found'            # 编码不存在或不是待包状态
+    DUPLICATE = 'duplicate'            # 板件已在某个包装中
+    ROOM_MISMATCH = 'room_mismatch'    # 按房间/柜号分组时房间号不一致
+    CABINET_MISMATCH = 'cabinet_mismatch'  # 按柜号分组时柜号不一致
+    PACKAGE_CLOSED = 'package_closed'  # 当前包装不存在或已不是进行中
+
+
+@dataclass
+class ScanResult:
+    """一次扫码的增量结果"""
+    status: str
+    code: str
+    package_id: Optional[int] = None
+    component_id: Optional[int] = None
+    order_id: Optional[int] = None
+    component_name: str = ''
+    material: str = ''
+    room_number: str = ''
+    cabinet_number: str = ''
+    finished_size: str = ''
+    updated_at: str = ''
+    # 重复扫描时为板件所在包装号
+    existing_package_number: Optional[str] = None
+    # 规则不一致时为包装内已有的房间号/柜号
+    expected_value: Optional[str] = None
+    packing_method: Optional[str] = None
+    # 入包后该包装的板件数量
+    package_component_count: int = 0
+    elapsed_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == ScanStatus.OK
+
+
+def normalize_code(code) -> str:
+    """索引使用的编码形式（去掉首尾空白）"""
+    return str(code or '').strip()
+
+
+@dataclass
+class IndexedComponent:
+    """索引中的板件（只保存扫码判定所需的字段）"""
+    id: int
+    room_number: Optional[str]
+    cabinet_number: Optional[str]
+    package_id: Optional[int]
+    status: Optional[str]
+
+
+class ComponentIndex:
+    """当前订单的 编码 -> 板件 哈希索引"""
+
+    _LOAD_SQL = '''
+        SELECT component_code, id, room_number, cabinet_number, package_id, status
+        FROM components
+        WHERE order_id = ?
+    '''
+
+    _PACKAGE_NUMBERS_SQL = 'SELECT id, package_number FROM packages WHERE order_id = ?'
+
+    def __init__(self, order_id):
+        self.order_id = order_id
+        self.by_code: Dict[str, IndexedComponent] = {}
+        self.code_by_id: Dict[int, str] = {}
+        # package_id -> package_number，重复扫描提示用
+        self.package_numbers: Dict[int, str] = {}
+
+    def load(self, cursor):
+        cursor.execute(self._LOAD_SQL, (self.order_id,))
+        for code, component_id, room, cabinet, package_id, status in cursor.fetchall():
+            key = normalize_code(code)
+            self.by_code[key] = IndexedComponent(component_id, room, cabinet, package_id, status)
+            self.code_by_id[component_id] = key
+        cursor.execute(self._PACKAGE_NUMBERS_SQL, (self.order_id,))
+        self.package_numbers = dict(cursor.fetchall())
+        return self
+
+    def __len__(self):
+        return len(self.by_code)
+
+    def get(self, code) -> Optional[IndexedComponent]:
+        return self.by_code.get(normalize_code(code))
+
+    def get_by_id(self, component_id) -> Optional[IndexedComponent]:
+        code = self.code_by_id.get(component_id)
+        return self.by_code.get(code) if code is not None else None
+
+    def release_package(self, package_id):
+        """包装被删除：包内板件回到待包状态"""
+        for entry in self.by_code.values():
+            if entry.package_id == package_id:
+                entry.package_id = None
+                entry.status = 'pending'
+        self.package_numbers.pop(package_id, None)
+
+
+@dataclass
+class PackageRuleState:
+    """打开中包装的打包规则状态（房间号/柜号按出现次数计数，便于移除时增量维护）"""
+    packing_method: Optional[str]
+    package_number: Optional[str] = None
+    component_count: int = 0
+    rooms: Counter = field(default_factory=Counter)
+    cabinets: Counter = field(default_factory=Counter)
+
+    @property
+    def base_room(self) -> Optional[str]:
+        return next(iter(self.rooms), None)
+
+    @property
+    def base_cabinet(self) -> Optional[str]:
+        return next(iter(self.cabinets), None)
+
+    def add(self, room, cabinet):
+        self.component_count += 1
+        if room:
+            self.rooms[room] += 1
+        if cabinet:
+            self.cabinets[cabinet] += 1
+
+    def remove(self, room, cabinet):
+        self.component_count = max(0, self.component_count - 1)
+        for counter, value in ((self.rooms, room), (self.cabinets, cabinet)):
+            if value and counter.get(value):
+                counter[value] -= 1
+                if counter[value] <= 0:
+                    del counter[value]
+
+
+class ScanService:
+    """扫码入包服务（不依赖界面，可在任意线程使用）"""
+
+    # 按编码查找板件及其所在包装（component_code 有唯一索引）
+    _COMPONENT_SQL = '''
+        SELECT c.id, c.component_name, c.material, c.room_number, c.cabinet_number,
+               c.finished_size, c.updated_at, c.status, c.package_id, p.package_number, c.order_id
+        FROM components c
+        LEFT JOIN packages p ON p.id = c.package_id
+        WHERE c.component_code = ?
+    '''
+
+    # 重建包装规则状态：包装打包方式 + 包内各房间号/柜号组合的数量
+    _PACKAGE_STATE_SQL = '''
+        SELECT p.status, p.packing_method, p.package_number,
+               c.room_number, c.cabinet_number, COUNT(c.id)
+        FROM packages p
+        LEFT JOIN components c ON c.package_id = p.id
+        WHERE p.id = ?
+        GROUP BY c.room_number, c.cabinet_number
+    '''
+
+    # 入包时同时校验包装仍为进行中，省去单独的状态查询
+    _ASSIGN_SQL = '''
+        UPDATE components
+        SET package_id = ?, scanned_at = CURRENT_TIMESTAMP, status = 'packed'
+        WHERE id = ? AND package_id IS NULL
+          AND EXISTS (SELECT 1 FROM packages WHERE id = ? AND status = 'open')
+    '''
+
+    def __init__(self, database=None):
+        self.db = database or default_db
+        # package_id -> PackageRuleState，仅缓存本工位正在扫码的包装
+        self._package_states: Dict[int, PackageRuleState] = {}
+        self._state_lock = threading.Lock()
+        # 当前订单的编码索引；失效后置为 None，下次扫码时按 _index_order_id 重新加载
+        self._index_order_id = None
+        self._component_index: Optional[ComponentIndex] = None
+
+    def scan(self, package_id: int, code: str) -> ScanResult:
+        """把编码为 code 的板件放入包装 package_id
+
+        全部查询使用连接池中的长连接（语句缓存可复用），
+        在一个 BEGIN IMMEDIATE 事务内完成，操作日志随同一事务提交。
+        """
+        started = time.perf_counter()
+        code = normalize_code(code)
+        result = self._scan_from_index(package_id, code)
+        if result is not None:
+            result.elapsed_ms = (time.perf_counter() - started) * 1000
+            return result
+        try:
+            with self.db.immediate_transaction() as conn:
+                result = self._scan_in_transaction(conn.cursor(), package_id, code)
+                if result.ok:
+                    self.db.log_operation(
+                        'scan_component', f"扫描板件 {code} 到包装 {package_id}", conn=conn
+                    )
+        except Exception:
+            # 事务已回滚，缓存的规则状态可能多记了一次
+            self.invalidate_package(package_id)
+            raise
+        self._sync_index(result)
+        result.elapsed_ms = (time.perf_counter() - started) * 1000
+        return result
+
+    def scan_batch(self, package_id: int, codes: List[str]) -> List[ScanResult]:
+        """按顺序把一批编码放入包装 package_id（扫码枪连扫时使用）
+
+        每个编码的判定与单次 scan() 相同，需要写库的编码共用一个事务；
+        任何一条出错时整批回滚并抛出异常，由调用方逐条重试。
+        """
+        results = []
+        try:
+            with self.db.immediate_transaction() as conn:
+                cursor = conn.cursor()
+                for code in codes:
+                    started = time.perf_counter()
+                    code = normalize_code(code)
+                    result = self._scan_from_index(package_id, code, cursor)
+                    if result is None:
+                        result = self._scan_in_transaction(cursor, package_id, code)
+                        if result.ok:
+                            self.db.log_operation(
+                                'scan_component', f"扫描板件 {code} 到包装 {package_id}", conn=conn
+                            )
+                    result.elapsed_ms = (time.perf_counter() - started) * 1000
+                    results.append(result)
+        except Exception:
+            self.invalidate_package(package_id)
+            raise
+        for result in results:
+            self._sync_index(result)
+        return results
+
+    def _lookup_component(self, cursor, package_id, code) -> ScanResult:
+        """按编码查询板件（唯一索引），返回 OK（可入包）/ NOT_FOUND / DUPLICATE"""
+        cursor.execute(self._COMPONENT_SQL, (code,))
+        row = cursor.fetchone()
+        if not row:
+            return ScanResult(ScanStatus.NOT_FOUND, code, package_id)
+
+        (component_id, name, material, room, cabinet,
+         size, updated_at, status, current_package_id, current_package_number, order_id) = row
+        result = ScanResult(
+            ScanStatus.OK, code, package_id,
+            component_id=component_id,
+            order_id=order_id,
+            component_name=name or '',
+            material=material or '',
+            room_number=room or '',
+            cabinet_number=cabinet or '',
+            finished_size=size or '',
+            updated_at=str(updated_at or ''),
+        )
+
+        if current_package_id is not None:
+            result.status = ScanStatus.DUPLICATE
+            result.existing_package_number = current_package_number
+        elif status != 'pending':
+            result.status = ScanStatus.NOT_FOUND
+        return result
+
+    def _scan_in_transaction(self, cursor, package_id, code) -> ScanResult:
+        result = self._lookup_component(cursor, package_id, code)
+        if not result.ok:
+            return result
+        component_id = result.component_id
+        room, cabinet = result.room_number or None, result.cabinet_number or None
+
+        state = self._get_package_state(cursor, package_id)
+        if state is None:
+            result.status = ScanStatus.PACKAGE_CLOSED
+            return result
+        result.packing_method = state.packing_method
+
+        mismatch = self._check_packing_rule(
+            state.packing_method, state.base_room, state.base_cabinet, room, cabinet
+        )
+        if mismatch:
+            result.status, result.expected_value = mismatch
+            return result
+
+        cursor.execute(self._ASSIGN_SQL, (package_id, component_id, package_id))
+        if cursor.rowcount != 1:
+            # 包装已被完成/删除，或其他工位已抢先入包
+            self.invalidate_package(package_id)
+            cursor.execute('SELECT status FROM packages WHERE id = ?', (package_id,))
+            package_row = cursor.fetchone()
+            if not package_row or package_row[0] != 'open':
+                result.status = ScanStatus.PACKAGE_CLOSED
+            else:
+                result.status = ScanStatus.DUPLICATE
+            return result
+
+        with self._state_lock:
+            state.add(room, cabinet)
+            result.package_component_count = state.component_count
+        return result
+
+    def _get_package_state(self, cursor, package_id) -> Optional[PackageRuleState]:
+        """取包装规则状态，未缓存时从数据库重建（包装不存在或不是进行中返回 None）"""
+        with self._state_lock:
+            state = self._package_states.get(package_id)
+        if state is not None:
+            return state
+
+        cursor.execute(self._PACKAGE_STATE_SQL, (package_id,))
+        rows = cursor.fetchall()
+        if not rows or rows[0][0] != 'open':
+            return None
+        state = PackageRuleState(rows[0][1], rows[0][2])
+        for _, _, _, room, cabinet, count in rows:
+            if not count:
+                continue
+            state.component_count += count
+            if room:
+                state.rooms[room] += count
+            if cabinet:
+                state.cabinets[cabinet] += count
+        with self._state_lock:
+            self._package_states[package_id] = state
+        return state
+
+    def _current_index(self) -> Optional[ComponentIndex]:
+        """当前订单的编码索引，失效后在此重新加载（未选择订单返回 None）"""
+        with self._state_lock:
+            index = self._component_index
+            order_id = self._index_order_id
+        if index is not None or order_id is None:
+            return index
+        with self.db.connection_context() as conn:
+            index = ComponentIndex(order_id).load(conn.cursor())
+        with self._state_lock:
+            if self._index_order_id == order_id:
+                self._component_index = index
+        return index
+
+    def _scan_from_index(self, package_id, code, cursor=None) -> Optional[ScanResult]:
+        """用内存索引判定扫码；需要写库或索引无法判定时返回 None
+
+        索引给出的编码不存在/已入包结果经 _confirm_rejection 查库确认后才返回；
+        cursor 为调用方事务的游标（不传时取一个读连接）。
+        """
+        index = self._current_index()
+        if index is None:
+            return None
+        with self._state_lock:
+            entry = index.get(code)
+            rejected = entry is None or entry.package_id is not None or entry.status != 'pending'
+            if not rejected:
+                state = self._package_states.get(package_id)
+                if state is not None:
+                    mismatch = self._check_packing_rule(
+                        state.packing_method, state.base_room, state.base_cabinet,
+                        entry.room_number, entry.cabinet_number
+                    )
+                    if mismatch:
+                        return ScanResult(
+                            mismatch[0], code, package_id,
+                            component_id=entry.id,
+                            room_number=entry.room_number or '',
+                            cabinet_number=entry.cabinet_number or '',
+                            expected_value=mismatch[1],
+                            packing_method=state.packing_method,
+                        )
+        if rejected:
+            return self._confirm_rejection(package_id, code, cursor)
+        return None
+
+    def _confirm_rejection(self, package_id, code, cursor=None) -> Optional[ScanResult]:
+        """按编码查库确认索引的拒绝结果；数据库认为可入包时索引已过期，重新加载并返回 None"""
+        if cursor is not None:
+            result = self._lookup_component(cursor, package_id, code)
+        else:
+            with self.db.connection_context() as conn:
+                result = self._lookup_component(conn.cursor(), package_id, code)
+        if result.ok:
+            # 本订单的板件才说明索引过期（其他订单的板件本就不在索引中）
+            with self._state_lock:
+                if self._index_order_id == result.order_id:
+                    self._component_index = None
+            return None
+        self._sync_index(result)
+        return result
+
+    def _sync_index(self, result: ScanResult):
+        """把数据库事务的判定结果同步回索引"""
+        with self._state_lock:
+            index = self._component_index
+            entry = index.get(result.code) if index is not None else None
+            if entry is None:
+                return
+            if result.ok:
+                entry.package_id = result.package_id
+                entry.status = 'packed'
+                state = self._package_states.get(result.package_id)
+                if state is not None and state.package_number:
+                    index.package_numbers[result.package_id] = state.package_number
+            elif result.status == ScanStatus.DUPLICATE and entry.package_id is not None:
+                index.package_numbers[entry.package_id] = result.existing_package_number
+            elif result.status in (ScanStatus.DUPLICATE, ScanStatus.NOT_FOUND):
+                # 索引认为可入包而数据库不同意：索引已过期
+                self._component_index = None
+
+    def load_component_index(self, order_id):
+        """选择订单时加载该订单的编码索引（order_id 为 None 时停用索引）"""
+        with self._state_lock:
+            self._index_order_id = order_id
+            self._component_index = None
+        return self._current_index()
+
+    def invalidate_component_index(self):
+        """板件被导入/删除/批量修改后调用，下次扫码时重新加载索引"""
+        with self._state_lock:
+            self._component_index = None
+
+    def on_component_removed(self, component_id, package_id, room_number, cabinet_number):
+        """板件移出包装（移除/撤销扫描）后增量更新规则状态与编码索引"""
+        with self._state_lock:
+            state = self._package_states.get(package_id)
+            if state is not None:
+                state.remove(room_number, cabinet_number)
+            index = self._component_index
+            entry = index.get_by_id(component_id) if index is not None else None
+            if entry is not None:
+                entry.package_id = None
+                entry.status = 'pending'
+
+    def on_package_deleted(self, package_id):
+        """包装被删除（删除包装/撤销创建包装）后，包内板件回到待包状态"""
+        with self._state_lock:
+            self._package_states.pop(package_id, None)
+            if self._component_index is not None:
+                self._component_index.release_package(package_id)
+
+    def invalidate_package(self, package_id=None):
+        """丢弃某个包装（或全部）的规则状态，下次扫码时从数据库重建"""
+        with self._state_lock:
+            if package_id is None:
+                self._package_states.clear()
+            else:
+                self._package_states.pop(package_id, None)
+
+    @staticmethod
+    def _check_packing_rule(packing_method, base_room, base_cabinet, room, cabinet):
+        """校验房间/柜号一致性，不一致时返回 (状态, 包装内已有的值)"""
+        if packing_method not in ('by_room', 'by_cabinet'):
+            return None
+        if base_room and room and room != base_room:
+            return ScanStatus.ROOM_MISMATCH, base_room
+        if packing_method == 'by_cabinet' and base_cabinet and cabinet and cabinet != base_cabinet:
+            return ScanStatus.CABINET_MISMATCH, base_cabinet
+        return None
+
+
+# 全局扫码服务实例
+scan_service = ScanService()
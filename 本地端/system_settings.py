@@ -8,6 +8,8 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
 from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QTime
 from PyQt5.QtGui import QFont, QIcon
 import database as db
+from scan_service import scan_service
+from event_bus import event_bus, EventKind
 import json
 import os
 from real_time_cloud_sync import get_sync_service
@@ -979,6 +981,18 @@ class SystemSettings(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"渲染结果失败：{e}")
 
+    def _admin_search_ids(self, table: str, keyword: str):
+        """管理员搜索命中的记录 ID 子查询：编号走 trigram 索引，纯数字时再按主键/订单ID精确匹配
+
+        各分支用 UNION 合并，每个分支都能用上索引（OR 会让 SQLite 退回全表扫描）。
+        """
+        number_condition, params = self.db.search_condition(table, keyword)
+        branches = [f"SELECT id FROM {table} WHERE {number_condition}"]
+        if keyword.isascii() and keyword.isdigit():
+            branches += [f"SELECT id FROM {table} WHERE id = ?", f"SELECT id FROM {table} WHERE order_id = ?"]
+            params += [int(keyword), int(keyword)]
+        return " UNION ".join(branches), params
+
     def admin_search_items(self):
         try:
             if not self.is_admin_authenticated:
@@ -990,38 +1004,20 @@ class SystemSettings(QWidget):
             cursor = conn.cursor()
             try:
                 if type_text == '板件':
-                    sql = "SELECT id, order_id, component_code, component_name, status, created_at FROM components"
-                    params = []
-                    if keyword:
-                        sql += " WHERE component_code LIKE ? OR component_name LIKE ? OR CAST(id AS TEXT)=? OR CAST(order_id AS TEXT)=?"
-                        kw = f"%{keyword}%"
-                        params = [kw, kw, keyword, keyword]
-                    sql += " ORDER BY created_at DESC, id DESC LIMIT 200"
-                    cursor.execute(sql, params)
-                    rows = cursor.fetchall()
-                    self._fill_admin_results(rows, 'components')
+                    table, columns = 'components', "id, order_id, component_code, component_name, status, created_at"
                 elif type_text == '包裹':
-                    sql = "SELECT id, order_id, package_number, component_count, status, created_at FROM packages"
-                    params = []
-                    if keyword:
-                        sql += " WHERE package_number LIKE ? OR CAST(id AS TEXT)=? OR CAST(order_id AS TEXT)=?"
-                        kw = f"%{keyword}%"
-                        params = [kw, keyword, keyword]
-                    sql += " ORDER BY created_at DESC, id DESC LIMIT 200"
-                    cursor.execute(sql, params)
-                    rows = cursor.fetchall()
-                    self._fill_admin_results(rows, 'packages')
+                    table, columns = 'packages', "id, order_id, package_number, component_count, status, created_at"
                 else:
-                    sql = "SELECT id, order_id, pallet_number, pallet_type, status, created_at FROM pallets"
-                    params = []
-                    if keyword:
-                        sql += " WHERE pallet_number LIKE ? OR CAST(id AS TEXT)=? OR CAST(order_id AS TEXT)=?"
-                        kw = f"%{keyword}%"
-                        params = [kw, keyword, keyword]
-                    sql += " ORDER BY created_at DESC, id DESC LIMIT 200"
-                    cursor.execute(sql, params)
-                    rows = cursor.fetchall()
-                    self._fill_admin_results(rows, 'pallets')
+                    table, columns = 'pallets', "id, order_id, pallet_number, pallet_type, status, created_at"
+                sql = f"SELECT {columns} FROM {table}"
+                params = []
+                if keyword:
+                    matched_ids, params = self._admin_search_ids(table, keyword)
+                    sql += f" WHERE id IN ({matched_ids})"
+                sql += " ORDER BY created_at DESC, id DESC LIMIT 200"
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                self._fill_admin_results(rows, table)
             finally:
                 conn.close()
         except Exception as e:
@@ -1104,8 +1100,6 @@ class SystemSettings(QWidget):
                                 pass
                             # 解除组件关联并恢复状态
                             cursor.execute("UPDATE components SET package_id = NULL, status = 'pending' WHERE package_id = ?", (id_val,))
-                            # 删除与托盘的关联
-                            cursor.execute("DELETE FROM pallet_packages WHERE package_id = ?", (id_val,))
                             # 物理删除包裹
                             cursor.execute("DELETE FROM packages WHERE id = ?", (id_val,))
                             if 'packages' in deleted_counts:
@@ -1124,8 +1118,8 @@ class SystemSettings(QWidget):
                                     pal_numbers.append(pal_no)
                             except Exception:
                                 pass
-                            # 删除与包裹的关联
-                            cursor.execute("DELETE FROM pallet_packages WHERE pallet_id = ?", (id_val,))
+                            # 移出托盘内的包裹（pallet_packages 由触发器同步）
+                            cursor.execute("UPDATE packages SET pallet_id = NULL WHERE pallet_id = ?", (id_val,))
                             # 删除虚拟项（如有）
                             try:
                                 cursor.execute("DELETE FROM virtual_items WHERE pallet_id = ?", (id_val,))
@@ -1142,6 +1136,9 @@ class SystemSettings(QWidget):
                 conn.commit()
             finally:
                 conn.close()
+            # 板件/包裹被直接删除，扫码缓存整体重建
+            scan_service.invalidate_component_index()
+            scan_service.invalidate_package()
             # 记录操作日志
             try:
                 self.db.log_operation('admin_delete_physical', json.dumps({'deleted': deleted_counts, 'user': self.admin_user_name}, ensure_ascii=False))
@@ -1158,14 +1155,17 @@ class SystemSettings(QWidget):
                     svc.trigger_sync('delete_pallets', {'items': [{'pallet_number': p} for p in pal_numbers]}, force=True)
             except Exception as e:
                 print(f"触发云端删除任务失败: {e}")
-            # 发出联动信号
+            # 发出联动信号与领域事件（未携带 ID，订阅页面整页刷新）
             try:
                 if deleted_counts['components'] > 0:
                     self.admin_components_deleted.emit()
+                    event_bus.publish(EventKind.COMPONENTS_DELETED, source=self)
                 if deleted_counts['packages'] > 0:
                     self.admin_packages_deleted.emit()
+                    event_bus.publish(EventKind.PACKAGE_DELETED, source=self)
                 if deleted_counts['pallets'] > 0:
                     self.admin_pallets_deleted.emit()
+                    event_bus.publish(EventKind.PALLET_DELETED, source=self)
             except Exception:
                 pass
             # 刷新查询结果
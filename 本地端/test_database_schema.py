@@ -0,0 +1,363 @@
+"""
+数据库结构与写入路径测试脚本
+
+- 旧版（未标版本号）数据库迁移到最新 user_version
+- order_stats / pallet_orders / pallets.package_count / pallet_packages / 搜索索引
+  在增删改后与按明细表全量重算的结果一致
+- 批量装托的集合校验与单事务装托
+- 写协调器的提交、嵌套并入与回滚；写事务内同步写入操作日志时并入该事务
+
+每个测试使用临时目录中的独立数据库文件，不依赖 PyQt。
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+# 添加当前目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+
+
+def _db_path():
+    return os.path.join(tempfile.mkdtemp(prefix='packing_test_'), 'packing_system.db')
+
+
+def _execute(db, sql, params=()):
+    with db.connection_context() as conn:
+        cursor = conn.execute(sql, params)
+        conn.commit()
+        return cursor.lastrowid
+
+
+def _derived_state(cursor):
+    """触发器维护的汇总表快照（全为0的统计行与已无包裹的非归属行视同不存在）"""
+    cursor.execute('''
+        SELECT order_id, total_components, packaged_components, total_packages,
+               manual_packages, manual_components_total
+        FROM order_stats
+    ''')
+    order_stats = {row for row in cursor.fetchall() if any(row[1:])}
+    cursor.execute('''
+        SELECT order_id, pallet_id, created_at, package_count, is_owner FROM pallet_orders
+        WHERE package_count > 0 OR is_owner = 1
+    ''')
+    pallet_orders = set(cursor.fetchall())
+    cursor.execute('SELECT id, COALESCE(package_count, 0) FROM pallets')
+    package_counts = set(cursor.fetchall())
+    return order_stats, pallet_orders, package_counts
+
+
+def assert_consistent(db):
+    """汇总表等于按明细表全量重算的结果，pallet_packages 与 packages.pallet_id 一致，搜索索引完整"""
+    conn = sqlite3.connect(db.db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        maintained = _derived_state(cursor)
+        db.rebuild_order_stats(cursor)
+        db.rebuild_pallet_membership(cursor)
+        rebuilt = _derived_state(cursor)
+        conn.rollback()
+        for name, got, expected in zip(('order_stats', 'pallet_orders', 'package_count'), maintained, rebuilt):
+            assert got == expected, f"{name} 与重算结果不一致: {sorted(got)} != {sorted(expected)}"
+
+        cursor.execute('SELECT pallet_id, package_id FROM pallet_packages')
+        projection = set(cursor.fetchall())
+        cursor.execute('SELECT pallet_id, id FROM packages WHERE pallet_id IS NOT NULL')
+        assert projection == set(cursor.fetchall()), "pallet_packages 与 packages.pallet_id 不一致"
+
+        # 搜索索引：已索引的行与 components 一致，且每个编码都能按当前值检索到
+        cursor.execute("INSERT INTO components_search (components_search) VALUES ('integrity-check')")
+        cursor.execute('SELECT id FROM components_search_docsize')
+        indexed = {row[0] for row in cursor.fetchall()}
+        cursor.execute('SELECT id, component_code FROM components')
+        components = cursor.fetchall()
+        assert indexed == {row[0] for row in components}, "搜索索引与 components 的行不一致"
+        for component_id, code in components:
+            cursor.execute('SELECT rowid FROM components_search WHERE components_search MATCH ?',
+                           ('"' + code.replace('"', '""') + '"',))
+            assert component_id in {row[0] for row in cursor.fetchall()}, f"搜索索引缺少编码 {code}"
+    finally:
+        conn.close()
+
+
+def test_migrate_baseline_database():
+    """未标版本号的旧库（含托盘关联数据）迁移到最新版本后汇总表与投影正确"""
+    path = _db_path()
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    # 旧版程序建立的基础表（版本1步骤即旧版表结构），user_version 仍为 0
+    Database._migrate_v1_base_schema(Database.__new__(Database), cursor)
+    cursor.execute("INSERT INTO orders (id, order_number, customer_name) VALUES (1, 'OLD-1', '客户')")
+    cursor.execute("INSERT INTO orders (id, order_number, customer_name) VALUES (2, 'OLD-2', '客户')")
+    cursor.execute('''
+        INSERT INTO pallets (id, pallet_number, pallet_type, status, order_id, created_at)
+        VALUES (1, 'T202401010001', 'physical', 'open', 1, '2024-01-01 08:00:00')
+    ''')
+    cursor.executemany('''
+        INSERT INTO packages (id, package_number, order_id, status, pallet_id, is_manual, component_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (1, '202401010001', 1, 'sealed', 1, 0, 2),
+        (2, '202401010002', 2, 'sealed', 1, 1, 1),
+        (3, '202401010003', 1, 'completed', None, 0, 0),
+    ])
+    cursor.executemany('''
+        INSERT INTO components (order_id, component_name, component_code, package_id, status)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [
+        (1, '侧板', 'OLD-A-001', 1, 'packed'),
+        (1, '顶板', 'OLD-A-002', 1, 'packed'),
+        (1, '背板', 'OLD-A-003', None, 'pending'),
+        (2, '门板', 'OLD-B-001', 2, 'packed'),
+    ])
+    # 旧版的关联表：一行与 packages.pallet_id 一致，一行指向未装托的包裹（迁移后应移除）
+    cursor.executemany('INSERT INTO pallet_packages (pallet_id, package_id) VALUES (?, ?)', [(1, 1), (1, 3)])
+    conn.commit()
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+    conn.close()
+
+    db = Database(path)
+    with db.connection_context() as conn:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == Database.SCHEMA_VERSION
+        assert conn.execute('SELECT package_count FROM pallets WHERE id = 1').fetchone()[0] == 2
+        pallet_orders = conn.execute(
+            'SELECT order_id, package_count, is_owner FROM pallet_orders WHERE pallet_id = 1 ORDER BY order_id'
+        ).fetchall()
+        assert pallet_orders == [(1, 1, 1), (2, 1, 0)], pallet_orders
+        rows = conn.execute('SELECT pallet_id, package_id FROM pallet_packages ORDER BY package_id').fetchall()
+        assert rows == [(1, 1), (1, 2)], rows
+        sql, params = db.search_condition('components', 'A-00', alias='c')
+        found = conn.execute(f'SELECT COUNT(*) FROM components c WHERE {sql}', params).fetchone()[0]
+        assert found == 3, found
+    stats = db.get_order_stats(1)
+    assert (stats['total_components'], stats['packaged_components'], stats['total_packages']) == (3, 2, 2)
+    assert db.get_order_stats(2)['manual_components_total'] == 1
+    assert_consistent(db)
+
+
+def test_trigger_consistency():
+    """板件/包裹/托盘增删改后，触发器维护的数据与全量重算一致"""
+    db = Database(_db_path())
+    order_a = _execute(db, "INSERT INTO orders (order_number) VALUES ('A')")
+    order_b = _execute(db, "INSERT INTO orders (order_number) VALUES ('B')")
+    with db.connection_context() as conn:
+        conn.executemany(
+            'INSERT INTO components (order_id, component_name, component_code) VALUES (?, ?, ?)',
+            [(order_a, '板', f'A-{i:03d}') for i in range(6)] + [(order_b, '板', f'B-{i:03d}') for i in range(3)]
+        )
+        conn.commit()
+    assert_consistent(db)
+
+    packages = db.pack_components(range(1, 10), split_by=None)
+    assert len(packages) == 2
+    assert_consistent(db)
+    package_a = next(p['package_id'] for p in packages if p['order_id'] == order_a)
+    package_b = next(p['package_id'] for p in packages if p['order_id'] == order_b)
+
+    pallet_1 = _execute(db, "INSERT INTO pallets (pallet_number, order_id, created_at) VALUES ('T1', ?, '2024-01-01')",
+                        (order_a,))
+    pallet_2 = _execute(db, "INSERT INTO pallets (pallet_number, order_id, created_at) VALUES ('T2', ?, '2024-01-02')",
+                        (order_b,))
+    assert_consistent(db)
+
+    steps = [
+        ("UPDATE packages SET status = 'completed'", ()),
+        ('UPDATE packages SET pallet_id = ? WHERE id IN (?, ?)', (pallet_1, package_a, package_b)),
+        ('UPDATE packages SET pallet_id = ? WHERE id = ?', (pallet_2, package_b)),
+        ('UPDATE packages SET order_id = ? WHERE id = ?', (order_b, package_a)),
+        ('UPDATE pallets SET order_id = ? WHERE id = ?', (order_b, pallet_1)),
+        ("UPDATE pallets SET created_at = '2023-12-31' WHERE id = ?", (pallet_1,)),
+        ('UPDATE components SET package_id = NULL WHERE component_code = ?', ('A-000',)),
+        ("UPDATE components SET component_code = 'A-100' WHERE component_code = ?", ('A-001',)),
+        ('UPDATE packages SET is_manual = 1, component_count = 5 WHERE id = ?', (package_a,)),
+        ('DELETE FROM components WHERE component_code = ?', ('B-002',)),
+        ('UPDATE packages SET pallet_id = NULL WHERE id = ?', (package_b,)),
+        ('DELETE FROM packages WHERE id = ?', (package_a,)),
+        ('DELETE FROM pallets WHERE id = ?', (pallet_2,)),
+    ]
+    for sql, params in steps:
+        _execute(db, sql, params)
+        try:
+            assert_consistent(db)
+        except AssertionError as e:
+            raise AssertionError(f"{sql} 之后: {e}")
+
+
+def test_load_packages_to_pallet():
+    """批量装托：集合校验分类、未封包跳过、completed 转 sealed、封托后拒绝"""
+    db = Database(_db_path())
+    order_id = _execute(db, "INSERT INTO orders (order_number) VALUES ('L')")
+    pallet_id = _execute(db, "INSERT INTO pallets (pallet_number, order_id, status) VALUES ('T9', ?, 'open')",
+                         (order_id,))
+    other_pallet = _execute(db, "INSERT INTO pallets (pallet_number, order_id, status) VALUES ('T8', ?, 'open')",
+                            (order_id,))
+    ids = {}
+    for number, status, pallet in (('P1', 'completed', None), ('P2', 'sealed', other_pallet),
+                                   ('P3', 'open', None), ('P4', 'sealed', pallet_id)):
+        ids[number] = _execute(db, 'INSERT INTO packages (package_number, order_id, status, pallet_id) VALUES (?, ?, ?, ?)',
+                               (number, order_id, status, pallet))
+
+    check = db.check_pallet_batch(pallet_id, ['P1', 'P2', 'P3', 'P4', 'NOPE', 'P1'])
+    assert check['pallet_status'] == 'open'
+    assert check['missing'] == ['NOPE']
+    assert [p['package_number'] for p in check['packages']] == ['P1', 'P2', 'P3', 'P4']
+    assert check['packages'][1]['pallet_number'] == 'T8'
+
+    loaded = db.load_packages_to_pallet(pallet_id, [ids['P1'], ids['P2'], ids['P3'], ids['P4']])
+    assert sorted(loaded) == sorted([ids['P1'], ids['P2']]), loaded
+    with db.connection_context() as conn:
+        rows = dict(conn.execute('SELECT package_number, status FROM packages').fetchall())
+        placed = dict(conn.execute('SELECT package_number, pallet_id FROM packages').fetchall())
+    assert rows['P1'] == 'sealed' and rows['P3'] == 'open'
+    assert placed['P1'] == placed['P2'] == placed['P4'] == pallet_id and placed['P3'] is None
+    assert_consistent(db)
+
+    db.flush_operation_logs(timeout=5.0)
+    with db.connection_context() as conn:
+        logged = conn.execute(
+            "SELECT COUNT(*) FROM operation_logs WHERE operation_type = 'add_to_pallet'"
+        ).fetchone()[0]
+    assert logged == 1
+
+    _execute(db, "UPDATE pallets SET status = 'sealed' WHERE id = ?", (pallet_id,))
+    try:
+        db.load_packages_to_pallet(pallet_id, [ids['P3']])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("已封托的托盘应拒绝装托")
+
+
+def test_write_coordinator():
+    """写协调器：提交返回结果、嵌套事务并入、异常整体回滚、多线程提交全部落库"""
+    db = Database(_db_path())
+    order_id = _execute(db, "INSERT INTO orders (order_number) VALUES ('W')")
+
+    def insert(conn, code):
+        conn.execute('INSERT INTO components (order_id, component_name, component_code) VALUES (?, ?, ?)',
+                     (order_id, '板', code))
+        return code
+
+    assert db.submit_write(insert, 'W-1').result(timeout=10) == 'W-1'
+
+    def nested(conn):
+        insert(conn, 'W-2')
+        with db.immediate_transaction() as inner:
+            assert inner is conn, "写线程内的 immediate_transaction 应并入当前事务"
+            insert(inner, 'W-3')
+        raise RuntimeError('回滚')
+
+    future = db.submit_write(nested)
+    assert isinstance(future.exception(timeout=10), RuntimeError)
+
+    futures = []
+    def submit_many(prefix):
+        for i in range(20):
+            futures.append(db.submit_write(insert, f'{prefix}-{i}'))
+    threads = [threading.Thread(target=submit_many, args=(f'T{n}',)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for future in futures:
+        future.result(timeout=10)
+
+    with db.connection_context() as conn:
+        codes = {row[0] for row in conn.execute('SELECT component_code FROM components')}
+    assert 'W-1' in codes
+    assert not codes & {'W-2', 'W-3'}, "失败的写事务应整体回滚"
+    assert len(codes) == 61
+    stats = db.get_write_stats()
+    assert stats['failed'] >= 1 and stats['completed'] >= 61
+    assert_consistent(db)
+
+
+def test_operation_log_in_transaction():
+    """写事务内退化为同步写入的操作日志并入该事务：不等待自身写锁，随事务提交或回滚"""
+    db = Database(_db_path())
+    # 写入器已停止时 submit 改为调用方线程同步写入（与队列已满相同的路径）
+    db.shutdown_log_writer()
+
+    def log(conn, operation_type, fail=False):
+        start = time.monotonic()
+        db.log_operation(operation_type, {'step': 1})
+        elapsed = time.monotonic() - start
+        if fail:
+            raise RuntimeError('回滚')
+        return elapsed
+
+    elapsed = db.submit_write(log, 'in_writer').result(timeout=30)
+    assert elapsed < 1.0, f"写线程内同步写日志等待了 {elapsed:.1f} 秒"
+    assert isinstance(db.submit_write(log, 'rolled_back', fail=True).exception(timeout=30), RuntimeError)
+
+    # 非写线程中的 immediate_transaction 同样并入
+    def worker():
+        with db.immediate_transaction() as conn:
+            log(conn, 'in_immediate')
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join(30)
+
+    with db.connection_context() as conn:
+        logged = [row[0] for row in conn.execute('SELECT operation_type FROM operation_logs ORDER BY id')]
+    assert logged == ['in_writer', 'in_immediate']
+
+
+def test_order_index_allocation():
+    """订单内序号只能在写事务内分配，提交后的序号连续且不重复"""
+    db = Database(_db_path())
+    order_id = _execute(db, "INSERT INTO orders (order_number) VALUES ('I')")
+    with db.connection_context() as conn:
+        try:
+            db.allocate_package_index(conn, order_id)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("事务外分配序号应抛出 RuntimeError")
+
+    def create(conn):
+        index = db.allocate_package_index(conn, order_id)
+        conn.execute('INSERT INTO packages (package_number, order_id, package_index) VALUES (?, ?, ?)',
+                     (db.generate_package_number(), order_id, index))
+        return index
+
+    indices = [db.submit_write(create) for _ in range(5)]
+    assert sorted(f.result(timeout=10) for f in indices) == [1, 2, 3, 4, 5]
+    _execute(db, 'DELETE FROM packages WHERE package_index = 2')
+    assert db.submit_write(create).result(timeout=10) == 2
+
+
+def main():
+    """运行所有测试"""
+    tests = [
+        test_migrate_baseline_database,
+        test_trigger_consistency,
+        test_load_packages_to_pallet,
+        test_write_coordinator,
+        test_operation_log_in_transaction,
+        test_order_index_allocation,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✓ {test.__doc__}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {test.__doc__}: {e}")
+            import traceback
+            traceback.print_exc()
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
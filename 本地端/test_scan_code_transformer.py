@@ -0,0 +1,199 @@
+"""
+扫码编码转换测试脚本
+
+compile_scan_config 取代了 apply_scan_config 与 ScanConfigDialog 中手写的 if/elif 分支，
+这里按表格逐项对比编译结果与原实现（下方 _legacy_transform 原样保留）的输出：
+处理方式 0-5、长度不小于编码长度、插入位置在开头/末尾/超出末尾、组合配置的执行顺序。
+"""
+
+import sys
+import os
+import itertools
+import json
+
+# 添加当前目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scan_code_transformer import compile_scan_config
+
+
+def _legacy_transform(config, code):
+    """原 ScanPackaging.apply_scan_config 的转换分支（配置已解析为字典）"""
+    process_type = config.get('process_type', 0)
+
+    if process_type == 0:  # 不处理
+        return code
+    elif process_type == 1:  # 去掉前缀
+        length = config.get('prefix_length', 1)
+        return code[length:] if len(code) > length else ""
+    elif process_type == 2:  # 去掉后缀
+        length = config.get('suffix_length', 1)
+        return code[:-length] if len(code) > length else ""
+    elif process_type == 3:  # 提取中间
+        start = config.get('start_pos', 1) - 1  # 转为0基索引
+        length = config.get('extract_length', 5)
+        return code[start:start+length] if len(code) > start else ""
+    elif process_type == 4:  # 插入字符
+        position = config.get('insert_position', 0)
+        content = config.get('insert_content', '')
+        if position == 0:  # 插入到开头
+            return content + code
+        elif position >= len(code):  # 插入到末尾
+            return code + content
+        else:  # 插入到中间
+            return code[:position] + content + code[position:]
+    elif process_type == 5:  # 组合配置
+        result = code
+
+        # 执行顺序：去前缀 → 去后缀 → 插入字符 → 提取中间字符
+
+        # 1. 去掉前缀
+        if config.get('combo_remove_prefix', False):
+            length = config.get('combo_prefix_length', 1)
+            result = result[length:] if len(result) > length else ""
+
+        # 2. 去掉后缀
+        if config.get('combo_remove_suffix', False):
+            length = config.get('combo_suffix_length', 1)
+            result = result[:-length] if len(result) > length else ""
+
+        # 3. 插入字符
+        if config.get('combo_insert_chars', False):
+            position = config.get('combo_insert_position', 0)
+            content = config.get('combo_insert_content', '')
+            if position == 0:  # 插入到开头
+                result = content + result
+            elif position >= len(result):  # 插入到末尾
+                result = result + content
+            else:  # 插入到中间
+                result = result[:position] + content + result[position:]
+
+        # 4. 提取中间字符
+        if config.get('combo_extract_middle', False):
+            start = config.get('combo_start_pos', 1) - 1  # 转为0基索引
+            length = config.get('combo_extract_length', 5)
+            result = result[start:start+length] if len(result) > start else ""
+
+        return result
+
+    return code
+
+
+CODES = ["", "A", "AB", "ABCDEFGH", "X1234567890Z", "板件编码-001"]
+
+# (说明, 配置)；编码长度 0-12，长度/位置取值覆盖 0、中间、等于长度与超出长度
+CASES = [
+    ("不处理", {'process_type': 0}),
+    ("未知处理方式", {'process_type': 9}),
+    ("缺省参数", {'process_type': 1}),
+    ("缺省参数", {'process_type': 2}),
+    ("缺省参数", {'process_type': 3}),
+    ("缺省参数", {'process_type': 4}),
+    ("缺省参数", {'process_type': 5}),
+]
+for length in (0, 1, 2, 7, 8, 12, 13, 50):
+    CASES.append(("去前缀", {'process_type': 1, 'prefix_length': length}))
+    CASES.append(("去后缀", {'process_type': 2, 'suffix_length': length}))
+for start, length in itertools.product((1, 2, 8, 9, 12, 13, 40), (0, 1, 5, 8, 20)):
+    CASES.append(("提取中间", {'process_type': 3, 'start_pos': start, 'extract_length': length}))
+for position, content in itertools.product((0, 1, 2, 7, 8, 12, 13, 99), ("", "-", "前缀")):
+    CASES.append(("插入字符", {'process_type': 4, 'insert_position': position, 'insert_content': content}))
+# 组合配置：四个开关的全部组合，参数让每一步都会改变结果，可以看出执行顺序
+for flags in itertools.product((False, True), repeat=4):
+    for prefix, suffix, position, start, length in ((2, 1, 0, 1, 6), (1, 2, 3, 2, 4), (3, 3, 50, 4, 20), (20, 20, 1, 1, 1)):
+        CASES.append(("组合配置", {
+            'process_type': 5,
+            'combo_remove_prefix': flags[0], 'combo_prefix_length': prefix,
+            'combo_remove_suffix': flags[1], 'combo_suffix_length': suffix,
+            'combo_insert_chars': flags[2], 'combo_insert_position': position, 'combo_insert_content': '#',
+            'combo_extract_middle': flags[3], 'combo_start_pos': start, 'combo_extract_length': length,
+        }))
+
+
+def _mismatches(cases, codes):
+    mismatches = []
+    for name, config in cases:
+        transform = compile_scan_config(config)
+        for code in codes:
+            expected = _legacy_transform(config, code)
+            actual = transform(code)
+            if actual != expected:
+                mismatches.append(f"{name} {config} {code!r}: {actual!r} != {expected!r}")
+    return mismatches
+
+
+def test_matches_legacy_for_each_process_type():
+    """处理方式 0-5 的编译结果与原实现逐项一致"""
+    mismatches = _mismatches(CASES, CODES)
+    assert not mismatches, "\n".join(mismatches[:20])
+
+
+def test_length_not_less_than_code():
+    """去前缀/去后缀长度不小于编码长度时得到空串；提取起点超出编码时得到空串"""
+    for process_type, key in ((1, 'prefix_length'), (2, 'suffix_length')):
+        transform = compile_scan_config({'process_type': process_type, key: 8})
+        assert transform("ABCDEFGH") == ""
+        assert transform("ABCDEFGHI") == ("I" if process_type == 1 else "A")
+    assert compile_scan_config({'process_type': 3, 'start_pos': 9, 'extract_length': 3})("ABCDEFGH") == ""
+
+
+def test_insert_positions():
+    """插入位置：0 为开头，等于或超出编码长度为末尾，其余为中间"""
+    def insert(position):
+        return compile_scan_config({'process_type': 4, 'insert_position': position, 'insert_content': '-'})("ABCD")
+    assert insert(0) == "-ABCD"
+    assert insert(2) == "AB-CD"
+    assert insert(4) == "ABCD-"
+    assert insert(10) == "ABCD-"
+
+
+def test_combo_order():
+    """组合配置按 去前缀 → 去后缀 → 插入字符 → 提取中间 的顺序执行"""
+    config = {
+        'process_type': 5,
+        'combo_remove_prefix': True, 'combo_prefix_length': 2,
+        'combo_remove_suffix': True, 'combo_suffix_length': 1,
+        'combo_insert_chars': True, 'combo_insert_position': 1, 'combo_insert_content': '#',
+        'combo_extract_middle': True, 'combo_start_pos': 1, 'combo_extract_length': 4,
+    }
+    # X1234567890Z → 234567890Z → 234567890 → 2#34567890 → 2#34
+    assert compile_scan_config(config)("X1234567890Z") == "2#34"
+    assert _legacy_transform(config, "X1234567890Z") == "2#34"
+
+
+def test_json_and_invalid_config():
+    """设置值为 JSON 字符串时与字典一致，无法解析时按不处理"""
+    config = {'process_type': 1, 'prefix_length': 2}
+    assert compile_scan_config(json.dumps(config))("ABCDEFGH") == compile_scan_config(config)("ABCDEFGH") == "CDEFGH"
+    assert compile_scan_config("not json")("ABCDEFGH") == "ABCDEFGH"
+    assert compile_scan_config(None)("ABCDEFGH") == "ABCDEFGH"
+
+
+def main():
+    """运行所有测试"""
+    tests = [
+        test_matches_legacy_for_each_process_type,
+        test_length_not_less_than_code,
+        test_insert_positions,
+        test_combo_order,
+        test_json_and_invalid_config,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✓ {test.__doc__}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {test.__doc__}: {e}")
+            import traceback
+            traceback.print_exc()
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    print(f"对比用例: {len(CASES)} 个配置 × {len(CODES)} 个编码")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
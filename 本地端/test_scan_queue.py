@@ -0,0 +1,222 @@
+"""
+扫码接收队列测试脚本
+
+用替身扫码服务验证 ScanQueue 的工作线程：结果按扫码顺序回报、整批失败后逐条重试、
+通用完成码屏障与 resume()、完成码之后的扫码归入新包装。
+信号以 DirectConnection 在工作线程中直接回调，不需要 Qt 事件循环。
+"""
+
+import sys
+import os
+import threading
+import time
+
+# 添加当前目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PyQt5.QtCore import Qt
+
+from scan_queue import ScanQueue
+from scan_service import ScanResult, ScanStatus
+
+
+class _FakeService:
+    """扫码服务替身：含 BAD 开头编码的批次整批失败，BAD 编码单条处理也失败
+
+    gate 未打开时 scan_batch 阻塞，用于让后续扫码在队列中积压成批。
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def scan_batch(self, package_id, codes):
+        self.gate.wait(5)
+        self.calls.append(('batch', package_id, list(codes)))
+        if any(code.startswith('BAD') for code in codes):
+            raise RuntimeError("批量写入失败")
+        return [ScanResult(ScanStatus.OK, code, package_id) for code in codes]
+
+    def scan(self, package_id, code):
+        self.calls.append(('one', package_id, code))
+        if code.startswith('BAD'):
+            raise RuntimeError(f"无法入包: {code}")
+        return ScanResult(ScanStatus.OK, code, package_id)
+
+
+class _Recorder:
+    """在工作线程中记录队列回报的事件：('ok'|'failed'|'finish', 编码, 包装ID)"""
+
+    def __init__(self, scan_queue):
+        self.events = []
+        self.finish_jobs = []
+        self._cond = threading.Condition()
+        scan_queue.scan_processed.connect(self.on_processed, Qt.DirectConnection)
+        scan_queue.scan_failed.connect(self.on_failed, Qt.DirectConnection)
+        scan_queue.finish_requested.connect(self.on_finish, Qt.DirectConnection)
+
+    def _add(self, event):
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def on_processed(self, job, result):
+        self._add(('ok', job.code, result.package_id))
+
+    def on_failed(self, job, message):
+        self._add(('failed', job.code, job.package_id))
+
+    def on_finish(self, job):
+        self.finish_jobs.append(job)
+        self._add(('finish', job.code, job.package_id))
+
+    def wait_for(self, count, timeout=5.0):
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) >= count, timeout)
+            return list(self.events)
+
+
+def _queue():
+    service = _FakeService()
+    scan_queue = ScanQueue(service=service)
+    return scan_queue, service, _Recorder(scan_queue)
+
+
+def test_results_in_scan_order():
+    """积压的扫码分批处理，结果按扫码顺序逐条回报"""
+    scan_queue, service, recorder = _queue()
+    try:
+        scan_queue.set_package(1)
+        service.gate.clear()
+        codes = [f"C{i:03d}" for i in range(120)]
+        for code in codes:
+            scan_queue.enqueue(code, code)
+        service.gate.set()
+        events = recorder.wait_for(len(codes))
+        assert [code for _, code, _ in events] == codes
+        assert all(kind == 'ok' and package_id == 1 for kind, _, package_id in events)
+        batches = [call for call in service.calls if call[0] == 'batch']
+        assert len(batches) < len(codes), "积压的扫码应合并为批次"
+        assert all(len(call[2]) <= ScanQueue.BATCH_MAX for call in batches)
+        assert scan_queue.backlog == 0
+    finally:
+        scan_queue.stop()
+
+
+def test_batch_failure_retries_each():
+    """整批失败时逐条重试：成功的照常回报，失败的以 scan_failed 回报，顺序不变"""
+    scan_queue, service, recorder = _queue()
+    try:
+        scan_queue.set_package(1)
+        service.gate.clear()
+        for code in ("W0", "A1", "BAD1", "A2"):
+            scan_queue.enqueue(code, code)
+        service.gate.set()
+        events = recorder.wait_for(4)
+        assert events == [('ok', 'W0', 1), ('ok', 'A1', 1), ('failed', 'BAD1', 1), ('ok', 'A2', 1)]
+        failed_batch = [call for call in service.calls if call[0] == 'batch' and 'BAD1' in call[2]]
+        assert failed_batch, "BAD1 应先随批次处理"
+        retried = [call[2] for call in service.calls if call[0] == 'one']
+        assert retried == [code for code in ("W0", "A1", "BAD1", "A2") if code in failed_batch[0][2]]
+        assert scan_queue.backlog == 0
+    finally:
+        scan_queue.stop()
+
+
+def test_scan_without_package_fails():
+    """没有当前包装时扫码以 scan_failed 回报，不调用扫码服务"""
+    scan_queue, service, recorder = _queue()
+    try:
+        scan_queue.enqueue("A1", "A1")
+        assert recorder.wait_for(1) == [('failed', 'A1', None)]
+        assert service.calls == []
+    finally:
+        scan_queue.stop()
+
+
+def test_finish_barrier_and_resume():
+    """完成码之前的扫码处理完才请求完成；resume() 之前完成码之后的扫码不处理，之后归入新包装"""
+    scan_queue, service, recorder = _queue()
+    try:
+        scan_queue.set_package(1)
+        scan_queue.enqueue("A1", "A1")
+        scan_queue.enqueue("A2", "A2")
+        scan_queue.enqueue_finish("FINISH")
+        assert scan_queue.has_pending_finish()
+        scan_queue.enqueue("B1", "B1")
+        scan_queue.enqueue("B2", "B2")
+
+        events = recorder.wait_for(3)
+        assert events == [('ok', 'A1', 1), ('ok', 'A2', 1), ('finish', 'FINISH', 1)]
+        # 队列暂停：界面完成包装、新建包装之前不处理后续扫码
+        time.sleep(0.2)
+        assert len(recorder.events) == 3
+        assert scan_queue.backlog == 3
+
+        scan_queue.set_package(2)
+        scan_queue.resume()
+        events = recorder.wait_for(5)
+        assert events[3:] == [('ok', 'B1', 2), ('ok', 'B2', 2)]
+        assert not scan_queue.has_pending_finish()
+        assert scan_queue.backlog == 0
+    finally:
+        scan_queue.stop()
+
+
+def test_consecutive_finishes_pick_up_new_packages():
+    """连续完成码：每段扫码归入当时新建的包装"""
+    scan_queue, service, recorder = _queue()
+
+    def complete_package():
+        # 模拟界面：完成包装并新建下一个包装后继续
+        new_package = 1 + len(recorder.finish_jobs)
+        scan_queue.set_package(new_package)
+        scan_queue.resume()
+
+    scan_queue.finish_requested.connect(lambda job: complete_package(), Qt.DirectConnection)
+    try:
+        scan_queue.set_package(1)
+        scan_queue.enqueue("A1", "A1")
+        scan_queue.enqueue_finish("FINISH")
+        scan_queue.enqueue("B1", "B1")
+        scan_queue.enqueue_finish("FINISH")
+        scan_queue.enqueue("C1", "C1")
+        events = recorder.wait_for(5)
+        assert events == [
+            ('ok', 'A1', 1), ('finish', 'FINISH', 1),
+            ('ok', 'B1', 2), ('finish', 'FINISH', 2),
+            ('ok', 'C1', 3),
+        ]
+        assert scan_queue.backlog == 0
+    finally:
+        scan_queue.stop()
+
+
+def main():
+    """运行所有测试"""
+    tests = [
+        test_results_in_scan_order,
+        test_batch_failure_retries_each,
+        test_scan_without_package_fails,
+        test_finish_barrier_and_resume,
+        test_consecutive_finishes_pick_up_new_packages,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✓ {test.__doc__}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {test.__doc__}: {e}")
+            import traceback
+            traceback.print_exc()
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
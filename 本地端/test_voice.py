@@ -0,0 +1,157 @@
+"""
+语音播报测试脚本
+
+用 NullBackend 验证 SpeechEngine 的排队合并、过期丢弃与紧急提示保留；
+用模拟的 PowerShell 进程验证应答超时后重启（不依赖 Windows）。
+"""
+
+import sys
+import os
+import time
+
+# 添加当前目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from voice import SpeechEngine, NullBackend, PowerShellBackend
+
+
+def _engine(max_age=3.0):
+    return SpeechEngine(NullBackend(), max_age=max_age, prompts=("房间号不一致，请检查",))
+
+
+def _queued(engine, *items):
+    """把 (秒前, 文本, 是否紧急) 放入队列，返回第一条（模拟工作线程刚取出的消息）"""
+    now = time.monotonic()
+    entries = [(now - age, text, urgent) for age, text, urgent in items]
+    for entry in entries[1:]:
+        engine._queue.put(entry)
+    return entries[0]
+
+
+def test_coalesce_keeps_newest():
+    """排队的多条消息只播报最新一条"""
+    engine = _engine()
+    first = _queued(engine, (0.3, "包裹一", False), (0.2, "包裹二", False), (0.1, "包裹三", False))
+    assert engine._coalesce(first) == ["包裹三"]
+    assert engine.dropped == 2
+    assert engine._queue.empty()
+
+
+def test_coalesce_drops_stale():
+    """等待超过 max_age 的消息直接丢弃"""
+    engine = _engine(max_age=1.0)
+    first = _queued(engine, (5.0, "过期一", False), (2.0, "过期二", True))
+    assert engine._coalesce(first) == []
+    assert engine.dropped == 2
+
+
+def test_coalesce_keeps_urgent():
+    """紧急提示不会被后来的普通消息合并掉，且先于最新消息播报"""
+    engine = _engine()
+    first = _queued(engine, (0.4, "包裹一", False), (0.3, "房间号不一致，请检查", True),
+                    (0.2, "包裹二", False), (0.1, "包裹三", False))
+    assert engine._coalesce(first) == ["房间号不一致，请检查", "包裹三"]
+    assert engine.dropped == 2
+
+
+def test_coalesce_urgent_is_newest():
+    """最新一条就是紧急提示时只播报一次"""
+    engine = _engine()
+    first = _queued(engine, (0.2, "包裹一", False), (0.1, "房间号不一致，请检查", True))
+    assert engine._coalesce(first) == ["房间号不一致，请检查"]
+
+
+def test_fixed_prompt_is_urgent():
+    """固定提示语自动按紧急消息排队"""
+    engine = _engine()
+    engine._ensure_worker = lambda: None
+    engine.speak("房间号不一致，请检查")
+    engine.speak("包裹一")
+    assert [urgent for _, _, urgent in (engine._queue.get_nowait(), engine._queue.get_nowait())] == [True, False]
+
+
+def test_speak_through_worker():
+    """speak() 立即返回，消息由工作线程交给后端"""
+    engine = _engine()
+    engine.speak("托盘创建成功")
+    deadline = time.monotonic() + 2.0
+    while not engine.backend.spoken and time.monotonic() < deadline:
+        time.sleep(0.01)
+    engine.close()
+    assert list(engine.backend.spoken) == ["托盘创建成功"]
+
+
+class _FakePowerShell(PowerShellBackend):
+    """用 Python 子进程模拟 PowerShell 循环：hang 为真时读到命令后不应答"""
+
+    def __init__(self, hang, command_timeout):
+        super().__init__(command_timeout=command_timeout)
+        self.hang = hang
+
+    def _spawn(self):
+        import subprocess
+        script = (
+            "import sys, time\n"
+            "for line in sys.stdin:\n"
+            + ("    time.sleep(60)\n" if self.hang else "    print('OK', flush=True)\n")
+        )
+        return subprocess.Popen([sys.executable, "-c", script],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+
+def test_hung_process_is_restarted():
+    """应答超时后结束卡住的进程，下一条命令重新启动"""
+    backend = _FakePowerShell(hang=True, command_timeout=0.5)
+    started = time.monotonic()
+    backend.say("包裹一")
+    elapsed = time.monotonic() - started
+    assert elapsed < 3.0, f"say() 等待了 {elapsed:.1f} 秒"
+    assert backend.restarts == 1
+    assert backend._process is None
+    backend.hang = False
+    backend.say("包裹二")
+    assert backend.restarts == 1
+    backend.close()
+
+
+def test_acknowledged_commands():
+    """正常应答时复用同一个进程"""
+    backend = _FakePowerShell(hang=False, command_timeout=2.0)
+    backend.say("包裹一")
+    process = backend._process
+    backend.say("包裹二")
+    assert backend._process is process
+    assert backend.restarts == 0
+    backend.close()
+
+
+def main():
+    """运行所有测试"""
+    tests = [
+        test_coalesce_keeps_newest,
+        test_coalesce_drops_stale,
+        test_coalesce_keeps_urgent,
+        test_coalesce_urgent_is_newest,
+        test_fixed_prompt_is_urgent,
+        test_speak_through_worker,
+        test_hung_process_is_restarted,
+        test_acknowledged_commands,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✓ {test.__doc__}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {test.__doc__}: {e}")
+            import traceback
+            traceback.print_exc()
+
+    print(f"\n通过: {len(tests) - failed}/{len(tests)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
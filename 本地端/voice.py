@@ -1,35 +1,285 @@
+import atexit
+import os
+import queue
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from hashlib import md5
 
 
-def speak(text: str):
-    """Speak the given Chinese text using Windows PowerShell TTS.
+# Fixed prompts rendered to wave files once and replayed without synthesis
+FIXED_PROMPTS = (
+    "房间号不一致，请检查",
+    "柜号不一致，请检查",
+)
+
+
+class SpeechBackend:
+    """Where utterances end up. Calls come from the engine's worker thread only."""
+
+    def start(self):
+        """Prepare the backend (start processes, load voices)."""
+
+    def prerender(self, texts):
+        """Render fixed prompts ahead of time where the backend supports it."""
+
+    def say(self, text: str):
+        """Speak text and return once it has finished playing."""
+
+    def close(self):
+        """Release the backend."""
+
+
+class NullBackend(SpeechBackend):
+    """No-op backend for non-Windows hosts and tests; keeps what would have been spoken."""
+
+    def __init__(self, history: int = 100):
+        self.spoken = deque(maxlen=history)
+
+    def say(self, text: str):
+        self.spoken.append(text)
+
+
+# Long-lived PowerShell loop: one command per stdin line, one "OK" line back per command.
+#   SAY <text>            speak text
+#   RENDER <path>\t<text> synthesize text to a wave file
+#   WAV <path>            play a pre-rendered wave file
+_POWERSHELL_LOOP = r"""
+[Console]::InputEncoding = [Text.Encoding]::UTF8
+Add-Type -AssemblyName System.Speech
+$s = New-Object System.Speech.Synthesis.SpeechSynthesizer
+$s.Rate = 0; $s.Volume = 100
+while (($line = [Console]::In.ReadLine()) -ne $null) {
+    try {
+        if ($line.StartsWith('SAY ')) { $s.Speak($line.Substring(4)) }
+        elseif ($line.StartsWith('WAV ')) { (New-Object System.Media.SoundPlayer $line.Substring(4)).PlaySync() }
+        elseif ($line.StartsWith('RENDER ')) {
+            $parts = $line.Substring(7).Split("`t", 2)
+            try { $s.SetOutputToWaveFile($parts[0]); $s.Speak($parts[1]) }
+            finally { $s.SetOutputToDefaultAudioDevice() }
+        }
+    } catch {}
+    [Console]::Out.WriteLine('OK'); [Console]::Out.Flush()
+}
+"""
 
-    Falls back silently if not on Windows or PowerShell fails.
+
+class PowerShellBackend(SpeechBackend):
+    """Windows System.Speech through a single PowerShell process kept alive between utterances.
+
+    Acknowledgements are read on a separate thread; a command that is not
+    acknowledged within command_timeout (hung audio device, PlaySync that
+    never returns) kills the process, and the next command starts a new one.
     """
-    if not text:
-        return
-
-    # Only attempt on Windows
-    if sys.platform != 'win32':
-        return
-
-    # Use .NET System.Speech.Synthesis via PowerShell without opening a window
-    # Avoid blocking the UI thread by not waiting for completion.
-    ps_command = (
-        "Add-Type -AssemblyName System.Speech;"
-        "$s = New-Object System.Speech.Synthesis.SpeechSynthesizer;"
-        # Use default voice; can customize rate/volume here if needed
-        f"$s.Rate = 0; $s.Volume = 100; $s.Speak('{text}');"
-    )
 
-    try:
-        subprocess.Popen(
-            ["powershell", "-NoProfile", "-Command", ps_command],
-            stdout=subprocess.DEVNULL,
+    def __init__(self, cache_dir=None, command_timeout: float = 15.0):
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), 'packing_voice')
+        self.command_timeout = command_timeout
+        self._process = None
+        self._acks = None
+        self._rendered = {}
+        self.restarts = 0
+
+    def _spawn(self):
+        return subprocess.Popen(
+            ["powershell", "-NoProfile", "-NonInteractive", "-Command", _POWERSHELL_LOOP],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
             stderr=subprocess.DEVNULL,
             creationflags=0x08000000  # CREATE_NO_WINDOW
         )
+
+    def start(self):
+        if self._process is not None and self._process.poll() is None:
+            return
+        self._process = self._spawn()
+        # Each process gets its own queue so a late "OK" from a killed one is never mistaken for ours
+        self._acks = queue.Queue()
+        threading.Thread(
+            target=self._read_acks, args=(self._process.stdout, self._acks),
+            name='SpeechAcks', daemon=True
+        ).start()
+
+    @staticmethod
+    def _read_acks(stdout, acks):
+        try:
+            for line in iter(stdout.readline, b''):
+                acks.put(line)
+        except (OSError, ValueError):
+            pass
+        acks.put(None)  # process gone
+
+    def _restart(self):
+        """Drop a hung or dead process; start() spawns a new one on the next command."""
+        process, self._process = self._process, None
+        self.restarts += 1
+        if process is not None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    def _command(self, line: str):
+        self.start()
+        text = line.replace('\r', ' ').replace('\n', ' ')
+        try:
+            self._process.stdin.write((text + '\n').encode('utf-8'))
+            self._process.stdin.flush()
+            # Wait for the acknowledgement so that queued messages can still be coalesced
+            ack = self._acks.get(timeout=self.command_timeout)
+        except (OSError, ValueError, queue.Empty):
+            ack = None
+        if ack is None:
+            self._restart()
+
+    def prerender(self, texts):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for text in texts:
+            path = os.path.join(self.cache_dir, md5(text.encode('utf-8')).hexdigest() + '.wav')
+            if not os.path.exists(path):
+                self._command(f"RENDER {path}\t{text}")
+            if os.path.exists(path):
+                self._rendered[text] = path
+
+    def say(self, text: str):
+        path = self._rendered.get(text)
+        self._command(f"WAV {path}" if path else f"SAY {text}")
+
+    def close(self):
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+                self._process.wait(timeout=2)
+            except Exception:
+                self._process.kill()
+            self._process = None
+            self._acks = None
+
+
+def default_backend() -> SpeechBackend:
+    if sys.platform == 'win32':
+        return PowerShellBackend()
+    return NullBackend()
+
+
+class SpeechEngine:
+    """Queue-fed speech worker.
+
+    speak() only enqueues and returns. The worker thread plays one message at
+    a time. Messages that waited longer than max_age are dropped. When
+    several are waiting, only the newest is spoken, plus the newest urgent
+    one if a warning would otherwise be lost.
+    """
+
+    def __init__(self, backend: SpeechBackend = None, max_age: float = 3.0,
+                 prompts=FIXED_PROMPTS):
+        self.backend = backend or default_backend()
+        self.max_age = max_age
+        self.prompts = tuple(prompts)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def speak(self, text: str, urgent: bool = False):
+        if not text:
+            return
+        self._ensure_worker()
+        self._queue.put((time.monotonic(), text, urgent or text in self.prompts))
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='SpeechEngine', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            self.backend.start()
+            self.backend.prerender(self.prompts)
+        except Exception:
+            pass
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            for text in self._coalesce(item):
+                try:
+                    self.backend.say(text)
+                except Exception:
+                    # Silently ignore to avoid breaking main workflow
+                    pass
+
+    def _coalesce(self, first):
+        """Drain what is waiting and pick the messages still worth saying."""
+        items = [first]
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            items.append(item)
+
+        now = time.monotonic()
+        fresh = [item for item in items if now - item[0] <= self.max_age]
+        chosen = fresh[-1:]
+        urgent = [item for item in fresh if item[2]]
+        if urgent and urgent[-1] is not fresh[-1]:
+            chosen.insert(0, urgent[-1])
+        self.dropped += len(items) - len(chosen)
+        return [text for _, text, _ in chosen]
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=2)
+        self.backend.close()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> SpeechEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = SpeechEngine()
+    return _engine
+
+
+@atexit.register
+def _shutdown():
+    if _engine is not None:
+        _engine.close()
+
+
+def set_backend(backend: SpeechBackend):
+    """Replace the speech backend (e.g. NullBackend in tests)."""
+    global _engine
+    with _engine_lock:
+        old, _engine = _engine, SpeechEngine(backend)
+    if old is not None:
+        old.close()
+
+
+def speak(text: str):
+    """Speak the given Chinese text without blocking the caller.
+
+    Falls back silently if no speech backend is available.
+    """
+    try:
+        get_engine().speak(text)
     except Exception:
         # Silently ignore to avoid breaking main workflow
-        pass
\ No newline at end of file
+        pass
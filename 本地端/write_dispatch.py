@@ -0,0 +1,70 @@
+"""
+界面写事务派发
+界面线程把写事务交给数据库写线程执行，完成后在界面线程回调，
+界面不会因等待写锁（其他工位或后台写入占用）而卡顿。
+"""
+
+import logging
+import traceback
+
+from PyQt5.QtCore import QObject, pyqtSignal
+try:
+    from PyQt5 import sip
+except ImportError:  # 旧版 PyQt5 单独发布 sip
+    import sip
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+
+class WriteDispatcher(QObject):
+    """把写线程的完成通知转回界面线程
+
+    全局对象与进程同寿命，写线程发信号时接收方始终存在；
+    提交写事务的页面/对话框在完成前已销毁时，只记录结果，不再回调。
+    """
+
+    # (Future, 提交方控件, 界面线程回调)
+    finished = pyqtSignal(object, object, object)
+
+    def __init__(self):
+        super().__init__()
+        self.finished.connect(self._on_finished)
+
+    def submit(self, owner, fn, on_done):
+        """提交写事务 fn(conn) 到写线程，完成后在界面线程调用 on_done(future)"""
+        future = db.submit_write(fn)
+        future.add_done_callback(lambda f: self.finished.emit(f, owner, on_done))
+        return future
+
+    def _on_finished(self, future, owner, on_done):
+        if owner is not None and sip.isdeleted(owner):
+            _log_orphaned(future)
+            return
+        try:
+            on_done(future)
+        except Exception:
+            traceback.print_exc()
+
+
+def _log_orphaned(future):
+    """提交方已关闭：结果无法显示，记入日志以免静默丢失"""
+    error = future.exception()
+    if error is not None:
+        logger.error("界面已关闭，写事务失败: %s", error,
+                     exc_info=(type(error), error, error.__traceback__))
+    else:
+        logger.info("界面已关闭，写事务已完成: %r", future.result())
+
+
+# 全局派发器（需在界面线程中导入）
+write_dispatcher = WriteDispatcher()
+
+
+class WriteSubmitter:
+    """页面/对话框混入：self.submit_write(fn, on_done)"""
+
+    def submit_write(self, fn, on_done):
+        """提交写事务 fn(conn) 到写线程，完成后在界面线程调用 on_done(future)"""
+        return write_dispatcher.submit(self, fn, on_done)